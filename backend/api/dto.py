@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Literal
 
 class AddVideoRequest(BaseModel):
     draft_folder: Optional[str] = None
@@ -195,10 +195,14 @@ class QueryScriptRequest(BaseModel):
 class SaveDraftRequest(BaseModel):
     draft_id: Optional[str] = None
     draft_folder: Optional[str] = None
+    priority: Literal["high", "normal", "low"] = "normal"
 
 class QueryDraftStatusRequest(BaseModel):
     task_id: Optional[str] = None
 
+class CancelSaveDraftRequest(BaseModel):
+    task_id: Optional[str] = None
+
 class GenerateDraftUrlRequest(BaseModel):
     draft_id: str
 
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 import shutil
 import json
 import os
 from services.save_draft_impl import download_script
 from infra.cache_service import draft_cache
+from infra.draft_lock import draft_locks
+from infra.task_progress import task_progress
 from typing import Any
 from api.dto import (
     AddVideoRequest,
@@ -18,6 +22,7 @@ from api.dto import (
     QueryScriptRequest,
     SaveDraftRequest,
     QueryDraftStatusRequest,
+    CancelSaveDraftRequest,
     GenerateDraftUrlRequest,
     GenerateBatchDraftRequest,
     TemplateCreateRequest,
@@ -33,6 +38,7 @@ from services import (
     add_effect_impl,
     add_sticker_impl,
     save_draft_impl,
+    cancel_save_draft,
     query_task_status,
     query_script_impl,
     create_draft,
@@ -49,6 +55,7 @@ from domain.pyJianYingDraft.metadata.animation_meta import Text_intro, Text_outr
 from domain.pyJianYingDraft.metadata.capcut_text_animation_meta import CapCut_Text_intro, CapCut_Text_outro, CapCut_Text_loop_anim
 from config import settings
 from infra.util import generate_draft_url as utilgenerate_draft_url, hex_to_rgb
+from infra.zip_stream import folder_entries, iter_zip
 from infra.logger import logger
 
 router = APIRouter()
@@ -386,7 +393,8 @@ def query_script(body: QueryScriptRequest) -> dict[str, Any]:
         if script is None:
             result["error"] = f"Draft {body.draft_id} does not exist in cache."
             return result
-        script_str = script.dumps()
+        with draft_locks.read(body.draft_id):
+            script_str = script.dumps()
         result["success"] = True
         result["output"] = script_str
         return result
@@ -401,7 +409,10 @@ def save_draft(body: SaveDraftRequest) -> dict[str, Any]:
         result["error"] = "Hi, the required parameter 'draft_id' is missing. Please add it and try again."
         return result
     try:
-        draft_result = save_draft_impl(body.draft_id, body.draft_folder)
+        draft_result = save_draft_impl(body.draft_id, body.draft_folder, body.priority)
+        if not draft_result.get("success"):
+            result["error"] = f"Error occurred while saving draft: {draft_result.get('error')}. "
+            return result
         result["success"] = True
         result["output"] = draft_result
         return result
@@ -417,7 +428,7 @@ def query_draft_status(body: QueryDraftStatusRequest) -> dict[str, Any]:
         return result
     try:
         task_status = query_task_status(body.task_id)
-        if task_status["status"] == "not_found":
+        if task_status is None or task_status["status"] == "not_found":
             result["error"] = f"Task with ID {body.task_id} not found. Please check if the task ID is correct."
             return result
         result["success"] = True
@@ -427,6 +438,40 @@ def query_draft_status(body: QueryDraftStatusRequest) -> dict[str, Any]:
         result["error"] = f"Error occurred while querying task status: {str(e)}."
         return result
 
+@router.post('/cancel_save_draft')
+def cancel_save_draft_route(body: CancelSaveDraftRequest) -> dict[str, Any]:
+    result = {"success": False, "output": "", "error": ""}
+    if not body.task_id:
+        result["error"] = "Hi, the required parameter 'task_id' is missing. Please add it and try again."
+        return result
+    try:
+        cancel_result = cancel_save_draft(body.task_id)
+        if not cancel_result["success"]:
+            result["error"] = cancel_result["error"]
+            return result
+        result["success"] = True
+        result["output"] = cancel_result
+        return result
+    except Exception as e:
+        result["error"] = f"Error occurred while cancelling save task: {str(e)}."
+        return result
+
+@router.get('/query_draft_status/stream')
+async def stream_draft_status(task_id: str):
+    """Server-Sent Events stream of task status, pushed on every published update until the task finishes"""
+    if await run_in_threadpool(task_progress.snapshot, task_id) is None:
+        return {"success": False, "output": "", "error": f"Task with ID {task_id} not found. Please check if the task ID is correct."}
+
+    # Async generator: waiting for updates holds no threadpool worker
+    async def event_stream():
+        async for task_status in task_progress.subscribe(task_id):
+            if task_status is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps(dict(task_status), ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @router.post('/generate_draft_url')
 def generate_draft_url(body: GenerateDraftUrlRequest) -> dict[str, Any]:
     result = {"success": False, "output": "", "error": ""}
@@ -674,7 +719,7 @@ def get_video_character_effect_types() -> dict[str, Any]:
         return result
 
 @router.get('/draft/downloader')
-def download_draft(draft_id: str, is_capcut: int = 1, background_tasks: BackgroundTasks = None):
+def download_draft(draft_id: str, is_capcut: int = 1):
     # Check cache
     script = draft_cache.get(draft_id)
     if not script:
@@ -685,8 +730,9 @@ def download_draft(draft_id: str, is_capcut: int = 1, background_tasks: Backgrou
     os.makedirs(temp_dir, exist_ok=True)
     
     try:
-        # Convert script to dict
-        script_data = json.loads(script.dumps())
+        # Convert script to dict; only the snapshot needs the draft lock, assets are fetched from the copy
+        with draft_locks.read(draft_id):
+            script_data = json.loads(script.dumps())
         
         # Download assets and generate draft structure
         # We pass temp_dir as draft_folder. download_script will create {temp_dir}/{draft_id}
@@ -697,24 +743,14 @@ def download_draft(draft_id: str, is_capcut: int = 1, background_tasks: Backgrou
             shutil.rmtree(temp_dir, ignore_errors=True)
             return dl_result
 
-        # Path to the generated draft folder
-        draft_path = os.path.join(temp_dir, draft_id)
-        
-        # Zip it
-        # output filename without extension
-        zip_base_name = os.path.join("tmp", "zips", draft_id)
-        os.makedirs(os.path.dirname(zip_base_name), exist_ok=True)
-        
-        zip_path = shutil.make_archive(zip_base_name, 'zip', root_dir=temp_dir, base_dir=draft_id)
-        
-        # Cleanup temp dir (source files) immediately
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        
-        # Schedule zip deletion
-        if background_tasks:
-            background_tasks.add_task(os.remove, zip_path)
-            
-        return FileResponse(zip_path, filename=f"{draft_id}.zip", media_type='application/zip')
+        # Stream the zip while it is built (media stored, JSON deflated); the source files
+        # are removed once the response has been sent
+        return StreamingResponse(
+            iter_zip(folder_entries(temp_dir, draft_id)),
+            media_type='application/zip',
+            headers={"Content-Disposition": f'attachment; filename="{draft_id}.zip"'},
+            background=BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True),
+        )
         
     except Exception as e:
         logger.error(f"Download failed: {e}", exc_info=True)
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -5,8 +6,19 @@ from api.routes import router
 from config import settings
 from infra.logger import logger
 from infra.oss import OSSConfigurationError
+from infra.job_queue import save_job_queue
+from infra.sweeper import sweeper
 
-app = FastAPI(title="CapCut API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Expire idle drafts/tasks and leaked temp files for the lifetime of the server
+    sweeper.start()
+    save_job_queue.start()
+    yield
+    save_job_queue.stop(timeout=5)
+    sweeper.stop()
+
+app = FastAPI(title="CapCut API", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Literal, Optional
 
 class OSSConfig(BaseModel):
     bucket_name: str = ""
@@ -15,7 +15,99 @@ class Settings(BaseSettings):
     PORT: int = Field(default=9001, alias="port")
     PREVIEW_ROUTER: str = Field(default="/draft/downloader", alias="preview_router")
     IS_UPLOAD_DRAFT: bool = Field(default=False, alias="is_upload_draft")
+
+    # Draft cache: hot in-memory tier budget (estimated bytes), evicted drafts spill to disk
+    DRAFT_CACHE_MAX_BYTES: int = Field(default=512 * 1024 * 1024, alias="draft_cache_max_bytes")
+    DRAFT_SPILL_DIR: str = Field(default="tmp/draft_spill", alias="draft_spill_dir")
+
+    # Draft/task store: "memory" (single process) or "sqlite" (shared by several worker processes)
+    DRAFT_STORE_BACKEND: Literal["memory", "sqlite"] = Field(default="memory", alias="draft_store_backend")
+    DRAFT_STORE_PATH: str = Field(default="tmp/draft_store.sqlite3", alias="draft_store_path")
+    DRAFT_STORE_LOCAL_CACHE_SIZE: int = Field(default=256, alias="draft_store_local_cache_size")
+
+    # Expiry (seconds, 0 disables): idle = since last use, max age = since creation
+    DRAFT_IDLE_TTL: float = Field(default=24 * 3600, alias="draft_idle_ttl")
+    DRAFT_MAX_AGE: float = Field(default=7 * 24 * 3600, alias="draft_max_age")
+    TASK_IDLE_TTL: float = Field(default=3600, alias="task_idle_ttl")
+    TASK_MAX_AGE: float = Field(default=24 * 3600, alias="task_max_age")
+    # Background sweeper: run interval and max age of untouched temp downloads/zips
+    SWEEP_INTERVAL: float = Field(default=60, alias="sweep_interval")
+    TEMP_ARTIFACT_TTL: float = Field(default=3600, alias="temp_artifact_ttl")
+
+    # Task progress: max published updates per second per task (intermediate updates are coalesced)
+    TASK_PROGRESS_MAX_UPDATES_PER_SECOND: float = Field(default=4.0, alias="task_progress_max_updates_per_second")
+
+    # HTTP downloads: read buffer size and keep-alive connections pooled per host
+    DOWNLOAD_CHUNK_SIZE: int = Field(default=256 * 1024, alias="download_chunk_size")
+    DOWNLOAD_POOL_SIZE: int = Field(default=16, alias="download_pool_size")
+    # Files of at least this size (0 disables) are fetched as parallel byte ranges when the server supports it
+    DOWNLOAD_SEGMENT_THRESHOLD: int = Field(default=32 * 1024 * 1024, alias="download_segment_threshold")
+    DOWNLOAD_SEGMENTS: int = Field(default=4, alias="download_segments")
+    DOWNLOAD_SEGMENT_WORKERS: int = Field(default=16, alias="download_segment_workers")
+
+    # Transfer engine shared by all save tasks: total concurrent transfers and per-host cap
+    TRANSFER_MAX_CONNECTIONS: int = Field(default=32, alias="transfer_max_connections")
+    TRANSFER_PER_HOST_LIMIT: int = Field(default=8, alias="transfer_per_host_limit")
+
+    # Transfer scheduler under all downloads: adaptive concurrency bounds and total bandwidth cap (bytes/s, 0 = unlimited)
+    TRANSFER_INITIAL_CONCURRENCY: int = Field(default=16, alias="transfer_initial_concurrency")
+    TRANSFER_MIN_CONCURRENCY: int = Field(default=2, alias="transfer_min_concurrency")
+    TRANSFER_MAX_CONCURRENCY: int = Field(default=32, alias="transfer_max_concurrency")
+    TRANSFER_BANDWIDTH_LIMIT: int = Field(default=0, alias="transfer_bandwidth_limit")
+
+    # Failing media URLs: seconds a failed URL is skipped, consecutive connection failures that open
+    # a host's circuit breaker and seconds until it lets a trial request through
+    NEGATIVE_CACHE_TTL: float = Field(default=60, alias="negative_cache_ttl")
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = Field(default=5, alias="circuit_breaker_failure_threshold")
+    CIRCUIT_BREAKER_RESET_TIMEOUT: float = Field(default=30, alias="circuit_breaker_reset_timeout")
+
+    # ffprobe processes and ffmpeg downloads running at once, in separate pools (0 = CPU count),
+    # and seconds before an ffmpeg download is killed (0 = no limit)
+    MEDIA_TOOL_CONCURRENCY: int = Field(default=0, alias="media_tool_concurrency")
+    MEDIA_TRANSFER_CONCURRENCY: int = Field(default=0, alias="media_transfer_concurrency")
+    FFMPEG_TIMEOUT: float = Field(default=600, alias="ffmpeg_timeout")
+
+    # Save job queue: worker threads, max queued saves and saves of one draft running at once
+    SAVE_WORKERS: int = Field(default=4, alias="save_workers")
+    SAVE_QUEUE_MAX_SIZE: int = Field(default=1000, alias="save_queue_max_size")
+    SAVE_PER_DRAFT_CONCURRENCY: int = Field(default=1, alias="save_per_draft_concurrency")
+
+    # Incremental saves: keep a manifest of each draft's last save (and its folder unless the draft is uploaded),
+    # transfer only changed materials
+    SAVE_INCREMENTAL: bool = Field(default=True, alias="save_incremental")
+    SAVE_MANIFEST_DIR: str = Field(default="tmp/save_manifests", alias="save_manifest_dir")
+
+    # Media metadata probing: concurrent probes, seconds per ffprobe run and for a draft's whole probe stage (0 = no limit)
+    PROBE_WORKERS: int = Field(default=16, alias="probe_workers")
+    PROBE_TIMEOUT: float = Field(default=30, alias="probe_timeout")
+    PROBE_STAGE_BUDGET: float = Field(default=300, alias="probe_stage_budget")
+    # Persistent ffprobe result cache (keyed by URL + ETag/Content-Length or path + mtime/size)
+    PROBE_CACHE_ENABLED: bool = Field(default=True, alias="probe_cache_enabled")
+    PROBE_CACHE_PATH: str = Field(default="tmp/probe_cache.sqlite3", alias="probe_cache_path")
+    # Read MP4/MOV metadata from the moov box in-process instead of starting ffprobe
+    MP4_PARSER_ENABLED: bool = Field(default=True, alias="mp4_parser_enabled")
+    # Bytes fetched (Range request) to read a remote image's dimensions from its header
+    IMAGE_HEADER_BYTES: int = Field(default=64 * 1024, alias="image_header_bytes")
+
+    # Shared content-addressed store of downloaded assets, hardlinked into draft folders
+    ASSET_STORE_ENABLED: bool = Field(default=True, alias="asset_store_enabled")
+    ASSET_STORE_DIR: str = Field(default="tmp/asset_store", alias="asset_store_dir")
+    ASSET_STORE_QUOTA_BYTES: int = Field(default=20 * 1024 * 1024 * 1024, alias="asset_store_quota_bytes")
+    # Seconds after which a cached asset is revalidated (HEAD, ETag/Last-Modified/size) before reuse
+    ASSET_STORE_REVALIDATE_AFTER: float = Field(default=24 * 3600, alias="asset_store_revalidate_after")
     
+    # OSS uploads: files from the threshold size up go multipart with parallel parts, resumable via local checkpoints
+    OSS_MULTIPART_THRESHOLD: int = Field(default=64 * 1024 * 1024, alias="oss_multipart_threshold")
+    OSS_PART_SIZE: int = Field(default=16 * 1024 * 1024, alias="oss_part_size")
+    OSS_UPLOAD_THREADS: int = Field(default=4, alias="oss_upload_threads")
+    OSS_UPLOAD_RETRIES: int = Field(default=3, alias="oss_upload_retries")
+    OSS_CHECKPOINT_DIR: str = Field(default="tmp/oss_checkpoints", alias="oss_checkpoint_dir")
+    # Part size (= in-memory buffer per asset) of assets streamed straight into OSS
+    OSS_STREAM_PART_SIZE: int = Field(default=8 * 1024 * 1024, alias="oss_stream_part_size")
+    # Upload format when IS_UPLOAD_DRAFT is on: "zip" (one archive) or "stream" (assets streamed into
+    # OSS under <draft_id>/ next to draft_info.json and a manifest.json, nothing staged on disk)
+    DRAFT_UPLOAD_MODE: Literal["zip", "stream"] = Field(default="zip", alias="draft_upload_mode")
+
     OSS_CONFIG: OSSConfig = Field(default_factory=OSSConfig, alias="oss_config")
     MP4_OSS_CONFIG: OSSConfig = Field(default_factory=OSSConfig, alias="mp4_oss_config")
 
@@ -5,6 +5,7 @@ import shutil
 
 from typing import List
 
+from infra.template_cache import template_cache
 from .script_file import Script_file
 
 class Draft_folder:
@@ -105,8 +106,7 @@ class Draft_folder:
         if os.path.exists(new_draft_path) and not allow_replace:
             raise FileExistsError(f"新草稿 {new_draft_name} 已存在且不允许覆盖")
 
-        # 复制草稿文件夹
-        shutil.copytree(template_path, new_draft_path, dirs_exist_ok=allow_replace)
-
-        # 打开草稿
-        return self.load_template(new_draft_name)
+        # 从模板缓存写出草稿文件夹, 并直接使用缓存的草稿内容打开草稿
+        template_cache.materialize(template_path, new_draft_path, allow_replace=allow_replace)
+        return Script_file.from_template_content(template_cache.load_json(os.path.join(template_path, "draft_info.json")),
+                                                 os.path.join(new_draft_path, "draft_info.json"))
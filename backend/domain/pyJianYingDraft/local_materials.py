@@ -5,6 +5,7 @@ import json
 from typing import Optional, Literal
 from typing import Dict, Any
 import imageio.v2 as imageio
+from infra.media_probe import first_stream, probe_media
 
 class Crop_settings:
     """素材的裁剪设置, 各属性均在0-1之间, 注意素材的坐标原点在左上角"""
@@ -149,29 +150,12 @@ class Video_material:
         
         # 如果没有提供duration，则使用ffprobe获取
         try:
-            # 使用ffprobe获取媒体信息
+            # 使用ffprobe获取媒体信息 (经由持久化探测缓存, 仅在未命中时运行ffprobe)
             media_path = self.path if self.path else self.remote_url
-            command = [
-                'ffprobe',
-                '-v', 'error',
-                '-select_streams', 'v:0',  # 选择第一个视频流
-                '-show_entries', 'stream=width,height,duration,codec_type',  # 添加codec_type
-                '-show_entries', 'format=duration,format_name',  # 添加format_name
-                '-of', 'json',
-                media_path
-            ]
-            result = subprocess.check_output(command, stderr=subprocess.STDOUT)
-            result_str = result.decode('utf-8')
-            # 查找JSON开始位置（第一个'{'）
-            json_start = result_str.find('{')
-            if json_start != -1:
-                json_str = result_str[json_start:]
-                info = json.loads(json_str)
-            else:
-                raise ValueError(f"无法在输出中找到JSON数据: {result_str}")
-            
-            if 'streams' in info and len(info['streams']) > 0:
-                stream = info['streams'][0]
+            info = probe_media(media_path)
+            stream = first_stream(info, "video")  # 第一个视频流
+
+            if stream is not None:
                 self.width = int(stream.get('width', 0))
                 self.height = int(stream.get('height', 0))
                 
@@ -328,51 +312,16 @@ class Audio_material:
         self.duration = 0  # 初始化为0，如果有path则后续会更新
     
         try:
-            # 使用ffprobe获取音频信息
-            command = [
-                'ffprobe',
-                '-v', 'error',
-                '-select_streams', 'a:0',  # 选择第一个音频流
-                '-show_entries', 'stream=duration',
-                '-show_entries', 'format=duration',
-                '-of', 'json',
-                path if path else remote_url
-            ]
-            result = subprocess.check_output(command, stderr=subprocess.STDOUT)
-            result_str = result.decode('utf-8')
-            # 查找JSON开始位置（第一个'{'）
-            json_start = result_str.find('{')
-            if json_start != -1:
-                json_str = result_str[json_start:]
-                info = json.loads(json_str)
-            else:
-                raise ValueError(f"无法在输出中找到JSON数据: {result_str}")
+            # 使用ffprobe获取音频信息 (经由持久化探测缓存, 一次探测同时得到音频流与视频流)
+            info = probe_media(path if path else remote_url)
 
             # 检查是否有视频流
-            video_command = [
-                'ffprobe',
-                '-v', 'error',
-                '-select_streams', 'v:0',
-                '-show_entries', 'stream=codec_type',
-                '-of', 'json',
-                path if path else remote_url
-            ]
-            video_result = subprocess.check_output(video_command, stderr=subprocess.STDOUT)
-            video_result_str = video_result.decode('utf-8')
-            # 查找JSON开始位置（第一个'{'）
-            video_json_start = video_result_str.find('{')
-            if video_json_start != -1:
-                video_json_str = video_result_str[video_json_start:]
-                video_info = json.loads(video_json_str)
-            else:
-                print(f"无法在输出中找到JSON数据: {video_result_str}")
-            
-            if 'streams' in video_info and len(video_info['streams']) > 0:
+            if first_stream(info, "video") is not None:
                 raise ValueError("音频素材不应包含视频轨道")
 
             # 检查音频流
-            if 'streams' in info and len(info['streams']) > 0:
-                stream = info['streams'][0]
+            stream = first_stream(info, "audio")  # 第一个音频流
+            if stream is not None:
                 # 优先使用流的duration，如果没有则使用格式的duration
                 duration_value = stream.get('duration') or info['format'].get('duration', '0')
                 self.duration = int(float(duration_value) * 1e6)  # 转换为微秒
@@ -20,6 +20,7 @@ from .text_segment import Text_segment, Text_style, TextBubble, Text_border, Tex
 from .track import Track_type, Base_track, Track
 
 from config import settings
+from infra.template_cache import template_cache
 from .metadata import Video_scene_effect_type, Video_character_effect_type, Filter_type, Font_type
 
 class Script_material:
@@ -204,8 +205,8 @@ class Script_file:
         self.imported_materials = {}
         self.imported_tracks = []
 
-        with open(os.path.join(os.path.dirname(__file__), self.TEMPLATE_FILE), "r", encoding="utf-8") as f:
-            self.content = json.load(f)
+        # 模板内容由模板缓存提供副本, 不必每次都读取并解析文件
+        self.content = template_cache.load_json(os.path.join(os.path.dirname(__file__), self.TEMPLATE_FILE))
 
     @staticmethod
     def load_template(json_path: str) -> "Script_file":
@@ -217,12 +218,23 @@ class Script_file:
         Raises:
             `FileNotFoundError`: JSON文件不存在
         """
-        obj = Script_file(**util.provide_ctor_defaults(Script_file))
-        obj.save_path = json_path
         if not os.path.exists(json_path):
             raise FileNotFoundError("JSON文件 '%s' 不存在" % json_path)
         with open(json_path, "r", encoding="utf-8") as f:
-            obj.content = json.load(f)
+            content = json.load(f)
+        return Script_file.from_template_content(content, json_path)
+
+    @staticmethod
+    def from_template_content(content: Dict[str, Any], save_path: Optional[str] = None) -> "Script_file":
+        """从已解析的草稿内容创建模板模式的草稿对象
+
+        Args:
+            content (Dict[str, Any]): 草稿内容, 将被草稿对象直接使用(不会复制)
+            save_path (str, optional): 草稿文件的保存路径
+        """
+        obj = Script_file(**util.provide_ctor_defaults(Script_file))
+        obj.save_path = save_path
+        obj.content = content
 
         util.assign_attr_with_json(obj, ["fps", "duration"], obj.content)
         util.assign_attr_with_json(obj, ["width", "height"], obj.content["canvas_config"])
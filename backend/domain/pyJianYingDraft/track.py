@@ -1,10 +1,11 @@
 """轨道类及其元数据"""
 
 import uuid
+import bisect
 
 from enum import Enum
 from typing import TypeVar, Generic, Type
-from typing import Dict, List, Any, Union
+from typing import Dict, List, Tuple, Any, Union
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
 import domain.pyJianYingDraft as draft
@@ -195,6 +196,41 @@ class Track(Base_track, Generic[Seg_type]):
         self.segments.append(segment)
         return self
 
+    def find_overlaps(self) -> List[Tuple[int, int]]:
+        """按添加顺序检查片段的时间范围冲突, 不修改轨道
+
+        片段依次加入, 与已保留的片段重叠的片段被视为冲突(先添加的片段优先保留).
+        已保留的片段按开始时间有序且互不重叠, 因此每个片段只需用二分查找与其前一个已保留片段比较, 总复杂度为O(n log n).
+
+        Returns:
+            `List[Tuple[int, int]]`: (与之冲突的已保留片段下标, 冲突片段下标)列表, 按冲突片段下标升序
+        """
+        kept: List[Tuple[int, int, int]] = []  # (start, end, index), 按(start, end)排序
+        conflicts: List[Tuple[int, int]] = []
+        for index, segment in enumerate(self.segments):
+            start, end = segment.target_timerange.start, segment.target_timerange.end
+            # 开始时间早于end的已保留片段中, 最后一个的结束时间最晚
+            position = bisect.bisect_left(kept, (end,))
+            if position > 0 and kept[position - 1][1] > start:
+                conflicts.append((kept[position - 1][2], index))
+                continue
+            bisect.insort(kept, (start, end, index))
+        return conflicts
+
+    def resolve_overlaps(self) -> List[Tuple[Seg_type, Seg_type]]:
+        """删除与先添加的片段时间范围冲突的片段, 规则同`find_overlaps`
+
+        Returns:
+            `List[Tuple[Seg_type, Seg_type]]`: (与之冲突的保留片段, 被删除的片段)列表, 按被删除片段的原顺序
+        """
+        conflicts = self.find_overlaps()
+        if not conflicts:
+            return []
+        removed = [(self.segments[kept], self.segments[index]) for kept, index in conflicts]
+        removed_indices = {index for _, index in conflicts}
+        self.segments[:] = [segment for index, segment in enumerate(self.segments) if index not in removed_indices]
+        return removed
+
     def export_json(self) -> Dict[str, Any]:
         # 为每个片段写入render_index
         segment_exports = [seg.export_json() for seg in self.segments]
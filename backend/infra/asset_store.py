@@ -0,0 +1,235 @@
+from typing import Any, Dict, Optional
+import json
+import os
+import shutil
+import threading
+import time
+import requests
+from config import settings
+from infra.logger import logger
+from .downloader import download_file
+from .single_flight import single_flight
+from .url_health import UrlUnavailableError, url_health
+from .util import url_to_hash
+
+FICLONE = 0x40049409  # Linux ioctl: share the source file's extents (reflink)
+
+def _reflink(src: str, dst: str) -> bool:
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Materialize src at dst as a hardlink, else a reflink, else a plain copy"""
+    directory = os.path.dirname(dst)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if os.path.lexists(dst):
+        # Never write through an existing path, it may itself be a hardlink into the store
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    if not _reflink(src, dst):
+        shutil.copy2(src, dst)
+
+class AssetStore:
+    """
+    Persistent content-addressed cache of remote assets shared by all drafts.
+
+    Blobs are keyed by the URL hash and stored with a JSON sidecar holding the size and
+    ETag/Last-Modified seen at download time and when the blob was last used. Cached blobs
+    older than `revalidate_after` are checked with a HEAD request before reuse. Least recently
+    used blobs are removed when the store grows beyond `quota_bytes`.
+
+    Blobs themselves are never touched after download: drafts hold hardlinks to them, and a
+    changed mtime would make every draft sharing the blob look modified.
+    """
+
+    def __init__(self, root: str, quota_bytes: int, revalidate_after: float):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.revalidate_after = revalidate_after
+        self._lock = threading.Lock()
+        # Striped per-key locks, held only while a blob's sidecar is written or the blob is
+        # replaced, linked or evicted (never during downloads)
+        self._key_locks = [threading.Lock() for _ in range(256)]
+        os.makedirs(self.root, exist_ok=True)
+        self._total_bytes = sum(os.path.getsize(path) for path in self._blobs())
+
+    def _blobs(self):
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith((".json", ".tmp")):
+                    yield os.path.join(directory, name)
+
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        return self._key_locks[int(key[:8], 16) % len(self._key_locks)]
+
+    @staticmethod
+    def _remote_validators(url: str) -> Dict[str, Any]:
+        """Size and ETag/Last-Modified advertised by the server, empty if HEAD is not supported"""
+        try:
+            url_health.check(url)
+            response = requests.head(url, allow_redirects=True, timeout=10)
+            if response.status_code >= 400:
+                return {}
+            length = response.headers.get("Content-Length")
+            return {
+                "size": int(length) if length and length.isdigit() else None,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+        except (requests.RequestException, UrlUnavailableError):
+            return {}
+
+    @staticmethod
+    def _read_meta(blob_path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(f"{blob_path}.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_meta(blob_path: str, meta: Dict[str, Any]) -> None:
+        # Atomic replace: the sidecar is read without the key lock
+        tmp_path = f"{blob_path}.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, f"{blob_path}.json")
+
+    def _last_used(self, blob_path: str, mtime: float) -> float:
+        """When a blob was last used, from its sidecar (the download time for blobs without a record)"""
+        meta = self._read_meta(blob_path) or {}
+        return meta.get("last_used") or meta.get("verified_at") or mtime
+
+    def _set_meta_fields_locked(self, blob_path: str, **fields: Any) -> None:
+        """Update fields of a blob's sidecar; the caller holds the blob's key lock"""
+        meta = self._read_meta(blob_path)
+        if meta is not None:
+            meta.update(fields)
+            self._write_meta(blob_path, meta)
+
+    def _is_valid(self, url: str, blob_path: str, meta: Optional[Dict[str, Any]]) -> bool:
+        if meta is None or not os.path.exists(blob_path) or meta.get("url") != url:
+            return False
+        if meta.get("size") is not None and os.path.getsize(blob_path) != meta["size"]:
+            return False
+        if time.time() - meta.get("verified_at", 0) < self.revalidate_after:
+            return True
+        remote = self._remote_validators(url)
+        for field in ("etag", "last_modified", "size"):
+            if remote.get(field) and meta.get(field) and remote[field] != meta[field]:
+                logger.info(f"Cached asset for {url} is outdated ({field} changed), downloading again.")
+                return False
+        with self._key_lock(os.path.basename(blob_path)):
+            self._set_meta_fields_locked(blob_path, verified_at=time.time())
+        return True
+
+    def _insert(self, url: str, blob_path: str) -> bool:
+        validators = self._remote_validators(url)
+        tmp_path = f"{blob_path}.tmp"
+        if not download_file(url, tmp_path):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        size = os.path.getsize(tmp_path)
+        with self._key_lock(os.path.basename(blob_path)):
+            old_size = os.path.getsize(blob_path) if os.path.exists(blob_path) else 0
+            os.replace(tmp_path, blob_path)
+            now = time.time()
+            self._write_meta(blob_path, {**validators, "url": url, "size": size, "verified_at": now, "last_used": now})
+        with self._lock:
+            self._total_bytes += size - old_size
+        return True
+
+    def _ensure(self, url: str, blob_path: str) -> bool:
+        """Make sure the store holds a valid blob for the URL, downloading it if needed"""
+        if self._is_valid(url, blob_path, self._read_meta(blob_path)):
+            logger.info(f"Asset store hit for {url}")
+            return True
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        return self._insert(url, blob_path)
+
+    def fetch(self, url: str, local_filename: str) -> bool:
+        """Drop-in replacement for download_file that serves remote assets from the store"""
+        if os.path.isfile(url):
+            return download_file(url, local_filename)
+
+        key = url_to_hash(url, 64)
+        blob_path = self._blob_path(key)
+        # Second attempt only when garbage collection evicted the blob before it was linked
+        for _ in range(2):
+            # Concurrent fetches of one URL share a single validation/download; no lock is held meanwhile
+            if not single_flight.do(("asset_store", key), self._ensure, url, blob_path):
+                return False
+            # Short critical section, excludes eviction of the blob while it is linked
+            with self._key_lock(key):
+                if os.path.exists(blob_path):
+                    # Recorded for garbage collection in the sidecar, never as the blob's mtime
+                    self._set_meta_fields_locked(blob_path, last_used=time.time())
+                    link_or_copy(blob_path, local_filename)
+                    break
+        else:
+            logger.error(f"Cached asset for {url} was evicted before it could be linked.")
+            return False
+        if self._total_bytes > self.quota_bytes:
+            self.collect_garbage()
+        return True
+
+    def collect_garbage(self) -> None:
+        """Delete least recently used blobs until the store is back under 90% of its quota"""
+        target = self.quota_bytes * 0.9
+        blobs = []
+        for path in self._blobs():
+            try:
+                stat = os.stat(path)
+                blobs.append((self._last_used(path, stat.st_mtime), stat.st_size, path))
+            except OSError:
+                pass
+        blobs.sort()
+        total = sum(size for _, size, _ in blobs)
+        for _, size, path in blobs:
+            if total <= target:
+                break
+            key = os.path.basename(path)
+            with self._key_lock(key):
+                try:
+                    # Drafts keep their own hardlinks, removing the store's name does not affect them
+                    os.remove(path)
+                    if os.path.exists(f"{path}.json"):
+                        os.remove(f"{path}.json")
+                    total -= size
+                except OSError as e:
+                    logger.error(f"Failed to evict cached asset {path}: {e}")
+        with self._lock:
+            self._total_bytes = total
+        logger.info(f"Asset store garbage collection finished, {total / 1024 / 1024:.1f}MB in use.")
+
+# Initialize Singleton
+asset_store = AssetStore(
+    root=settings.ASSET_STORE_DIR,
+    quota_bytes=settings.ASSET_STORE_QUOTA_BYTES,
+    revalidate_after=settings.ASSET_STORE_REVALIDATE_AFTER,
+)
+
+def fetch_asset(url: str, local_filename: str) -> bool:
+    """Fetch an asset through the shared asset store, or directly when the store is disabled"""
+    if not settings.ASSET_STORE_ENABLED:
+        return download_file(url, local_filename)
+    return asset_store.fetch(url, local_filename)
@@ -1,95 +1,338 @@
-from typing import Dict, Any, Optional, TypeVar, Generic
+from typing import Dict, Any, List, Optional, TypeVar, Generic, Callable, Mapping
 from collections import OrderedDict
+from types import MappingProxyType
+import hashlib
+import json
+import os
+import pickle
 import threading
 import time
+import zlib
+from config import settings
+from infra.logger import logger
+from .draft_store import DraftStore, MemoryDraftStore, SqliteDraftStore, TaskStatus
 
 T = TypeVar('T')
 
 class ThreadSafeCache(Generic[T]):
-    def __init__(self, capacity: int = 1000):
+    """
+    Thread-safe LRU cache with optional expiry.
+    idle_ttl: seconds an entry may go unused; absolute_ttl: seconds since it was first stored.
+    Expired entries are dropped on access and by purge_expired().
+    """
+
+    def __init__(self, capacity: int = 1000, idle_ttl: Optional[float] = None, absolute_ttl: Optional[float] = None):
         self.capacity = capacity
+        self.idle_ttl = idle_ttl
+        self.absolute_ttl = absolute_ttl
         self._cache: OrderedDict[str, T] = OrderedDict()
+        self._created: Dict[str, float] = {}
+        self._accessed: Dict[str, float] = {}
         self._lock = threading.RLock()
 
+    def _is_expired(self, created: float, accessed: float, now: float) -> bool:
+        if self.idle_ttl and now - accessed > self.idle_ttl:
+            return True
+        if self.absolute_ttl and now - created > self.absolute_ttl:
+            return True
+        return False
+
+    def _touch(self, key: str) -> None:
+        now = time.time()
+        self._created.setdefault(key, now)
+        self._accessed[key] = now
+        self._cache.move_to_end(key)
+
+    def _remove(self, key: str) -> None:
+        del self._cache[key]
+        self._created.pop(key, None)
+        self._accessed.pop(key, None)
+
+    def _live(self, key: str) -> bool:
+        """True if the key is in memory and not expired; expired entries are removed"""
+        if key not in self._cache:
+            return False
+        if self._is_expired(self._created[key], self._accessed[key], time.time()):
+            self._remove(key)
+            return False
+        return True
+
     def get(self, key: str) -> Optional[T]:
         with self._lock:
-            if key not in self._cache:
+            if not self._live(key):
                 return None
-            self._cache.move_to_end(key)
+            self._touch(key)
             return self._cache[key]
 
     def put(self, key: str, value: T) -> None:
         with self._lock:
-            if key in self._cache:
-                self._cache.move_to_end(key)
             self._cache[key] = value
+            self._touch(key)
             if len(self._cache) > self.capacity:
-                self._cache.popitem(last=False)
+                self._remove(next(iter(self._cache)))
+
+    def update(self, key: str, func: Callable[[T], T]) -> Optional[T]:
+        """Atomically replace an existing value with func(value), returns the new value"""
+        with self._lock:
+            if not self._live(key):
+                return None
+            value = func(self._cache[key])
+            self._cache[key] = value
+            self._touch(key)
+            return value
 
     def delete(self, key: str) -> None:
         with self._lock:
             if key in self._cache:
-                del self._cache[key]
+                self._remove(key)
 
     def contains(self, key: str) -> bool:
         with self._lock:
-            return key in self._cache
+            return self._live(key)
+
+    def purge_expired(self) -> List[str]:
+        """Remove all expired entries, returns their keys"""
+        if not self.idle_ttl and not self.absolute_ttl:
+            return []
+        with self._lock:
+            now = time.time()
+            expired = [key for key in self._cache if self._is_expired(self._created[key], self._accessed[key], now)]
+            for key in expired:
+                self._remove(key)
+            return expired
             
     def clear(self) -> None:
         with self._lock:
-            self._cache.clear()
+            for key in list(self._cache):
+                self._remove(key)
+
+class SpillableCache(ThreadSafeCache[T]):
+    """
+    Two-tier LRU cache: a hot in-memory tier bounded by estimated byte size,
+    backed by a compressed on-disk tier. Entries evicted from memory are written
+    to disk and transparently rehydrated on the next get().
+    """
+
+    def __init__(self, max_bytes: int, spill_dir: str, sizeof: Callable[[T], int],
+                 idle_ttl: Optional[float] = None, absolute_ttl: Optional[float] = None):
+        super().__init__(capacity=0, idle_ttl=idle_ttl, absolute_ttl=absolute_ttl)
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self._sizeof = sizeof
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+    def _spill_path(self, key: str) -> str:
+        # Keys come from request payloads, so never use them as file names directly
+        return os.path.join(self.spill_dir, f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}.pkl.z")
+
+    def _track_size(self, key: str, value: T) -> None:
+        size = self._sizeof(value)
+        self._total_bytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+
+    def _remove(self, key: str) -> None:
+        super()._remove(key)
+        self._total_bytes -= self._sizes.pop(key, 0)
+
+    def _spill(self, key: str, value: T, created: float) -> None:
+        # A one-line JSON header lets the sweeper expire spilled entries without unpickling them
+        path = self._spill_path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps({"key": key, "created_at": created}).encode("utf-8") + b"\n")
+            f.write(zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_header(f) -> Dict[str, Any]:
+        return json.loads(f.readline().decode("utf-8"))
+
+    def _load(self, key: str) -> Optional[T]:
+        path = self._spill_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                header = self._read_header(f)
+                if header["key"] != key:
+                    return None
+                # The spill time is the last time the entry was used
+                if self._is_expired(header["created_at"], os.path.getmtime(path), time.time()):
+                    value = None
+                else:
+                    value = pickle.loads(zlib.decompress(f.read()))
+        except Exception as e:
+            logger.error(f"Failed to rehydrate cache entry {key} from {path}: {e}")
+            return None
+        os.remove(path)
+        if value is not None:
+            self._created[key] = header["created_at"]
+        return value
+
+    def _evict(self) -> None:
+        # Always keep the most recently used entry in memory, even if it alone exceeds the budget
+        while self._total_bytes > self.max_bytes and len(self._cache) > 1:
+            key = next(iter(self._cache))
+            value, created = self._cache[key], self._created[key]
+            self._remove(key)
+            try:
+                self._spill(key, value, created)
+            except Exception as e:
+                logger.error(f"Failed to spill cache entry {key} to disk, entry dropped: {e}")
+
+    def get(self, key: str) -> Optional[T]:
+        # Disk I/O stays under the lock so that concurrent readers of a spilled
+        # entry all rehydrate the very same object
+        with self._lock:
+            if self._live(key):
+                value = self._cache[key]
+            else:
+                value = self._load(key)
+                if value is None:
+                    return None
+                self._cache[key] = value
+            self._touch(key)
+            # Entries are mutated in place by callers, so re-estimate on every access
+            self._track_size(key, value)
+            self._evict()
+            return value
+
+    def put(self, key: str, value: T) -> None:
+        with self._lock:
+            if key not in self._cache:
+                # Drop a stale spilled copy, the new value supersedes it
+                path = self._spill_path(key)
+                if os.path.exists(path):
+                    os.remove(path)
+            self._cache[key] = value
+            self._touch(key)
+            self._track_size(key, value)
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._cache:
+                self._remove(key)
+            path = self._spill_path(key)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return self._live(key) or os.path.exists(self._spill_path(key))
+
+    def purge_expired(self) -> List[str]:
+        expired = super().purge_expired()
+        if not self.idle_ttl and not self.absolute_ttl:
+            return expired
+        with self._lock:
+            now = time.time()
+            for filename in os.listdir(self.spill_dir):
+                if not filename.endswith(".pkl.z"):
+                    continue
+                path = os.path.join(self.spill_dir, filename)
+                try:
+                    with open(path, "rb") as f:
+                        header = self._read_header(f)
+                    if self._is_expired(header["created_at"], os.path.getmtime(path), now):
+                        os.remove(path)
+                        expired.append(header["key"])
+                except Exception as e:
+                    logger.error(f"Failed to check spilled cache entry {path}: {e}")
+        return expired
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            for filename in os.listdir(self.spill_dir):
+                if filename.endswith(".pkl.z"):
+                    os.remove(os.path.join(self.spill_dir, filename))
+
+# Rough in-memory footprint of a Script_file: the parsed draft template plus
+# per-segment and per-material objects (measured with tracemalloc)
+DRAFT_BASE_BYTES = 16 * 1024
+DRAFT_SEGMENT_BYTES = 2 * 1024
+DRAFT_MATERIAL_BYTES = 1024
+
+def estimate_draft_size(script: Any) -> int:
+    """Cheaply estimate the memory used by a Script_file without serializing it"""
+    segments = sum(len(track.segments) for track in script.tracks.values())
+    segments += sum(len(getattr(track, "segments", [])) for track in script.imported_tracks)
+    materials = sum(len(items) for items in vars(script.materials).values() if isinstance(items, list))
+    return DRAFT_BASE_BYTES + segments * DRAFT_SEGMENT_BYTES + materials * DRAFT_MATERIAL_BYTES
+
+def create_draft_store() -> DraftStore:
+    """Build the draft/task store selected by settings.DRAFT_STORE_BACKEND"""
+    if settings.DRAFT_STORE_BACKEND == "sqlite":
+        return SqliteDraftStore(
+            settings.DRAFT_STORE_PATH,
+            local_cache=ThreadSafeCache(capacity=settings.DRAFT_STORE_LOCAL_CACHE_SIZE),
+            draft_idle_ttl=settings.DRAFT_IDLE_TTL or None,
+            draft_absolute_ttl=settings.DRAFT_MAX_AGE or None,
+            task_idle_ttl=settings.TASK_IDLE_TTL or None,
+            task_absolute_ttl=settings.TASK_MAX_AGE or None,
+        )
+    return MemoryDraftStore(
+        drafts=SpillableCache(
+            max_bytes=settings.DRAFT_CACHE_MAX_BYTES,
+            spill_dir=settings.DRAFT_SPILL_DIR,
+            sizeof=estimate_draft_size,
+            idle_ttl=settings.DRAFT_IDLE_TTL or None,
+            absolute_ttl=settings.DRAFT_MAX_AGE or None,
+        ),
+        tasks=ThreadSafeCache(
+            capacity=1000,
+            idle_ttl=settings.TASK_IDLE_TTL or None,
+            absolute_ttl=settings.TASK_MAX_AGE or None,
+        ),
+    )
 
 # Initialize Singletons
-draft_cache = ThreadSafeCache(capacity=10000)
-task_cache = ThreadSafeCache(capacity=1000)
+draft_store = create_draft_store()
+# Drafts are read and written through the store: get/put/delete/contains/commit
+draft_cache = draft_store
 
 def update_cache(key: str, value: Any) -> None:
     draft_cache.put(key, value)
 
-def get_task_status(task_id: str) -> Dict[str, Any]:
-    return task_cache.get(task_id)
+# Task statuses are stored as read-only mappings and replaced on every update
+# (copy-on-write), so a status returned to a reader is an immutable snapshot
+# that never changes underneath it.
+def _snapshot(fields: Dict[str, Any]) -> TaskStatus:
+    return MappingProxyType(fields)
+
+def get_task_status(task_id: str) -> Optional[TaskStatus]:
+    return draft_store.get_task(task_id)
 
-def update_tasks_cache(task_id: str, task_status: Dict[str, Any]) -> None:
-    task_cache.put(task_id, task_status)
+def update_tasks_cache(task_id: str, task_status: Mapping[str, Any]) -> None:
+    draft_store.put_task(task_id, _snapshot({**task_status, "updated_at": time.time()}))
 
 def create_task(task_id: str) -> None:
-    task_cache.put(task_id, {
+    now = time.time()
+    draft_store.put_task(task_id, _snapshot({
         "status": "initialized",
         "progress": 0,
         "message": "Task initialized",
         "data": None,
-        "created_at": time.time(),
-        "updated_at": time.time()
-    })
-
-def update_task_field(task_id: str, field: str, value: Any) -> None:
-    # This requires read-modify-write, so we need lock on the whole operation if possible
-    # But our cache exposes atomic put/get. 
-    # For dictionary updates inside the value, we need to be careful if multiple threads modify the SAME task.
-    # Given the simplicity, we'll retrieve, update, put back. 
-    # Ideally, we should add a method to cache to update field atomically.
-    # But for now:
-    task = task_cache.get(task_id)
-    if task:
-        task[field] = value
-        task["updated_at"] = time.time()
-        # No need to put back if it's the same object reference, but move_to_end is handled by get/put
-        # So we should call put to ensure LRU update? 
-        # get() already moves to end.
-        pass
-
-def update_task_fields(task_id: str, fields: Dict[str, Any]) -> None:
-    task = task_cache.get(task_id)
-    if task:
-        task.update(fields)
-        task["updated_at"] = time.time()
-
-def increment_task_field(task_id: str, field: str, amount: int = 1) -> None:
-    task = task_cache.get(task_id)
-    if task and field in task:
-        task[field] += amount
-        task["updated_at"] = time.time()
+        "created_at": now,
+        "updated_at": now
+    }))
+
+def update_task_field(task_id: str, field: str, value: Any) -> Optional[TaskStatus]:
+    return update_task_fields(task_id, {field: value})
+
+def update_task_fields(task_id: str, fields: Mapping[str, Any]) -> Optional[TaskStatus]:
+    """Atomically apply several field updates to a task, returns the new snapshot"""
+    return draft_store.update_task(task_id, lambda task: _snapshot({**task, **fields, "updated_at": time.time()}))
+
+def increment_task_field(task_id: str, field: str, amount: int = 1) -> Optional[TaskStatus]:
+    def increment(task: TaskStatus) -> TaskStatus:
+        if field not in task:
+            return task
+        return _snapshot({**task, field: task[field] + amount, "updated_at": time.time()})
+    return draft_store.update_task(task_id, increment)
 
 # Compatibility exports
 DRAFT_CACHE = draft_cache
-DRAFT_TASKS = task_cache
@@ -1,10 +1,56 @@
 import os
 import subprocess
+import threading
 import time
+import uuid
 import requests
 import shutil
-from requests.exceptions import RequestException, Timeout
+from typing import Dict, Iterator
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError, HTTPError, RequestException, Timeout
 from urllib.parse import urlparse, unquote
+from config import settings
+from .media_tools import media_tools
+from .single_flight import single_flight
+from .transfer_scheduler import transfer_scheduler
+from .url_health import UrlUnavailableError, url_health
+
+DOWNLOAD_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
+    'Referer': 'https://www.163.com/',  # 网易的Referer
+    'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8'
+}
+
+# host -> pooled keep-alive session
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+# Range requests of segmented downloads; segments never wait on each other so whole-file
+# download threads can block on this pool without deadlocking
+_segment_executor = ThreadPoolExecutor(max_workers=settings.DOWNLOAD_SEGMENT_WORKERS, thread_name_prefix="download-segment")
+
+class RemoteChangedError(RequestException):
+    """The server answered a range request with the full (possibly changed) file"""
+
+def _run_ffmpeg_transfer(command, local_path):
+    """Run an ffmpeg download under a transfer scheduler slot (ffmpeg reads at its own pace, so no bandwidth pacing)"""
+    url = command[command.index('-i') + 1]
+    url_health.check(url)
+    with transfer_scheduler.slot():
+        try:
+            media_tools.run(command, timeout=settings.FFMPEG_TIMEOUT or None, pool="transfer").check()
+        except subprocess.TimeoutExpired:
+            transfer_scheduler.record(ok=False)
+            url_health.record_connection_error(url)
+            raise
+        except subprocess.CalledProcessError as e:
+            transfer_scheduler.record(ok=False)
+            url_health.record_failure(url, f"ffmpeg exited with code {e.returncode}")
+            raise
+        url_health.record_success(url)
+        transfer_scheduler.record(os.path.getsize(local_path) if os.path.exists(local_path) else 0)
 
 def download_video(video_url, draft_name, material_name):
     """
@@ -34,7 +80,7 @@ def download_video(video_url, draft_name, material_name):
             '-c', 'copy',  # Direct copy, no re-encoding
             local_path
         ]
-        subprocess.run(command, check=True, capture_output=True)
+        _run_ffmpeg_transfer(command, local_path)
         return local_path
     except subprocess.CalledProcessError as e:
         raise Exception(f"Failed to download video: {e.stderr.decode('utf-8')}")
@@ -70,7 +116,7 @@ def download_image(image_url, draft_name, material_name):
             '-y',                  # Overwrite existing files
             local_path
         ]
-        subprocess.run(command, check=True, capture_output=True)
+        _run_ffmpeg_transfer(command, local_path)
         return local_path
     except subprocess.CalledProcessError as e:
         raise Exception(f"Failed to download image: {e.stderr.decode('utf-8')}")
@@ -105,10 +151,156 @@ def download_audio(audio_url, draft_name, material_name):
             '-y',                     # Overwrite existing files (optional)
             local_path                # Output path
         ]
-        subprocess.run(command, check=True, capture_output=True, text=True)
+        _run_ffmpeg_transfer(command, local_path)
         return local_path
     except subprocess.CalledProcessError as e:
-        raise Exception(f"Failed to download audio:\n{e.stderr}")
+        raise Exception(f"Failed to download audio:\n{e.stderr.decode('utf-8')}")
+
+def get_session(url: str) -> requests.Session:
+    """Keep-alive session shared by all downloads from the same host"""
+    host = urlparse(url).netloc
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.DOWNLOAD_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(DOWNLOAD_HEADERS)
+            _sessions[host] = session
+        return session
+
+def _download_segment(session: requests.Session, url: str, part_filename: str, start: int, end: int,
+                      validator, timeout, max_retries: int = 3) -> None:
+    """Fetch bytes [start, end] into their position of the preallocated part file, resuming on errors"""
+    position = start
+    for attempt in range(max_retries):
+        headers = {'Range': f"bytes={position}-{end}"}
+        if validator:
+            headers['If-Range'] = validator
+        try:
+            with session.get(url, stream=True, timeout=timeout, headers=headers) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    # If-Range failed or ranges unsupported: retrying this segment cannot help
+                    raise RemoteChangedError(f"Server ignored range {position}-{end}")
+                with open(part_filename, 'r+b') as file:
+                    file.seek(position)
+                    for chunk in response.iter_content(settings.DOWNLOAD_CHUNK_SIZE):
+                        if chunk:
+                            transfer_scheduler.throttle(len(chunk))
+                            file.write(chunk[:end + 1 - position])
+                            position += len(chunk)
+            if position > end:
+                return
+        except RemoteChangedError:
+            raise
+        except RequestException:
+            if attempt + 1 == max_retries:
+                raise
+    raise RequestException(f"Incomplete segment {start}-{end}: stopped at byte {position}")
+
+def _download_segmented(session: requests.Session, url: str, part_filename: str, total_size: int, validator, timeout) -> None:
+    """Download total_size bytes as DOWNLOAD_SEGMENTS concurrent ranges into a preallocated part file"""
+    with open(part_filename, 'wb') as file:
+        file.truncate(total_size)
+    segment_size = -(-total_size // max(settings.DOWNLOAD_SEGMENTS, 1))
+    futures = [
+        _segment_executor.submit(_download_segment, session, url, part_filename,
+                                 start, min(start + segment_size, total_size) - 1, validator, timeout)
+        for start in range(0, total_size, segment_size)
+    ]
+    print(f"Downloading {total_size/1024/1024:.1f}MB in {len(futures)} segments: {url}")
+    try:
+        for future in futures:
+            future.result()
+    except Exception:
+        for future in futures:
+            future.cancel()
+        # A preallocated file has no meaningful resume offset, the next attempt starts over
+        wait(futures)
+        os.remove(part_filename)
+        raise
+
+def _download_attempt(session: requests.Session, url: str, part_filename: str, offset: int, remote: Dict, timeout) -> None:
+    """
+    One download attempt into part_filename, resuming at offset (offset > 0 requires
+    remote['validator']). Records the ETag/Last-Modified of the remote file in
+    remote['validator'] as soon as it is known, raises on any failure. A segmented download
+    the server answered without ranges sets remote['segmented'] to False, so the next attempt
+    streams the file in one piece.
+    """
+    headers = {}
+    if offset:
+        # Resume where the previous attempt stopped, unless the remote file changed
+        headers['Range'] = f"bytes={offset}-"
+        headers['If-Range'] = remote['validator']
+    with session.get(url, stream=True, timeout=timeout, headers=headers) as response:
+        response.raise_for_status()
+        remote['validator'] = remote['validator'] or response.headers.get('ETag') or response.headers.get('Last-Modified')
+        validator = remote['validator']
+        if response.status_code != 206:
+            # Full body: either a fresh download or the server ignored/invalidated the range
+            offset = 0
+        content_length = response.headers.get('content-length')
+        total_size = offset + int(content_length) if content_length else None
+
+        segmented = (
+            not offset and response.status_code == 200 and total_size and remote.get('segmented', True)
+            and settings.DOWNLOAD_SEGMENT_THRESHOLD > 0 and total_size >= settings.DOWNLOAD_SEGMENT_THRESHOLD
+            and response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        )
+        if not segmented:
+            with open(part_filename, 'ab' if offset else 'wb') as file:
+                for chunk in response.iter_content(settings.DOWNLOAD_CHUNK_SIZE):
+                    if chunk:
+                        transfer_scheduler.throttle(len(chunk))
+                        file.write(chunk)
+
+    if segmented:
+        # Large file on a range-capable server: drop the single stream and fetch byte ranges in parallel
+        try:
+            _download_segmented(session, url, part_filename, total_size, validator, timeout)
+        except RemoteChangedError:
+            remote['segmented'] = False
+            raise
+
+    size = os.path.getsize(part_filename)
+    if total_size is not None and size != total_size:
+        raise RequestException(f"Incomplete download: {size} of {total_size} bytes")
+
+def iter_remote(url: str, timeout=180) -> Iterator[bytes]:
+    """
+    Stream the content of a URL (or local file) chunk by chunk without writing it to disk.
+    Single attempt under a transfer scheduler slot; errors are reported to url_health and raised.
+    """
+    if os.path.isfile(url):
+        with open(url, "rb") as f:
+            yield from iter(lambda: f.read(settings.DOWNLOAD_CHUNK_SIZE), b"")
+        return
+
+    url_health.check(url)
+    session = get_session(url)
+    with transfer_scheduler.slot():
+        nbytes = 0
+        ok = False
+        try:
+            with session.get(url, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=settings.DOWNLOAD_CHUNK_SIZE):
+                    transfer_scheduler.throttle(len(chunk))
+                    nbytes += len(chunk)
+                    yield chunk
+            ok = True
+        except (Timeout, RequestsConnectionError):
+            url_health.record_connection_error(url)
+            raise
+        except HTTPError as e:
+            url_health.record_failure(url, str(e))
+            raise
+        finally:
+            transfer_scheduler.record(nbytes, ok=ok)
+    url_health.record_success(url)
 
 def download_file(url:str, local_filename, max_retries=3, timeout=180):
     # 检查是否是本地文件路径
@@ -130,71 +322,103 @@ def download_file(url:str, local_filename, max_retries=3, timeout=180):
         print(f"Copy completed in {time.time()-start_time:.2f} seconds")
         print(f"File saved as: {os.path.abspath(local_filename)}")
         return True
-    
-    # 原有的下载逻辑
+
+    # Concurrent downloads of the same URL share one transfer, the other callers copy its file
+    path, shared = single_flight.do_shared(("download", url), _download_remote, url, local_filename, max_retries, timeout)
+    if path is None:
+        return False
+    if shared and os.path.abspath(path) != os.path.abspath(local_filename):
+        try:
+            _copy_atomic(path, local_filename)
+        except OSError:
+            # The leader's file was already moved or removed, fetch our own copy
+            return _download_remote(url, local_filename, max_retries, timeout) is not None
+    return True
+
+def _copy_atomic(src: str, dst: str) -> None:
+    directory = os.path.dirname(dst)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_filename = f"{dst}.{uuid.uuid4().hex[:8]}.part"
+    try:
+        shutil.copy2(src, tmp_filename)
+        os.replace(tmp_filename, dst)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+def _download_remote(url: str, local_filename, max_retries, timeout):
+    """Download url to local_filename with retries, returns local_filename or None on failure"""
     # Extract directory part
     directory = os.path.dirname(local_filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Data goes to a private temp file that is renamed into place once complete,
+    # so a half-written file never shows up under local_filename
+    part_filename = f"{local_filename}.{uuid.uuid4().hex[:8]}.part"
+    session = get_session(url)
+    remote = {'validator': None}  # ETag/Last-Modified of the first response, guards Range resumes
+    start_time = time.time()
 
     retries = 0
-    while retries < max_retries:
-        try:
-            if retries > 0:
-                wait_time = 2 ** retries  # Exponential backoff strategy
-                print(f"Retrying in {wait_time} seconds... (Attempt {retries+1}/{max_retries})")
-                time.sleep(wait_time)
-            
-            print(f"Downloading file: {local_filename}")
-            start_time = time.time()
-            
-            # Create directory (if it doesn't exist)
-            if directory and not os.path.exists(directory):
-                os.makedirs(directory, exist_ok=True)
-                print(f"Created directory: {directory}")
-
-            # Add headers
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
-                'Referer': 'https://www.163.com/',  # 网易的Referer
-                'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8'
-            }
-
-            with requests.get(url, stream=True, timeout=timeout, headers=headers) as response:
-                response.raise_for_status()
-                
-                total_size = int(response.headers.get('content-length', 0))
-                block_size = 1024
-                
-                with open(local_filename, 'wb') as file:
-                    bytes_written = 0
-                    for chunk in response.iter_content(block_size):
-                        if chunk:
-                            file.write(chunk)
-                            bytes_written += len(chunk)
-                            
-                            if total_size > 0:
-                                progress = bytes_written / total_size * 100
-                                # For frequently updated progress, consider using logger.debug or more granular control to avoid large log files
-                                # Or only output progress to console, not write to file
-                                print(f"\r[PROGRESS] {progress:.2f}% ({bytes_written/1024:.2f}KB/{total_size/1024:.2f}KB)", end='')
-                                pass # Avoid printing too much progress information in log files
-                
-                if total_size > 0:
-                    # print() # Original newline
-                    pass
+    error = None
+    try:
+        while retries < max_retries:
+            try:
+                if retries > 0:
+                    wait_time = 2 ** retries  # Exponential backoff strategy
+                    print(f"Retrying in {wait_time} seconds... (Attempt {retries+1}/{max_retries})")
+                    time.sleep(wait_time)
+
+                # Fail fast on URLs that failed recently and on hosts whose circuit is open
+                url_health.check(url)
+                offset = os.path.getsize(part_filename) if os.path.exists(part_filename) else 0
+                if not (offset and remote['validator']):
+                    offset = 0
+                print(f"Downloading file: {local_filename}" + (f" (resuming at {offset} bytes)" if offset else ""))
+                # Every attempt holds a slot of the process-wide scheduler while it uses the network
+                with transfer_scheduler.slot():
+                    try:
+                        _download_attempt(session, url, part_filename, offset, remote, timeout)
+                    except Exception:
+                        transfer_scheduler.record(ok=False)
+                        raise
+                    transfer_scheduler.record(os.path.getsize(part_filename) - offset)
+
+                os.replace(part_filename, local_filename)
+                url_health.record_success(url)
                 print(f"Download completed in {time.time()-start_time:.2f} seconds")
                 print(f"File saved as: {os.path.abspath(local_filename)}")
-                return True
-                
-        except Timeout:
-            print(f"Download timed out after {timeout} seconds")
-        except RequestException as e:
-            print(f"Request failed: {e}")
-        except Exception as e:
-            print(f"Unexpected error during download: {e}")
-        
-        retries += 1
-    
-    print(f"Download failed after {max_retries} attempts for URL: {url}")
-    return False
+                return local_filename
+
+            except UrlUnavailableError as e:
+                print(f"Skipping download: {e}")
+                return None
+            except (Timeout, RequestsConnectionError) as e:
+                error = e
+                print(f"Download timed out or connection failed: {e}")
+                url_health.record_connection_error(url)
+            except HTTPError as e:
+                error = e
+                print(f"Request failed: {e}")
+                status = e.response.status_code if e.response is not None else None
+                if status is not None and 400 <= status < 500 and status not in (408, 429):
+                    # The host answered, the URL itself is bad: retrying will not help
+                    url_health.record_success(url)
+                    break
+            except RequestException as e:
+                error = e
+                print(f"Request failed: {e}")
+            except Exception as e:
+                error = e
+                print(f"Unexpected error during download: {e}")
+
+            retries += 1
+    finally:
+        if os.path.exists(part_filename):
+            os.remove(part_filename)
 
+    url_health.record_failure(url, str(error))
+    print(f"Download failed for URL: {url} ({error})")
+    return None
@@ -0,0 +1,150 @@
+from typing import Any, Callable, Dict, Iterator, Literal, Optional, TypeVar
+from contextlib import contextmanager
+import contextvars
+import functools
+import inspect
+import threading
+import zlib
+from .cache_service import draft_cache
+
+F = TypeVar('F', bound=Callable)
+
+LockMode = Literal["read", "write"]
+
+class ReadWriteLock:
+    """
+    Writer-preferring read/write lock.
+    Re-entrant per thread: a thread holding the write lock may acquire it again
+    or take the read lock; a thread holding only the read lock must not upgrade.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers: Dict[int, int] = {}
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self) -> None:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers[me] = 1
+
+    def release_read(self) -> None:
+        me = threading.get_ident()
+        with self._cond:
+            count = self._readers[me] - 1
+            if count:
+                self._readers[me] = count
+            else:
+                del self._readers[me]
+                if not self._readers:
+                    self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+class DraftLockManager:
+    """
+    Striped per-draft locks. Each draft_id maps onto one of a fixed number of
+    read/write locks, so edits to the same draft are serialized while edits to
+    different drafts run in parallel without keeping one lock object per draft.
+    """
+
+    def __init__(self, stripes: int = 1024):
+        self._stripes = [ReadWriteLock() for _ in range(stripes)]
+
+    def _lock_for(self, draft_id: str) -> ReadWriteLock:
+        return self._stripes[zlib.crc32(draft_id.encode('utf-8')) % len(self._stripes)]
+
+    @contextmanager
+    def acquire(self, draft_id: str, mode: LockMode = "write") -> Iterator[None]:
+        lock = self._lock_for(draft_id)
+        if mode == "read":
+            lock.acquire_read()
+            try:
+                yield
+            finally:
+                lock.release_read()
+        else:
+            lock.acquire_write()
+            try:
+                yield
+            finally:
+                lock.release_write()
+
+    def read(self, draft_id: str):
+        return self.acquire(draft_id, "read")
+
+    def write(self, draft_id: str):
+        return self.acquire(draft_id, "write")
+
+# Initialize Singleton
+draft_locks = DraftLockManager()
+
+# Drafts handed out to the running with_draft_lock("write") call: draft_id -> script
+_edited_drafts: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("edited_drafts", default=None)
+
+def track_edit(draft_id: str, script: Any) -> None:
+    """Register a draft the running with_draft_lock("write") call edits; a no-op outside of one"""
+    edited = _edited_drafts.get()
+    if edited is not None:
+        edited[draft_id] = script
+
+def with_draft_lock(mode: LockMode = "write") -> Callable[[F], F]:
+    """
+    Decorator: hold the draft lock for the `draft_id` argument of the wrapped function.
+    Calls without a draft_id create a brand-new draft that no other request can see yet,
+    so they run unlocked. In write mode every draft the call obtained through
+    get_or_create_draft (the argument's draft, or a new one created because it was unknown
+    or had expired) is committed to the draft store afterwards, as the very object edited.
+    """
+    def decorator(func: F) -> F:
+        signature = inspect.signature(func)
+
+        def call(*args, **kwargs):
+            if mode != "write":
+                return func(*args, **kwargs)
+            edited: Dict[str, Any] = {}
+            token = _edited_drafts.set(edited)
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                _edited_drafts.reset(token)
+            for edited_id, script in edited.items():
+                draft_cache.commit(edited_id, script)
+            return result
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            draft_id = signature.bind_partial(*args, **kwargs).arguments.get("draft_id")
+            if not draft_id:
+                return call(*args, **kwargs)
+            with draft_locks.acquire(draft_id, mode):
+                return call(*args, **kwargs)
+        return wrapper  # type: ignore
+    return decorator
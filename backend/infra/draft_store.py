@@ -0,0 +1,263 @@
+from typing import Any, Callable, List, Mapping, Optional
+from abc import ABC, abstractmethod
+from types import MappingProxyType
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+TaskStatus = Mapping[str, Any]
+
+class DraftStore(ABC):
+    """
+    Storage backend for drafts (Script_file objects) and save task statuses.
+
+    Drafts returned by get() are edited in place; callers holding the draft's write
+    lock must call commit() with the edited object afterwards so that the edit is
+    persisted (the store may have dropped or spilled its own reference meanwhile).
+    """
+
+    @abstractmethod
+    def get(self, draft_id: str) -> Optional[Any]: ...
+
+    @abstractmethod
+    def put(self, draft_id: str, script: Any) -> None: ...
+
+    @abstractmethod
+    def delete(self, draft_id: str) -> None: ...
+
+    @abstractmethod
+    def contains(self, draft_id: str) -> bool: ...
+
+    def commit(self, draft_id: str, script: Any) -> None:
+        """Persist in-place edits of `script`, the draft previously returned by get()"""
+
+    @abstractmethod
+    def get_task(self, task_id: str) -> Optional[TaskStatus]: ...
+
+    @abstractmethod
+    def put_task(self, task_id: str, task_status: TaskStatus) -> None: ...
+
+    @abstractmethod
+    def update_task(self, task_id: str, func: Callable[[TaskStatus], TaskStatus]) -> Optional[TaskStatus]:
+        """Atomically replace an existing task status with func(status), returns the new status"""
+
+    @abstractmethod
+    def purge_expired_drafts(self) -> List[str]:
+        """Remove drafts whose TTL has passed, returns their ids"""
+
+    @abstractmethod
+    def purge_expired_tasks(self) -> List[str]:
+        """Remove task statuses whose TTL has passed, returns their ids"""
+
+class MemoryDraftStore(DraftStore):
+    """Process-local store on top of the in-memory caches (default, single worker)"""
+
+    def __init__(self, drafts: Any, tasks: Any):
+        self.drafts = drafts
+        self.tasks = tasks
+
+    def get(self, draft_id: str) -> Optional[Any]:
+        return self.drafts.get(draft_id)
+
+    def put(self, draft_id: str, script: Any) -> None:
+        self.drafts.put(draft_id, script)
+
+    def delete(self, draft_id: str) -> None:
+        self.drafts.delete(draft_id)
+
+    def commit(self, draft_id: str, script: Any) -> None:
+        # The draft may have been spilled to disk while it was edited; putting the edited
+        # object back replaces the stale spilled copy
+        self.drafts.put(draft_id, script)
+
+    def contains(self, draft_id: str) -> bool:
+        return self.drafts.contains(draft_id)
+
+    def get_task(self, task_id: str) -> Optional[TaskStatus]:
+        return self.tasks.get(task_id)
+
+    def put_task(self, task_id: str, task_status: TaskStatus) -> None:
+        self.tasks.put(task_id, task_status)
+
+    def update_task(self, task_id: str, func: Callable[[TaskStatus], TaskStatus]) -> Optional[TaskStatus]:
+        return self.tasks.update(task_id, func)
+
+    def purge_expired_drafts(self) -> List[str]:
+        return self.drafts.purge_expired()
+
+    def purge_expired_tasks(self) -> List[str]:
+        return self.tasks.purge_expired()
+
+class SqliteDraftStore(DraftStore):
+    """
+    SQLite (WAL mode) store shared by several worker processes on one machine.
+
+    Drafts are stored pickled and zlib-compressed together with a version number.
+    Each process keeps the deserialized objects of recently used drafts and only
+    reloads a draft when another process has committed a newer version.
+    Concurrent edits of the same draft from different processes are last-writer-wins;
+    edits within a process are serialized by the draft locks.
+    Idle TTLs are measured from the last write (commit/update) of a row.
+    """
+
+    def __init__(self, path: str, local_cache: Any, busy_timeout: float = 30.0,
+                 draft_idle_ttl: Optional[float] = None, draft_absolute_ttl: Optional[float] = None,
+                 task_idle_ttl: Optional[float] = None, task_absolute_ttl: Optional[float] = None):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.draft_idle_ttl = draft_idle_ttl
+        self.draft_absolute_ttl = draft_absolute_ttl
+        self.task_idle_ttl = task_idle_ttl
+        self.task_absolute_ttl = task_absolute_ttl
+        # draft_id -> (version, script)
+        self._local = local_cache
+        self._conn_local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS drafts (id TEXT PRIMARY KEY, version INTEGER NOT NULL, data BLOB NOT NULL, "
+                         "created_at REAL NOT NULL, updated_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS tasks (id TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                         "created_at REAL NOT NULL, updated_at REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not be shared across threads
+        conn = getattr(self._conn_local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn_local.conn = conn
+        return conn
+
+    @staticmethod
+    def _dumps(script: Any) -> bytes:
+        return zlib.compress(pickle.dumps(script, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def _expiry_clause(idle_ttl: Optional[float], absolute_ttl: Optional[float]) -> Optional[str]:
+        """SQL condition (parameterized by the current time) matching expired rows"""
+        clauses = []
+        if idle_ttl:
+            clauses.append(f"updated_at < :now - {float(idle_ttl)}")
+        if absolute_ttl:
+            clauses.append(f"created_at < :now - {float(absolute_ttl)}")
+        return " OR ".join(clauses) or None
+
+    def _purge(self, table: str, clause: Optional[str]) -> List[str]:
+        if clause is None:
+            return []
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            params = {"now": time.time()}
+            expired = [row[0] for row in conn.execute(f"SELECT id FROM {table} WHERE {clause}", params)]
+            conn.execute(f"DELETE FROM {table} WHERE {clause}", params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return expired
+
+    def purge_expired_drafts(self) -> List[str]:
+        expired = self._purge("drafts", self._expiry_clause(self.draft_idle_ttl, self.draft_absolute_ttl))
+        for draft_id in expired:
+            self._local.delete(draft_id)
+        return expired
+
+    def purge_expired_tasks(self) -> List[str]:
+        return self._purge("tasks", self._expiry_clause(self.task_idle_ttl, self.task_absolute_ttl))
+
+    def _live_row(self, table: str, columns: str, key: str, clause: Optional[str]):
+        """Fetch a row, ignoring rows that have expired but were not swept yet"""
+        condition = f" AND NOT ({clause})" if clause else ""
+        return self._connect().execute(f"SELECT {columns} FROM {table} WHERE id = :id{condition}",
+                                       {"id": key, "now": time.time()}).fetchone()
+
+    def get(self, draft_id: str) -> Optional[Any]:
+        clause = self._expiry_clause(self.draft_idle_ttl, self.draft_absolute_ttl)
+        row = self._live_row("drafts", "version", draft_id, clause)
+        if row is None:
+            self._local.delete(draft_id)
+            return None
+        cached = self._local.get(draft_id)
+        if cached is not None and cached[0] == row[0]:
+            return cached[1]
+        # The row may have expired, been deleted or been rewritten since the version check
+        row = self._live_row("drafts", "version, data", draft_id, clause)
+        if row is None:
+            self._local.delete(draft_id)
+            return None
+        script = pickle.loads(zlib.decompress(row[1]))
+        self._local.put(draft_id, (row[0], script))
+        return script
+
+    def put(self, draft_id: str, script: Any) -> None:
+        data = self._dumps(script)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            conn.execute(
+                "INSERT INTO drafts (id, version, data, created_at, updated_at) VALUES (?, 1, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET version = version + 1, data = excluded.data, updated_at = excluded.updated_at",
+                (draft_id, data, now, now)
+            )
+            version = conn.execute("SELECT version FROM drafts WHERE id = ?", (draft_id,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._local.put(draft_id, (version, script))
+
+    def commit(self, draft_id: str, script: Any) -> None:
+        self.put(draft_id, script)
+
+    def delete(self, draft_id: str) -> None:
+        self._connect().execute("DELETE FROM drafts WHERE id = ?", (draft_id,))
+        self._local.delete(draft_id)
+
+    def contains(self, draft_id: str) -> bool:
+        clause = self._expiry_clause(self.draft_idle_ttl, self.draft_absolute_ttl)
+        return self._live_row("drafts", "1", draft_id, clause) is not None
+
+    @staticmethod
+    def _load_task(data: str) -> TaskStatus:
+        return MappingProxyType(json.loads(data))
+
+    def get_task(self, task_id: str) -> Optional[TaskStatus]:
+        row = self._live_row("tasks", "data", task_id, self._expiry_clause(self.task_idle_ttl, self.task_absolute_ttl))
+        return self._load_task(row[0]) if row else None
+
+    def put_task(self, task_id: str, task_status: TaskStatus) -> None:
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO tasks (id, data, created_at, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (task_id, json.dumps(dict(task_status), ensure_ascii=False), now, now)
+        )
+
+    def update_task(self, task_id: str, func: Callable[[TaskStatus], TaskStatus]) -> Optional[TaskStatus]:
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock up front so the read-modify-write is atomic across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            task_status = func(self._load_task(row[0]))
+            conn.execute(
+                "UPDATE tasks SET data = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(dict(task_status), ensure_ascii=False), time.time(), task_id)
+            )
+            conn.execute("COMMIT")
+            return task_status
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
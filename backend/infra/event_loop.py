@@ -0,0 +1,20 @@
+from typing import Optional
+import asyncio
+import threading
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Process-wide asyncio event loop running in a daemon thread, started on first use.
+    Synchronous code (services run in worker threads) schedules coroutines on it with
+    asyncio.run_coroutine_threadsafe / loop.call_soon_threadsafe.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="background-event-loop", daemon=True).start()
+            _loop = loop
+        return _loop
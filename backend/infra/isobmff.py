@@ -0,0 +1,351 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import mmap
+import os
+import struct
+from requests.exceptions import ConnectionError as RequestsConnectionError, HTTPError, Timeout
+from .downloader import get_session
+from .transfer_scheduler import transfer_scheduler
+from .url_health import is_remote, url_health
+
+# Same format_name ffprobe reports for the mov/mp4 demuxer
+FORMAT_NAME = "mov,mp4,m4a,3gp,3g2,mj2"
+
+# Box types that can start an ISO-BMFF file (QuickTime files may lack ftyp)
+_LEADING_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot", b"styp"}
+
+# Remote reads fetch at least this much, so a leading moov box usually arrives with the first request
+_READ_AHEAD = 64 * 1024
+
+# moov boxes larger than this are left to ffprobe
+_MAX_MOOV_SIZE = 64 * 1024 * 1024
+
+class NotParseable(Exception):
+    """The file is not a plain (non-fragmented) ISO-BMFF file this reader understands"""
+
+class _LocalSource:
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        if not self.size:
+            self._file.close()
+            raise NotParseable("empty file")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, offset: int, size: int) -> bytes:
+        return self._map[offset:offset + size]
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+class _RemoteSource:
+    """
+    Reads byte ranges of a URL with HTTP Range requests, at least _READ_AHEAD bytes at a time.
+    Each request is checked against and reported to url_health and holds a transfer scheduler slot.
+    """
+
+    def __init__(self, url: str, timeout: Optional[float]):
+        self.url = url
+        self.timeout = timeout
+        self.size = 0
+        self._session = get_session(url)
+        self._block_offset = 0
+        self._block = b""
+
+    def read(self, offset: int, size: int) -> bytes:
+        start = offset - self._block_offset
+        if 0 <= start and offset + size <= self._block_offset + len(self._block):
+            return self._block[start:start + size]
+        self._block_offset = offset
+        self._block = self._fetch(offset, max(size, _READ_AHEAD))
+        return self._block[:size]
+
+    def _fetch(self, offset: int, size: int) -> bytes:
+        url_health.check(self.url)
+        headers = {"Range": f"bytes={offset}-{offset + size - 1}"}
+        data = bytearray()
+        with transfer_scheduler.slot():
+            ok = False
+            try:
+                with self._session.get(self.url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    if response.status_code == 206:
+                        total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                        if total.isdigit():
+                            self.size = int(total)
+                    elif offset:
+                        raise NotParseable("server does not support range requests")
+                    else:
+                        length = response.headers.get("Content-Length", "")
+                        self.size = int(length) if length.isdigit() else 0
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        transfer_scheduler.throttle(len(chunk))
+                        data += chunk
+                        if len(data) >= size:
+                            break
+                ok = True
+            except NotParseable:
+                # The server answered fine, it just cannot serve ranges
+                ok = True
+                raise
+            except (Timeout, RequestsConnectionError):
+                url_health.record_connection_error(self.url)
+                raise
+            except HTTPError as e:
+                url_health.record_failure(self.url, str(e))
+                raise
+            finally:
+                transfer_scheduler.record(len(data), ok=ok)
+        url_health.record_success(self.url)
+        return bytes(data[:size])
+
+    def close(self) -> None:
+        pass
+
+def _box_header(data: bytes, offset: int, end: int) -> Optional[Tuple[bytes, int, int]]:
+    """(type, payload offset, box end) of the box at offset within data[:end]"""
+    if offset + 8 > end:
+        return None
+    size, box_type = struct.unpack_from(">I4s", data, offset)
+    header = 8
+    if size == 1:
+        if offset + 16 > end:
+            return None
+        size = struct.unpack_from(">Q", data, offset + 8)[0]
+        header = 16
+    elif size == 0:
+        size = end - offset
+    if size < header or offset + size > end:
+        raise NotParseable(f"invalid size of box {box_type!r}")
+    return box_type, offset + header, offset + size
+
+def _children(data: bytes, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    offset = start
+    while True:
+        header = _box_header(data, offset, end)
+        if header is None:
+            return
+        yield header
+        offset = header[2]
+
+def _child(data: bytes, start: int, end: int, box_type: bytes) -> Optional[Tuple[int, int]]:
+    for child_type, payload, child_end in _children(data, start, end):
+        if child_type == box_type:
+            return payload, child_end
+    return None
+
+def _find_moov(source) -> bytes:
+    """Walk the top-level boxes (reading only their headers) and return the moov box payload"""
+    offset = 0
+    first = True
+    while True:
+        if source.size and offset >= source.size:
+            raise NotParseable("no moov box")
+        head = source.read(offset, 16)
+        if len(head) < 8:
+            raise NotParseable("no moov box")
+        size, box_type = struct.unpack_from(">I4s", head)
+        if first and box_type not in _LEADING_BOXES:
+            raise NotParseable("not an ISO-BMFF file")
+        first = False
+        header = 8
+        if size == 1:
+            if len(head) < 16:
+                raise NotParseable("truncated box header")
+            size = struct.unpack_from(">Q", head, 8)[0]
+            header = 16
+        elif size == 0:
+            size = source.size - offset
+        if size < header:
+            raise NotParseable(f"invalid size of box {box_type!r}")
+        if box_type == b"moov":
+            if size > _MAX_MOOV_SIZE:
+                raise NotParseable("moov box too large")
+            moov = source.read(offset + header, size - header)
+            if len(moov) < size - header:
+                raise NotParseable("truncated moov box")
+            return moov
+        offset += size
+
+def _full_box_duration(data: bytes, payload: int) -> Tuple[int, int]:
+    """(timescale, duration) of an mvhd/mdhd box"""
+    if data[payload] == 1:
+        timescale, duration = struct.unpack_from(">IQ", data, payload + 4 + 16)
+    else:
+        timescale, duration = struct.unpack_from(">II", data, payload + 4 + 8)
+    return timescale, duration
+
+def _seconds(timescale: int, duration: int) -> Optional[float]:
+    # All-ones durations mean "unknown"
+    if not timescale or not duration or duration in (0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+        return None
+    return duration / timescale
+
+def _edited_duration(moov: bytes, start: int, end: int, movie_timescale: int) -> Optional[float]:
+    """Seconds presented by the track's edit list (empty edits left out), None without one"""
+    edts = _child(moov, start, end, b"edts")
+    elst = _child(moov, *edts, b"elst") if edts else None
+    if elst is None:
+        return None
+    payload, elst_end = elst
+    fmt, entry_size = (">Qq", 20) if moov[payload] == 1 else (">Ii", 12)
+    count = struct.unpack_from(">I", moov, payload + 4)[0]
+    if payload + 8 + count * entry_size > elst_end:
+        raise NotParseable("truncated edit list")
+    total = 0
+    for i in range(count):
+        segment_duration, media_time = struct.unpack_from(fmt, moov, payload + 8 + i * entry_size)
+        if media_time != -1:
+            total += segment_duration
+    return _seconds(movie_timescale, total)
+
+def _parse_track(moov: bytes, start: int, end: int, movie_timescale: int) -> Optional[Dict[str, Any]]:
+    mdia = _child(moov, start, end, b"mdia")
+    if mdia is None:
+        return None
+    hdlr = _child(moov, *mdia, b"hdlr")
+    mdhd = _child(moov, *mdia, b"mdhd")
+    if hdlr is None or mdhd is None:
+        return None
+    handler = moov[hdlr[0] + 8:hdlr[0] + 12]
+    if handler == b"vide":
+        stream: Dict[str, Any] = {"codec_type": "video"}
+    elif handler == b"soun":
+        stream = {"codec_type": "audio"}
+    else:
+        return None
+    duration = _seconds(*_full_box_duration(moov, mdhd[0]))
+    # Like ffmpeg's mov demuxer, an edit list shorter than the media cuts the stream duration
+    edited = _edited_duration(moov, start, end, movie_timescale)
+    if edited is not None and (duration is None or edited < duration):
+        duration = edited
+    if duration is not None:
+        stream["duration"] = f"{duration:.6f}"
+    if handler == b"vide":
+        # Coded size from the first visual sample entry, like ffprobe reports it
+        minf = _child(moov, *mdia, b"minf")
+        stbl = _child(moov, *minf, b"stbl") if minf else None
+        stsd = _child(moov, *stbl, b"stsd") if stbl else None
+        if stsd is None:
+            raise NotParseable("video track without sample description")
+        entry = _box_header(moov, stsd[0] + 8, stsd[1])
+        if entry is None or entry[2] - entry[1] < 28:
+            raise NotParseable("invalid visual sample entry")
+        stream["width"], stream["height"] = struct.unpack_from(">HH", moov, entry[1] + 24)
+    return stream
+
+def _parse_moov(moov: bytes) -> Dict[str, Any]:
+    end = len(moov)
+    if _child(moov, 0, end, b"mvex") is not None:
+        raise NotParseable("fragmented file")
+    if _child(moov, 0, end, b"cmov") is not None:
+        raise NotParseable("compressed moov box")
+    mvhd = _child(moov, 0, end, b"mvhd")
+    if mvhd is None:
+        raise NotParseable("no mvhd box")
+    movie_timescale, movie_duration = _full_box_duration(moov, mvhd[0])
+    streams: List[Dict[str, Any]] = []
+    for box_type, payload, box_end in _children(moov, 0, end):
+        if box_type == b"trak":
+            stream = _parse_track(moov, payload, box_end, movie_timescale)
+            if stream is not None:
+                streams.append(stream)
+    if not streams:
+        raise NotParseable("no audio or video track")
+    info: Dict[str, Any] = {"streams": streams, "format": {"format_name": FORMAT_NAME}}
+    duration = _seconds(movie_timescale, movie_duration)
+    if duration is not None:
+        info["format"]["duration"] = f"{duration:.6f}"
+    return info
+
+class MoovReader:
+    """
+    Incremental reader of the moov box of an ISO-BMFF byte stream, for files that pass by anyway
+    (e.g. while being streamed elsewhere): feed() it the chunks in order, then info() parses the
+    moov box if it was seen. Only the moov box is buffered; the other top-level boxes are skipped.
+    """
+
+    def __init__(self):
+        self._header = bytearray()
+        self._skip = 0
+        self._moov: Optional[bytearray] = None
+        self._moov_left = 0
+        self._first = True
+        self._done = False
+        self._info: Optional[Dict[str, Any]] = None
+
+    def feed(self, chunk: bytes) -> None:
+        view = memoryview(chunk)
+        while view and not self._done:
+            if self._skip:
+                n = min(self._skip, len(view))
+                self._skip -= n
+                view = view[n:]
+            elif self._moov is not None:
+                n = min(self._moov_left, len(view))
+                self._moov += view[:n]
+                self._moov_left -= n
+                view = view[n:]
+                if not self._moov_left:
+                    self._parse()
+            else:
+                need = 16 if len(self._header) >= 8 and self._header[:4] == b"\0\0\0\1" else 8
+                n = need - len(self._header)
+                self._header += view[:n]
+                view = view[n:]
+                if len(self._header) == need and not (need == 8 and self._header[:4] == b"\0\0\0\1"):
+                    self._start_box()
+
+    def _start_box(self) -> None:
+        size, box_type = struct.unpack_from(">I4s", self._header)
+        header = len(self._header)
+        if header == 16:
+            size = struct.unpack_from(">Q", self._header, 8)[0]
+        self._header.clear()
+        if self._first and box_type not in _LEADING_BOXES:
+            self._done = True
+            return
+        self._first = False
+        # Size 0 (box runs to the end of the file) leaves no room for a moov box after it
+        if size < header:
+            self._done = True
+        elif box_type == b"moov":
+            if size > _MAX_MOOV_SIZE:
+                self._done = True
+            else:
+                self._moov = bytearray()
+                self._moov_left = size - header
+                if not self._moov_left:
+                    self._parse()
+        else:
+            self._skip = size - header
+
+    def _parse(self) -> None:
+        try:
+            self._info = _parse_moov(bytes(self._moov))
+        except (NotParseable, struct.error, IndexError, TypeError):
+            self._info = None
+        self._moov = None
+        self._done = True
+
+    def info(self) -> Optional[Dict[str, Any]]:
+        """Same as read_mp4_info() for the bytes fed so far; None until a complete moov box has passed"""
+        return self._info
+
+def read_mp4_info(media: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Duration, video size and audio/video streams of an MP4/MOV file (local path through mmap,
+    URL through Range requests), read from its moov box in the same shape as probe_media().
+    Returns None when the file is not a plain ISO-BMFF file (other containers, fragmented
+    files, ...), in which case the caller falls back to ffprobe. Network errors are raised.
+    """
+    try:
+        source = _RemoteSource(media, timeout) if is_remote(media) else _LocalSource(media)
+    except (NotParseable, OSError, ValueError):
+        return None
+    try:
+        return _parse_moov(_find_moov(source))
+    except (NotParseable, struct.error, IndexError, TypeError):
+        return None
+    finally:
+        source.close()
@@ -0,0 +1,204 @@
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+from collections import Counter
+from dataclasses import dataclass, field
+import contextvars
+import heapq
+import itertools
+import threading
+from config import settings
+from infra.logger import logger
+
+JobPriority = Literal["high", "normal", "low"]
+
+_PRIORITY_RANK = {"high": 0, "normal": 1, "low": 2}
+
+class QueueFullError(Exception):
+    """The job queue already holds its maximum number of waiting jobs"""
+
+class JobCancelledError(Exception):
+    """Raised inside a running job once it has been cancelled"""
+
+@dataclass
+class Job:
+    job_id: str
+    func: Callable[..., Any]
+    args: tuple
+    priority: JobPriority
+    group: str
+    seq: int
+    status: Literal["queued", "running", "done", "cancelled"] = "queued"
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    # Set when a newer job took over the id while this one was running
+    superseded: bool = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+# Job executed by the current worker thread
+_current_job: contextvars.ContextVar[Optional[Job]] = contextvars.ContextVar("current_job", default=None)
+
+def current_job() -> Optional[Job]:
+    return _current_job.get()
+
+def raise_if_cancelled() -> None:
+    """Cancellation point for job functions; a no-op outside of jobs"""
+    job = _current_job.get()
+    if job is not None and job.cancelled:
+        raise JobCancelledError(f"Job {job.job_id} was cancelled")
+
+class JobQueue:
+    """
+    Bounded priority queue of background jobs served by a pool of worker threads.
+
+    Jobs run in priority order ("high" before "normal" before "low", FIFO within a level).
+    At most `per_group_limit` jobs of the same group (e.g. the draft they save) run at once;
+    a worker skips over jobs of saturated groups. Queued jobs are cancelled by removing them;
+    running jobs are cancelled cooperatively: their cancel event is set and the job function
+    stops at its next raise_if_cancelled() call.
+    """
+
+    def __init__(self, workers: int, max_size: int, per_group_limit: int, name: str = "job"):
+        self.workers = workers
+        self.max_size = max_size
+        self.per_group_limit = per_group_limit
+        self.name = name
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[int, int, Job]] = []
+        self._queued: Dict[str, Job] = {}
+        self._running: Dict[str, Job] = {}
+        self._running_per_group: Counter = Counter()
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    def start(self) -> None:
+        with self._cond:
+            self._stopping = False
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._worker, name=f"{self.name}-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the workers after their current job; queued jobs stay queued"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def submit(self, job_id: str, func: Callable[..., Any], *args: Any, priority: JobPriority = "normal",
+               group: Optional[str] = None) -> Job:
+        """Queue func(*args) under job_id; raises QueueFullError when the queue is full"""
+        if priority not in _PRIORITY_RANK:
+            raise ValueError(f"Unknown job priority: {priority}")
+        with self._cond:
+            if job_id in self._queued:
+                raise ValueError(f"Job {job_id} is already queued")
+            if len(self._queued) >= self.max_size:
+                raise QueueFullError(f"{self.name} queue is full ({self.max_size} jobs waiting)")
+            job = Job(job_id=job_id, func=func, args=args, priority=priority,
+                      group=group if group is not None else job_id, seq=next(self._seq))
+            heapq.heappush(self._heap, (_PRIORITY_RANK[priority], job.seq, job))
+            self._queued[job_id] = job
+            self._cond.notify_all()
+        if not any(t.is_alive() for t in self._threads):
+            self.start()
+        return job
+
+    def cancel(self, job_id: str, superseded: bool = False) -> bool:
+        """
+        Cancel the queued and/or running job with this id; False if there is none.
+        `superseded` marks the running job as replaced by a newer job under the same id.
+        """
+        with self._cond:
+            found = False
+            job = self._queued.pop(job_id, None)
+            if job is not None:
+                job.status = "cancelled"
+                job.cancel_event.set()
+                found = True
+            job = self._running.get(job_id)
+            if job is not None:
+                job.superseded = job.superseded or superseded
+                job.cancel_event.set()
+                found = True
+            return found
+
+    def get_queued(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._queued.get(job_id)
+
+    def get_running(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._running.get(job_id)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Number of queued jobs that run before this one (0 = next), None if it is not queued"""
+        with self._cond:
+            job = self._queued.get(job_id)
+            if job is None:
+                return None
+            key = (_PRIORITY_RANK[job.priority], job.seq)
+            return sum(1 for other in self._queued.values() if (_PRIORITY_RANK[other.priority], other.seq) < key)
+
+    def _take_locked(self) -> Optional[Job]:
+        skipped = []
+        job = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            candidate = entry[2]
+            if self._queued.get(candidate.job_id) is not candidate:
+                continue  # cancelled
+            if self._running_per_group[candidate.group] >= self.per_group_limit:
+                skipped.append(entry)
+                continue
+            job = candidate
+            break
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        if job is not None:
+            del self._queued[job.job_id]
+            self._running[job.job_id] = job
+            self._running_per_group[job.group] += 1
+            job.status = "running"
+        return job
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = None
+                while not self._stopping:
+                    job = self._take_locked()
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                if job is None:
+                    return
+            token = _current_job.set(job)
+            try:
+                job.func(*job.args)
+            except JobCancelledError:
+                logger.info(f"Job {job.job_id} cancelled while running.")
+            except Exception as e:
+                logger.error(f"Job {job.job_id} failed: {e}", exc_info=True)
+            finally:
+                _current_job.reset(token)
+                with self._cond:
+                    job.status = "cancelled" if job.cancelled else "done"
+                    if self._running.get(job.job_id) is job:
+                        del self._running[job.job_id]
+                    self._running_per_group[job.group] -= 1
+                    if not self._running_per_group[job.group]:
+                        del self._running_per_group[job.group]
+                    self._cond.notify_all()
+
+# Initialize Singleton
+save_job_queue = JobQueue(
+    workers=settings.SAVE_WORKERS,
+    max_size=settings.SAVE_QUEUE_MAX_SIZE,
+    per_group_limit=settings.SAVE_PER_DRAFT_CONCURRENCY,
+    name="save",
+)
@@ -0,0 +1,249 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+import imageio.v2 as imageio
+import requests
+from PIL import Image, ImageFile, UnidentifiedImageError
+from config import settings
+from infra.logger import logger
+from .downloader import get_session
+from .isobmff import MoovReader, read_mp4_info
+from .media_tools import media_tools
+from .single_flight import single_flight
+from .url_health import UrlUnavailableError, is_remote, url_health
+
+MediaInfo = Dict[str, Any]
+
+# StreamProbe stops looking for an image header after this many bytes (the parser buffers them)
+_STREAM_IMAGE_HEADER_LIMIT = 16 * 1024 * 1024
+
+# One ffprobe run answers every metadata question asked about a media file
+PROBE_ENTRIES = "stream=codec_type,width,height,duration:format=duration,format_name"
+
+def _check_output(command: List[str], timeout: Optional[float]) -> bytes:
+    media = command[-1]
+    try:
+        output = media_tools.run(command, timeout=timeout, merge_stderr=True).check().stdout
+    except subprocess.TimeoutExpired:
+        url_health.record_connection_error(media)
+        raise
+    except subprocess.CalledProcessError as e:
+        url_health.record_failure(media, f"ffprobe exited with code {e.returncode}")
+        raise
+    url_health.record_success(media)
+    return output
+
+def run_ffprobe(command: List[str], timeout: Optional[float] = None) -> bytes:
+    """
+    Output (stdout and stderr) of an ffprobe command whose last argument is the media path/URL,
+    run through the shared media tool runner; raises subprocess.TimeoutExpired/CalledProcessError.
+    Identical probes running at the same time share one ffprobe process; URLs that failed recently or whose host is failing raise UrlUnavailableError without probing.
+    """
+    url_health.check(command[-1])
+    return single_flight.do(("ffprobe", *command), _check_output, command, timeout)
+
+def parse_ffprobe_json(output: bytes) -> MediaInfo:
+    """Parse ffprobe JSON output, ignoring any warnings printed before it"""
+    result_str = output.decode('utf-8')
+    # Find JSON start position (first '{')
+    json_start = result_str.find('{')
+    if json_start == -1:
+        raise ValueError(f"Could not find JSON data in ffprobe output: {result_str}")
+    return json.loads(result_str[json_start:])
+
+class ProbeCache:
+    """
+    Persistent (SQLite) cache of ffprobe results. Remote media are keyed by URL plus
+    ETag/Content-Length (or Last-Modified), local files by device/inode plus mtime and size,
+    so a changed file is probed again. Remote media without any validator are not cached.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn_local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS probes (key TEXT PRIMARY KEY, info TEXT NOT NULL, created_at REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not be shared across threads
+        conn = getattr(self._conn_local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._conn_local.conn = conn
+        return conn
+
+    @staticmethod
+    def key_for(media: str) -> Optional[str]:
+        if not is_remote(media):
+            try:
+                stat = os.stat(media)
+            except OSError:
+                return None
+            # Keyed by inode rather than path: hardlinks of one asset-store blob in several drafts share the entry
+            return f"file:{stat.st_dev}:{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size}"
+        try:
+            url_health.check(media)
+            response = requests.head(media, allow_redirects=True, timeout=10)
+        except (requests.RequestException, UrlUnavailableError):
+            return None
+        if response.status_code >= 400:
+            return None
+        etag = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        length = response.headers.get("Content-Length")
+        if not etag and not length:
+            return None
+        return f"url:{media}:{etag or ''}:{length or ''}"
+
+    def get(self, key: str) -> Optional[MediaInfo]:
+        row = self._connect().execute("SELECT info FROM probes WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, info: MediaInfo) -> None:
+        self._connect().execute("INSERT OR REPLACE INTO probes (key, info, created_at) VALUES (?, ?, ?)",
+                                (key, json.dumps(info), time.time()))
+
+# Initialize Singleton
+probe_cache = ProbeCache(settings.PROBE_CACHE_PATH) if settings.PROBE_CACHE_ENABLED else None
+
+def _read_mp4_info(media: str, timeout: Optional[float]) -> Optional[MediaInfo]:
+    """In-process moov box reader, None when ffprobe has to answer instead"""
+    try:
+        return single_flight.do(("mp4", media), read_mp4_info, media, timeout)
+    except (requests.RequestException, UrlUnavailableError) as e:
+        logger.debug(f"MP4 box reader could not read {media}, falling back to ffprobe: {e}")
+        return None
+
+def probe_media(media: str, timeout: Optional[float] = None) -> MediaInfo:
+    """
+    ffprobe information (all streams' codec_type/width/height/duration, format duration/format_name)
+    of a local path or URL, read through the persistent probe cache. MP4/MOV files are read
+    in-process from their moov box; ffprobe only runs for other containers.
+    Raises like run_ffprobe when the media cannot be probed.
+    """
+    key = probe_cache.key_for(media) if probe_cache is not None else None
+    if key is not None:
+        try:
+            info = probe_cache.get(key)
+            if info is not None:
+                return info
+        except sqlite3.Error as e:
+            logger.warning(f"Probe cache lookup failed for {media}: {e}")
+
+    info = _read_mp4_info(media, timeout) if settings.MP4_PARSER_ENABLED else None
+    if info is None:
+        command = ['ffprobe', '-v', 'error', '-show_entries', PROBE_ENTRIES, '-of', 'json', media]
+        info = parse_ffprobe_json(run_ffprobe(command, timeout=timeout))
+        info.setdefault("streams", [])
+        info.setdefault("format", {})
+    if key is not None:
+        try:
+            probe_cache.put(key, info)
+        except sqlite3.Error as e:
+            logger.warning(f"Probe cache update failed for {media}: {e}")
+    return info
+
+def first_stream(info: MediaInfo, codec_type: str) -> Optional[Dict[str, Any]]:
+    """First stream of the given type ("video", "audio") in probe_media() output"""
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") == codec_type:
+            return stream
+    return None
+
+def _read_image_header(chunks) -> Optional[Tuple[int, int]]:
+    """Feed byte chunks to an incremental PIL parser until it has read the image header"""
+    parser = ImageFile.Parser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.image is not None:
+            return parser.image.size
+    return None
+
+def _remote_image_size(url: str, timeout: Optional[float]) -> Optional[Tuple[int, int]]:
+    session = get_session(url)
+    prefix = settings.IMAGE_HEADER_BYTES
+    # Usually the header fits in the first few KB; servers ignoring Range just stream the whole file,
+    # which is also read only up to the header
+    with session.get(url, headers={"Range": f"bytes=0-{prefix - 1}"}, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        size = _read_image_header(response.iter_content(chunk_size=16 * 1024))
+        if size is not None or response.status_code != 206:
+            return size
+    # Header not within the prefix (e.g. a large EXIF block before the JPEG frame header)
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        return _read_image_header(response.iter_content(chunk_size=64 * 1024))
+
+def image_size(media: str, timeout: Optional[float] = None) -> Tuple[int, int]:
+    """
+    (width, height) of an image (local path or URL), read from the image header only instead
+    of decoding the whole image. Formats Pillow cannot identify fall back to a full imageio decode.
+    """
+    url_health.check(media)
+    if not is_remote(media):
+        try:
+            with Image.open(media) as img:
+                return img.size
+        except UnidentifiedImageError:
+            height, width = imageio.imread(media).shape[:2]
+            return width, height
+
+    try:
+        size = _remote_image_size(media, timeout)
+    except (requests.Timeout, requests.ConnectionError):
+        url_health.record_connection_error(media)
+        raise
+    except requests.RequestException as e:
+        url_health.record_failure(media, str(e))
+        raise
+    url_health.record_success(media)
+    if size is None:
+        height, width = imageio.imread(media).shape[:2]
+        return width, height
+    return size
+
+class StreamProbe:
+    """
+    Media information read from the bytes of a transfer as they pass through wrap() (e.g. an
+    asset streamed to OSS), so the media need not be fetched again to be probed: the header of
+    an image (image_size) or the moov box of an MP4/MOV file (info, shaped like probe_media()).
+    Both stay None when the bytes do not answer, e.g. other containers; probe the media then.
+    """
+
+    def __init__(self, image: bool):
+        self.image_size: Optional[Tuple[int, int]] = None
+        self._image_parser = ImageFile.Parser() if image else None
+        self._image_bytes = 0
+        self._moov_reader = None if image else MoovReader()
+
+    def wrap(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            self._feed(chunk)
+            yield chunk
+
+    def _feed(self, chunk: bytes) -> None:
+        if self._moov_reader is not None:
+            self._moov_reader.feed(chunk)
+        elif self._image_parser is not None:
+            try:
+                self._image_parser.feed(chunk)
+            except (OSError, SyntaxError, ValueError):
+                self._image_parser = None
+                return
+            self._image_bytes += len(chunk)
+            if self._image_parser.image is not None:
+                self.image_size = self._image_parser.image.size
+                self._image_parser = None
+            elif self._image_bytes >= _STREAM_IMAGE_HEADER_LIMIT:
+                self._image_parser = None
+
+    @property
+    def info(self) -> Optional[MediaInfo]:
+        return self._moov_reader.info() if self._moov_reader is not None else None
@@ -0,0 +1,100 @@
+from typing import Dict, List, Literal, Optional
+from concurrent.futures import Future
+from dataclasses import dataclass
+import asyncio
+import os
+import subprocess
+import time
+from config import settings
+from infra.logger import logger
+from .event_loop import get_background_loop
+
+# "probe": ffprobe and other short metadata reads; "transfer": long-running ffmpeg downloads
+ToolPool = Literal["probe", "transfer"]
+
+@dataclass
+class ToolResult:
+    """Outcome of one ffmpeg/ffprobe run"""
+    command: List[str]
+    returncode: Optional[int]
+    stdout: bytes
+    stderr: bytes
+    elapsed: float
+    timeout: Optional[float] = None
+    timed_out: bool = False
+
+    def check(self) -> "ToolResult":
+        """Raise subprocess.TimeoutExpired / CalledProcessError like subprocess.run(check=True) would"""
+        if self.timed_out:
+            raise subprocess.TimeoutExpired(self.command, self.timeout, output=self.stdout, stderr=self.stderr)
+        if self.returncode:
+            raise subprocess.CalledProcessError(self.returncode, self.command, output=self.stdout, stderr=self.stderr)
+        return self
+
+class MediaToolRunner:
+    """
+    Shared runner for ffmpeg/ffprobe processes. Processes are started with
+    asyncio.create_subprocess_exec on the background event loop. Each pool bounds its own
+    processes across all request threads and save tasks (at most `max_concurrency` probes and
+    `transfer_concurrency` ffmpeg downloads at once), the rest wait for a free slot of their pool,
+    so slow downloads never hold back probes. A process that exceeds its timeout, or whose call
+    is cancelled, is killed.
+    """
+
+    def __init__(self, max_concurrency: int, transfer_concurrency: int):
+        self.limits: Dict[str, int] = {"probe": max_concurrency, "transfer": transfer_concurrency}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def run_async(self, command: List[str], timeout: Optional[float] = None,
+                        merge_stderr: bool = False, pool: ToolPool = "probe") -> ToolResult:
+        """Run command and collect its output; timeout (seconds) counts from process start"""
+        semaphore = self._semaphores.get(pool)
+        if semaphore is None:
+            # Created on first use so it belongs to the loop that runs the processes
+            semaphore = self._semaphores[pool] = asyncio.Semaphore(self.limits[pool])
+        async with semaphore:
+            started = time.monotonic()
+            process = await asyncio.create_subprocess_exec(
+                *command, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT if merge_stderr else asyncio.subprocess.PIPE)
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                await self._kill(process)
+                logger.warning(f"{command[0]} killed after {timeout}s: {' '.join(command)}")
+                return ToolResult(command, None, b"", b"", time.monotonic() - started, timeout, timed_out=True)
+            except asyncio.CancelledError:
+                await self._kill(process)
+                raise
+            return ToolResult(command, process.returncode, stdout or b"", stderr or b"",
+                              time.monotonic() - started, timeout)
+
+    @staticmethod
+    async def _kill(process: asyncio.subprocess.Process) -> None:
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
+
+    def submit(self, command: List[str], timeout: Optional[float] = None, merge_stderr: bool = False,
+               pool: ToolPool = "probe") -> Future:
+        """Schedule command on the background loop; cancelling the returned future kills the process"""
+        return asyncio.run_coroutine_threadsafe(self.run_async(command, timeout, merge_stderr, pool), get_background_loop())
+
+    def run(self, command: List[str], timeout: Optional[float] = None, merge_stderr: bool = False,
+            pool: ToolPool = "probe") -> ToolResult:
+        """Blocking form of submit() for worker threads"""
+        future = self.submit(command, timeout, merge_stderr, pool)
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+# Initialize Singleton
+media_tools = MediaToolRunner(
+    max_concurrency=settings.MEDIA_TOOL_CONCURRENCY or os.cpu_count() or 1,
+    transfer_concurrency=settings.MEDIA_TRANSFER_CONCURRENCY or os.cpu_count() or 1,
+)
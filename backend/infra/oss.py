@@ -1,8 +1,16 @@
+from typing import Callable, Dict, Iterable, Literal, Optional, Tuple
 import oss2
 import os
+import threading
+import time
 from config import settings
 from infra.logger import logger
 
+ConfigType = Literal["general", "mp4"]
+
+# progress_callback(bytes_uploaded, total_bytes)
+ProgressCallback = Callable[[int, Optional[int]], None]
+
 class OSSConfigurationError(Exception):
     pass
 
@@ -16,17 +24,139 @@ def validate_oss_config(config_type: str = "general"):
         raise OSSConfigurationError(error_msg)
     return config
 
-def upload_to_oss(path):
+class OSSUploader:
+    """
+    Uploads files to OSS through cached bucket clients (one per configuration, rebuilt when the
+    configuration changes). Files of at least `multipart_threshold` bytes go up as multipart
+    uploads with `num_threads` parts in flight; the upload state is checkpointed under
+    `checkpoint_dir`, so a retry after a network error (or a later call for the same file)
+    resumes with the missing parts instead of starting over.
+    """
+
+    def __init__(self, checkpoint_dir: str, multipart_threshold: int, part_size: int, num_threads: int, retries: int,
+                 stream_part_size: int):
+        self.checkpoint_dir = checkpoint_dir
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.stream_part_size = stream_part_size
+        self.num_threads = num_threads
+        self.retries = retries
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[tuple, oss2.Bucket]] = {}
+
+    def get_bucket(self, config_type: ConfigType = "general") -> oss2.Bucket:
+        config = validate_oss_config(config_type)
+        fingerprint = (config.access_key_id, config.access_key_secret, config.endpoint, config.bucket_name, config.region)
+        with self._lock:
+            cached = self._buckets.get(config_type)
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+            if config_type == "mp4":
+                # Custom domain and v4 signature
+                auth = oss2.AuthV4(config.access_key_id, config.access_key_secret)
+                bucket = oss2.Bucket(auth, config.endpoint, config.bucket_name, region=config.region, is_cname=True)
+            else:
+                auth = oss2.Auth(config.access_key_id, config.access_key_secret)
+                bucket = oss2.Bucket(auth, config.endpoint, config.bucket_name)
+            self._buckets[config_type] = (fingerprint, bucket)
+            return bucket
+
+    def upload(self, path: str, object_name: Optional[str] = None, config_type: ConfigType = "general",
+               progress_callback: Optional[ProgressCallback] = None) -> str:
+        """Upload a local file, returns its object name"""
+        bucket = self.get_bucket(config_type)
+        object_name = object_name or os.path.basename(path)
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        store = oss2.ResumableStore(root=self.checkpoint_dir, dir="upload")
+        for attempt in range(self.retries + 1):
+            try:
+                oss2.resumable_upload(bucket, object_name, path, store=store,
+                                      multipart_threshold=self.multipart_threshold, part_size=self.part_size,
+                                      num_threads=self.num_threads, progress_callback=progress_callback)
+                return object_name
+            except oss2.exceptions.RequestError as e:
+                # Network error: the checkpoint keeps the uploaded parts for the next attempt
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Upload of {path} to OSS interrupted ({e}), resuming (attempt {attempt + 2}/{self.retries + 1})")
+                time.sleep(2 ** attempt)
+        return object_name
+
+    def upload_stream(self, chunks: Iterable[bytes], object_name: str, config_type: ConfigType = "general") -> int:
+        """
+        Upload a stream of byte chunks (e.g. a download in progress) as one object without staging
+        it on disk. At most one part of `stream_part_size` bytes is buffered; streams that end
+        within the first part become a single put. A part interrupted by a network error is sent
+        again up to `retries` times; any other failure aborts the multipart upload.
+        Returns the number of bytes uploaded.
+        """
+        bucket = self.get_bucket(config_type)
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        parts = []
+        try:
+            for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                while len(buffer) >= self.stream_part_size:
+                    if upload_id is None:
+                        upload_id = bucket.init_multipart_upload(object_name).upload_id
+                    parts.append(self._upload_part(bucket, object_name, upload_id, len(parts) + 1,
+                                                   bytes(buffer[:self.stream_part_size])))
+                    del buffer[:self.stream_part_size]
+            if upload_id is None:
+                bucket.put_object(object_name, bytes(buffer))
+                return size
+            if buffer:
+                parts.append(self._upload_part(bucket, object_name, upload_id, len(parts) + 1, bytes(buffer)))
+            bucket.complete_multipart_upload(object_name, upload_id, parts)
+            return size
+        except BaseException:
+            if upload_id is not None:
+                try:
+                    bucket.abort_multipart_upload(object_name, upload_id)
+                except oss2.exceptions.OssError as e:
+                    logger.warning(f"Failed to abort multipart upload of {object_name}: {e}")
+            raise
+
+    def _upload_part(self, bucket: oss2.Bucket, object_name: str, upload_id: str, part_number: int,
+                     data: bytes) -> oss2.models.PartInfo:
+        for attempt in range(self.retries + 1):
+            try:
+                result = bucket.upload_part(object_name, upload_id, part_number, data)
+                return oss2.models.PartInfo(part_number, result.etag)
+            except oss2.exceptions.RequestError as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Part {part_number} of {object_name} interrupted ({e}), retrying (attempt {attempt + 2}/{self.retries + 1})")
+                time.sleep(2 ** attempt)
+
+    def put_bytes(self, data: bytes, object_name: str, config_type: ConfigType = "general") -> None:
+        self.get_bucket(config_type).put_object(object_name, data)
+
+    def sign_url(self, object_name: str, config_type: ConfigType = "general", expires: int = 24 * 60 * 60) -> str:
+        if config_type == "mp4":
+            return self.get_bucket(config_type).sign_url('GET', object_name, expires, slash_safe=True)
+        return self.get_bucket(config_type).sign_url('GET', object_name, expires)
+
+# Initialize Singleton
+oss_uploader = OSSUploader(
+    checkpoint_dir=settings.OSS_CHECKPOINT_DIR,
+    multipart_threshold=settings.OSS_MULTIPART_THRESHOLD,
+    part_size=settings.OSS_PART_SIZE,
+    num_threads=settings.OSS_UPLOAD_THREADS,
+    retries=settings.OSS_UPLOAD_RETRIES,
+    stream_part_size=settings.OSS_STREAM_PART_SIZE,
+)
+
+def upload_to_oss(path, progress_callback: Optional[ProgressCallback] = None):
     try:
-        config = validate_oss_config("general")
+        # Cached OSS client
+        bucket = oss_uploader.get_bucket("general")
         
-        # Create OSS client
-        auth = oss2.Auth(config.access_key_id, config.access_key_secret)
-        bucket = oss2.Bucket(auth, config.endpoint, config.bucket_name)
-        
-        # Upload file
-        object_name = os.path.basename(path)
-        bucket.put_object_from_file(object_name, path)
+        # Upload file (multipart and resumable for large files)
+        object_name = oss_uploader.upload(path, config_type="general", progress_callback=progress_callback)
         
         # Generate signed URL (valid for 24 hours)
         url = bucket.sign_url('GET', object_name, 24 * 60 * 60)
@@ -40,26 +170,14 @@ def upload_to_oss(path):
         logger.error(f"Failed to upload to OSS: {e}")
         raise
 
-def upload_mp4_to_oss(path):
+def upload_mp4_to_oss(path, progress_callback: Optional[ProgressCallback] = None):
     """Special method for uploading MP4 files, using custom domain and v4 signature"""
     try:
-        config = validate_oss_config("mp4")
-        
-        # Directly use credentials from the configuration file
-        auth = oss2.AuthV4(config.access_key_id, config.access_key_secret)
-        
-        # Create OSS client with custom domain
-        bucket = oss2.Bucket(
-            auth, 
-            config.endpoint, 
-            config.bucket_name, 
-            region=config.region, 
-            is_cname=True
-        )
+        # Cached OSS client with custom domain and v4 signature
+        bucket = oss_uploader.get_bucket("mp4")
         
-        # Upload file
-        object_name = os.path.basename(path)
-        bucket.put_object_from_file(object_name, path)
+        # Upload file (multipart and resumable for large files)
+        object_name = oss_uploader.upload(path, config_type="mp4", progress_callback=progress_callback)
         
         # Generate pre-signed URL (valid for 24 hours), set slash_safe to True to avoid path escaping
         url = bucket.sign_url('GET', object_name, 24 * 60 * 60, slash_safe=True)
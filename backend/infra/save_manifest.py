@@ -0,0 +1,64 @@
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import os
+import uuid
+from config import settings
+from infra.logger import logger
+
+Manifest = Dict[str, Any]
+
+def file_state(path: str) -> Optional[Dict[str, int]]:
+    """Size and mtime of a file as recorded in a manifest, None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class SaveManifestStore:
+    """
+    One JSON manifest per draft describing its last successful save: the template the
+    draft folder was created from, every downloaded material (URL, path relative to the
+    draft folder, file size/mtime, probe result, when it was last verified), the hash of
+    the written draft_info.json and the uploaded draft URL. The next save of the draft
+    only transfers and rewrites what differs from it.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, draft_id: str) -> str:
+        return os.path.join(self.directory, f"{draft_id}.json")
+
+    def load(self, draft_id: str) -> Manifest:
+        """The draft's manifest, empty when there is none (or it cannot be read)"""
+        try:
+            with open(self._path(draft_id), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable save manifest of draft {draft_id}: {e}")
+            return {}
+        return manifest if isinstance(manifest, dict) else {}
+
+    def save(self, draft_id: str, manifest: Manifest) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(draft_id)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def delete(self, draft_id: str) -> None:
+        try:
+            os.remove(self._path(draft_id))
+        except FileNotFoundError:
+            pass
+
+# Initialize Singleton
+save_manifests = SaveManifestStore(settings.SAVE_MANIFEST_DIR)
@@ -0,0 +1,57 @@
+from typing import Any, Callable, Dict, Hashable, Optional
+import copy
+import threading
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        # Callers waiting for this call; they copy `result`, so then nobody gets the original
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    In-process request coalescing: while a call for a key is running, concurrent
+    callers with the same key wait for it and receive its result (or exception)
+    instead of doing the same work again. Each waiter gets its own deep copy of the
+    result, so callers can modify what they get. Nothing is cached after the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        result, _ = self.do_shared(key, func, *args, **kwargs)
+        return result
+
+    def do_shared(self, key: Hashable, func: Callable[..., Any], *args: Any, **kwargs: Any):
+        """Like do(), also returns whether the result came from another caller's call"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        # No new waiter can join once the call is removed
+        return (copy.deepcopy(call.result) if call.waiters else call.result), False
+
+# Initialize Singleton
+single_flight = SingleFlight()
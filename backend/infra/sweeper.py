@@ -0,0 +1,121 @@
+from typing import Optional
+import os
+import shutil
+import threading
+import time
+from config import settings
+from infra.logger import logger
+from .cache_service import draft_store
+
+INFRA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Per-draft temporary artifacts: directory -> name pattern of the draft's entry
+TEMP_ARTIFACT_LOCATIONS = [
+    ("tmp/downloads", "{draft_id}"),          # /draft/downloader working folders
+    ("tmp/zips", "{draft_id}.zip"),           # /draft/downloader archives
+    (os.path.join(INFRA_DIR, "tmp/zip"), "{draft_id}.zip"),  # infra.util.zip_draft archives
+]
+
+# Per-draft artifacts kept for the draft's whole lifetime: removed when the draft expires,
+# never for being untouched (their directories also hold other files)
+DRAFT_ARTIFACT_LOCATIONS = [
+    (os.path.join(os.path.dirname(INFRA_DIR), "services"), "{draft_id}"),  # saved draft folders
+    (settings.SAVE_MANIFEST_DIR, "{draft_id}.json"),                      # incremental save manifests
+]
+
+def _remove_path(path: str) -> bool:
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        else:
+            return False
+        return True
+    except OSError as e:
+        logger.error(f"Sweeper failed to remove {path}: {e}")
+        return False
+
+def _last_modified(path: str) -> float:
+    """Newest mtime within a file or directory tree (files still being written keep their folder alive)"""
+    latest = os.path.getmtime(path)
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            for name in dirs + files:
+                try:
+                    latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+                except OSError:
+                    pass
+    return latest
+
+class Sweeper:
+    """
+    Background thread that periodically expires drafts and tasks from the draft store,
+    deletes the temp directories and zips of expired drafts, and removes any temp
+    artifact left untouched for longer than artifact_ttl (e.g. by a request that died halfway).
+    """
+
+    def __init__(self, interval: float, artifact_ttl: float):
+        self.interval = interval
+        self.artifact_ttl = artifact_ttl
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-sweeper", daemon=True)
+        self._thread.start()
+        logger.info(f"Sweeper started, interval {self.interval}s.")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Sweeper run failed: {e}", exc_info=True)
+
+    def sweep(self) -> None:
+        expired_drafts = draft_store.purge_expired_drafts()
+        expired_tasks = draft_store.purge_expired_tasks()
+        removed = 0
+        for draft_id in expired_drafts:
+            removed += self.remove_draft_artifacts(draft_id)
+        removed += self.remove_stale_artifacts()
+        if expired_drafts or expired_tasks or removed:
+            logger.info(f"Sweeper expired {len(expired_drafts)} drafts, {len(expired_tasks)} tasks and removed {removed} temp artifacts.")
+
+    @staticmethod
+    def remove_draft_artifacts(draft_id: str) -> int:
+        removed = 0
+        for directory, pattern in TEMP_ARTIFACT_LOCATIONS + DRAFT_ARTIFACT_LOCATIONS:
+            if _remove_path(os.path.join(directory, pattern.format(draft_id=draft_id))):
+                removed += 1
+        return removed
+
+    def remove_stale_artifacts(self) -> int:
+        if not self.artifact_ttl:
+            return 0
+        removed = 0
+        cutoff = time.time() - self.artifact_ttl
+        for directory, _ in TEMP_ARTIFACT_LOCATIONS:
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    stale = _last_modified(path) < cutoff
+                except OSError:
+                    continue
+                if stale and _remove_path(path):
+                    removed += 1
+        return removed
+
+# Initialize Singleton
+sweeper = Sweeper(interval=settings.SWEEP_INTERVAL, artifact_ttl=settings.TEMP_ARTIFACT_TTL)
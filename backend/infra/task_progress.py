@@ -0,0 +1,133 @@
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+import asyncio
+import threading
+import time
+from config import settings
+from .cache_service import TaskStatus, get_task_status, update_task_fields
+from .job_queue import current_job
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+class TaskProgressTracker:
+    """
+    Coalescing writer and push source for task progress.
+
+    update() merges fields into a per-task pending buffer and publishes them to the
+    task cache at most `max_updates_per_second` times per task; a trailing timer makes
+    sure the last buffered update is never lost. Status changes to a terminal state
+    are published immediately. The store is written outside of the tracker lock;
+    publishes of the same task are serialized so they land in order. Updates a job makes
+    to its own task after a newer job superseded it are dropped.
+    Subscribers are async generators woken on the event loop when a snapshot is published.
+    """
+
+    def __init__(self, max_updates_per_second: float = 4.0):
+        self.min_interval = 1.0 / max_updates_per_second if max_updates_per_second > 0 else 0.0
+        self._cond = threading.Condition()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._last_publish: Dict[str, float] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+        # Tasks whose fields are being written to the store right now
+        self._publishing: Set[str] = set()
+        # task_id -> events of the async subscribers waiting for its next publish
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def update(self, task_id: str, force: bool = False, **fields: Any) -> None:
+        job = current_job()
+        with self._cond:
+            if job is not None and job.superseded and job.job_id == task_id:
+                return
+            pending = self._pending.setdefault(task_id, {})
+            pending.update(fields)
+            wait = self.min_interval - (time.monotonic() - self._last_publish.get(task_id, 0.0))
+            publish = force or wait <= 0 or pending.get("status") in TERMINAL_STATUSES
+            if not publish and task_id not in self._timers:
+                timer = threading.Timer(wait, self.flush, args=(task_id,))
+                timer.daemon = True
+                self._timers[task_id] = timer
+                timer.start()
+        if publish:
+            self.flush(task_id)
+
+    def flush(self, task_id: str) -> None:
+        """Publish any buffered fields of the task right away"""
+        with self._cond:
+            # Wait for an earlier publish of this task, so an older update never overwrites a newer one
+            while task_id in self._publishing:
+                self._cond.wait()
+            timer = self._timers.pop(task_id, None)
+            if timer is not None:
+                timer.cancel()
+            fields = self._pending.pop(task_id, None)
+            if not fields:
+                return
+            self._publishing.add(task_id)
+        try:
+            update_task_fields(task_id, fields)
+        finally:
+            with self._cond:
+                self._publishing.discard(task_id)
+                if fields.get("status") in TERMINAL_STATUSES:
+                    self._last_publish.pop(task_id, None)
+                else:
+                    self._last_publish[task_id] = time.monotonic()
+                waiters = self._waiters.pop(task_id, ())
+                self._cond.notify_all()
+            for loop, event in waiters:
+                loop.call_soon_threadsafe(event.set)
+
+    def discard(self, task_id: str) -> None:
+        """Drop the buffered fields of the task, waiting for a publish in progress"""
+        with self._cond:
+            while task_id in self._publishing:
+                self._cond.wait()
+            timer = self._timers.pop(task_id, None)
+            if timer is not None:
+                timer.cancel()
+            self._pending.pop(task_id, None)
+
+    def snapshot(self, task_id: str) -> Optional[TaskStatus]:
+        return get_task_status(task_id)
+
+    async def subscribe(self, task_id: str, heartbeat: float = 15.0, poll_interval: float = 1.0) -> AsyncIterator[Optional[TaskStatus]]:
+        """
+        Yield the task status every time it changes, until it reaches a terminal state.
+        Yields None when nothing changed for `heartbeat` seconds so callers can keep
+        the connection alive. Updates published in this process wake subscribers
+        immediately; updates from other worker processes are picked up every `poll_interval`.
+        Never blocks the event loop: store reads run in the default executor.
+        """
+        loop = asyncio.get_running_loop()
+        last = None
+        while True:
+            status = await loop.run_in_executor(None, self.snapshot, task_id)
+            if status is None:
+                return
+            if status != last:
+                last = status
+                yield status
+                if status.get("status") in TERMINAL_STATUSES:
+                    return
+            deadline = loop.time() + heartbeat
+            changed = False
+            while not changed and loop.time() < deadline:
+                waiter = (loop, asyncio.Event())
+                with self._cond:
+                    self._waiters.setdefault(task_id, set()).add(waiter)
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout=min(poll_interval, max(deadline - loop.time(), 0)))
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._cond:
+                        waiters = self._waiters.get(task_id)
+                        if waiters is not None:
+                            waiters.discard(waiter)
+                            if not waiters:
+                                del self._waiters[task_id]
+                changed = await loop.run_in_executor(None, self.snapshot, task_id) != last
+            if not changed:
+                yield None
+
+# Initialize Singleton
+task_progress = TaskProgressTracker(settings.TASK_PROGRESS_MAX_UPDATES_PER_SECOND)
@@ -0,0 +1,109 @@
+from typing import Any, Collection, Dict, List, Optional, Tuple
+import json
+import os
+import pickle
+import threading
+from infra.logger import logger
+
+# (relative path, size, mtime_ns) of every file in a template folder
+FolderSignature = Tuple[Tuple[str, int, int], ...]
+
+class TemplateCache:
+    """
+    In-memory prototypes of the draft templates: parsed JSON template files and the contents
+    of template folders. A prototype is reloaded once its files change on disk (size/mtime),
+    so editing a template takes effect without a restart.
+
+    JSON prototypes are kept pickled; unpickling hands out an independent copy faster than
+    parsing the file again (or deep-copying the parsed object). Folders are written from memory
+    instead of copytree; files are not hardlinked because drafts rewrite some of them in place.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._json: Dict[str, Tuple[Tuple[int, int], bytes]] = {}
+        self._folders: Dict[str, Tuple[FolderSignature, List[str], Dict[str, bytes]]] = {}
+
+    def load_json(self, path: str) -> Any:
+        """Parsed content of a JSON template file, as a fresh copy the caller may modify"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        state = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._json.get(path)
+        if cached is None or cached[0] != state:
+            with open(path, "r", encoding="utf-8") as f:
+                content = json.load(f)
+            cached = (state, pickle.dumps(content, protocol=pickle.HIGHEST_PROTOCOL))
+            with self._lock:
+                self._json[path] = cached
+            logger.debug(f"Loaded template file {path} into the template cache")
+        return pickle.loads(cached[1])
+
+    @staticmethod
+    def _signature(template_path: str) -> Tuple[FolderSignature, List[str]]:
+        files = []
+        dirs = []
+        for current, subdirs, names in os.walk(template_path):
+            subdirs.sort()
+            relative = os.path.relpath(current, template_path)
+            if relative != ".":
+                dirs.append(relative)
+            for name in sorted(names):
+                stat = os.stat(os.path.join(current, name))
+                files.append((os.path.normpath(os.path.join(relative, name)), stat.st_size, stat.st_mtime_ns))
+        return tuple(files), dirs
+
+    def _folder(self, template_path: str) -> Tuple[List[str], Dict[str, bytes]]:
+        template_path = os.path.abspath(template_path)
+        if not os.path.isdir(template_path):
+            raise FileNotFoundError(f"Template folder {template_path} does not exist")
+        signature, dirs = self._signature(template_path)
+        with self._lock:
+            cached = self._folders.get(template_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1], cached[2]
+        contents = {}
+        for relative, _, _ in signature:
+            with open(os.path.join(template_path, relative), "rb") as f:
+                contents[relative] = f.read()
+        with self._lock:
+            self._folders[template_path] = (signature, dirs, contents)
+        logger.debug(f"Loaded template folder {template_path} ({len(contents)} files) into the template cache")
+        return dirs, contents
+
+    def files(self, template_path: str) -> Dict[str, bytes]:
+        """Contents of the template folder's files by relative path (e.g. to upload them without reading the disk)"""
+        return dict(self._folder(template_path)[1])
+
+    def materialize(self, template_path: str, target_path: str, exclude: Collection[str] = (),
+                    allow_replace: bool = False) -> None:
+        """
+        Create target_path as a copy of the template folder, written from the cached prototype.
+        `exclude` lists paths (relative to the template) that are not written, e.g. files the
+        caller writes itself. Raises FileExistsError when target_path exists and not allow_replace.
+        """
+        dirs, contents = self._folder(template_path)
+        os.makedirs(target_path, exist_ok=allow_replace)
+        for relative in dirs:
+            os.makedirs(os.path.join(target_path, relative), exist_ok=True)
+        excluded = {os.path.normpath(relative) for relative in exclude}
+        for relative, data in contents.items():
+            if relative in excluded:
+                continue
+            with open(os.path.join(target_path, relative), "wb") as f:
+                f.write(data)
+
+    def clear(self, path: Optional[str] = None) -> None:
+        """Drop the prototype of one template file/folder, or of all templates"""
+        with self._lock:
+            if path is None:
+                self._json.clear()
+                self._folders.clear()
+            else:
+                path = os.path.abspath(path)
+                self._json.pop(path, None)
+                self._folders.pop(path, None)
+
+# Initialize Singleton
+template_cache = TemplateCache()
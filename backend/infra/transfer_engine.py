@@ -0,0 +1,109 @@
+from typing import Any, Callable, Deque, Optional
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+import asyncio
+import contextvars
+from config import settings
+from .event_loop import get_background_loop
+from .transfer_scheduler import Priority, transfer_scheduler
+
+@dataclass
+class _Transfer:
+    func: Callable[..., Any]
+    url: str
+    args: tuple
+    host: str
+    priority: Priority
+    context: contextvars.Context
+    future: Future = field(default_factory=Future)
+
+class TransferEngine:
+    """
+    Shared scheduler for asset transfers of all save tasks.
+
+    Transfers are queued per group (usually the save task id) on the background event
+    loop and dispatched round-robin between groups, so one large draft cannot starve the
+    others; interactive transfers are dispatched before batch ones. At most
+    `max_connections` transfers run at once in total and at most `per_host_limit`
+    against any single host. The transfer itself is a blocking call (e.g. download_file)
+    executed on the engine's own bounded thread pool, in the submitter's context so the
+    transfer scheduler sees the submitter's priority.
+    """
+
+    def __init__(self, max_connections: int, per_host_limit: int):
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="transfer")
+        # group -> pending transfers; the group order is the round-robin order
+        self._queues: "OrderedDict[str, Deque[_Transfer]]" = OrderedDict()
+        self._active = 0
+        self._active_per_host: Counter = Counter()
+
+    def submit(self, func: Callable[..., Any], url: str, *args: Any, group: str = "default",
+               priority: Optional[Priority] = None) -> Future:
+        """Schedule func(url, *args), returns a concurrent.futures.Future with its result"""
+        context = contextvars.copy_context()
+        if priority is not None:
+            context.run(transfer_scheduler.set_priority, priority)
+        transfer = _Transfer(func=func, url=url, args=args, host=urlparse(url).netloc,
+                             priority=context.run(transfer_scheduler.current_priority), context=context)
+        get_background_loop().call_soon_threadsafe(self._enqueue, group, transfer)
+        return transfer.future
+
+    async def transfer(self, func: Callable[..., Any], url: str, *args: Any, group: str = "default",
+                       priority: Optional[Priority] = None) -> Any:
+        """Awaitable form of submit() for coroutines"""
+        return await asyncio.wrap_future(self.submit(func, url, *args, group=group, priority=priority))
+
+    # The methods below only run on the background loop, so they need no locking
+
+    def _enqueue(self, group: str, transfer: _Transfer) -> None:
+        self._queues.setdefault(group, deque()).append(transfer)
+        self._dispatch()
+
+    def _next_transfer(self) -> Optional[_Transfer]:
+        for priority in ("interactive", "batch"):
+            for group in list(self._queues):
+                queue = self._queues[group]
+                for transfer in queue:
+                    if transfer.priority == priority and self._active_per_host[transfer.host] < self.per_host_limit:
+                        queue.remove(transfer)
+                        # Rotate the group to the back so the next slot goes to another group
+                        self._queues.move_to_end(group)
+                        if not queue:
+                            del self._queues[group]
+                        return transfer
+        return None
+
+    def _dispatch(self) -> None:
+        while self._active < self.max_connections:
+            transfer = self._next_transfer()
+            if transfer is None:
+                return
+            if not transfer.future.set_running_or_notify_cancel():
+                continue
+            self._active += 1
+            self._active_per_host[transfer.host] += 1
+            asyncio.get_running_loop().create_task(self._run(transfer))
+
+    async def _run(self, transfer: _Transfer) -> None:
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, transfer.context.run, transfer.func, transfer.url, *transfer.args)
+            transfer.future.set_result(result)
+        except Exception as e:
+            transfer.future.set_exception(e)
+        finally:
+            self._active -= 1
+            self._active_per_host[transfer.host] -= 1
+            if not self._active_per_host[transfer.host]:
+                del self._active_per_host[transfer.host]
+            self._dispatch()
+
+# Initialize Singleton
+transfer_engine = TransferEngine(
+    max_connections=settings.TRANSFER_MAX_CONNECTIONS,
+    per_host_limit=settings.TRANSFER_PER_HOST_LIMIT,
+)
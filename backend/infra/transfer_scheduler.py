@@ -0,0 +1,135 @@
+from typing import Iterator, Literal, Optional
+from contextlib import contextmanager
+import contextvars
+import threading
+import time
+from config import settings
+from infra.logger import logger
+
+Priority = Literal["interactive", "batch"]
+
+# Priority of transfers started from the current context (request handler, transfer job, ...)
+_current_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("transfer_priority", default="batch")
+
+class TransferScheduler:
+    """
+    Process-wide admission control for all asset traffic.
+
+    Every transfer holds a slot while it talks to the network. The number of slots is
+    tuned AIMD-style once per `window` seconds: halved when the error rate of the window
+    exceeds `error_threshold`, increased by one while throughput keeps improving.
+    Interactive transfers are admitted before any waiting batch transfer. Bytes read
+    are paced through a token bucket when `bandwidth_limit` (bytes/s) is set.
+    """
+
+    def __init__(self, initial_limit: int, min_limit: int, max_limit: int, bandwidth_limit: float = 0,
+                 window: float = 5.0, error_threshold: float = 0.1):
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.bandwidth_limit = bandwidth_limit
+        self.window = window
+        self.error_threshold = error_threshold
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting_interactive = 0
+        # AIMD window statistics
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._window_ok = 0
+        self._window_errors = 0
+        self._last_throughput = 0.0
+        # Token bucket
+        self._bucket_lock = threading.Lock()
+        self._tokens = float(bandwidth_limit)
+        self._last_refill = time.monotonic()
+
+    @staticmethod
+    @contextmanager
+    def priority(priority: Priority) -> Iterator[None]:
+        """Run the enclosed transfers (in this context) with the given priority"""
+        token = _current_priority.set(priority)
+        try:
+            yield
+        finally:
+            _current_priority.reset(token)
+
+    @staticmethod
+    def set_priority(priority: Priority) -> None:
+        _current_priority.set(priority)
+
+    @staticmethod
+    def current_priority() -> Priority:
+        return _current_priority.get()
+
+    @contextmanager
+    def slot(self, priority: Optional[Priority] = None) -> Iterator[None]:
+        """Hold one transfer slot; waits while all slots are taken (batch also yields to waiting interactive)"""
+        interactive = (priority or _current_priority.get()) == "interactive"
+        with self._cond:
+            if interactive:
+                self._waiting_interactive += 1
+                try:
+                    while self._active >= self.limit:
+                        self._cond.wait()
+                finally:
+                    self._waiting_interactive -= 1
+            else:
+                while self._active >= self.limit or self._waiting_interactive:
+                    self._cond.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def record(self, nbytes: int = 0, ok: bool = True) -> None:
+        """Report a finished transfer attempt; adjusts the concurrency limit at window boundaries"""
+        with self._cond:
+            self._window_bytes += nbytes
+            if ok:
+                self._window_ok += 1
+            else:
+                self._window_errors += 1
+            elapsed = time.monotonic() - self._window_start
+            if elapsed < self.window:
+                return
+            attempts = self._window_ok + self._window_errors
+            throughput = self._window_bytes / elapsed
+            old_limit = self.limit
+            if attempts and self._window_errors / attempts > self.error_threshold:
+                self.limit = max(self.min_limit, self.limit // 2)
+            elif throughput > self._last_throughput * 1.05 and self._active >= self.limit:
+                # Only grow while the current limit is actually used and still pays off
+                self.limit = min(self.max_limit, self.limit + 1)
+            self._last_throughput = throughput
+            self._window_start = time.monotonic()
+            self._window_bytes = self._window_ok = self._window_errors = 0
+            if self.limit != old_limit:
+                logger.info(f"Transfer concurrency {old_limit} -> {self.limit} "
+                            f"({throughput / 1024 / 1024:.2f}MB/s, {attempts} transfers in window)")
+                self._cond.notify_all()
+
+    def throttle(self, nbytes: int) -> None:
+        """Block until nbytes may be transferred under the bandwidth cap"""
+        if self.bandwidth_limit <= 0:
+            return
+        with self._bucket_lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.bandwidth_limit), self._tokens + (now - self._last_refill) * self.bandwidth_limit)
+            self._last_refill = now
+            # Take the tokens up front (possibly going negative) and sleep off the debt outside the lock
+            self._tokens -= nbytes
+            wait = -self._tokens / self.bandwidth_limit if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+# Initialize Singleton
+transfer_scheduler = TransferScheduler(
+    initial_limit=settings.TRANSFER_INITIAL_CONCURRENCY,
+    min_limit=settings.TRANSFER_MIN_CONCURRENCY,
+    max_limit=settings.TRANSFER_MAX_CONCURRENCY,
+    bandwidth_limit=settings.TRANSFER_BANDWIDTH_LIMIT,
+)
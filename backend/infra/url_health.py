@@ -0,0 +1,106 @@
+from typing import Dict, Optional
+from urllib.parse import urlparse
+import threading
+import time
+from config import settings
+from infra.logger import logger
+from .cache_service import ThreadSafeCache
+
+class UrlUnavailableError(Exception):
+    """The URL failed recently or its host is failing, so it is not tried again for now"""
+
+def is_remote(url: str) -> bool:
+    return urlparse(str(url)).scheme in ("http", "https")
+
+class _HostState:
+    def __init__(self):
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_started_at: Optional[float] = None
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. After `failure_threshold` consecutive connection failures
+    (timeouts, refused or reset connections) the host is open: requests fail fast for
+    `reset_timeout` seconds. Then a single trial request is let through (another one
+    if it reports nothing within `reset_timeout`); its success closes the circuit,
+    its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostState] = {}
+
+    def allow(self, host: str) -> bool:
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or state.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - state.opened_at < self.reset_timeout:
+                return False
+            if state.trial_started_at is not None and now - state.trial_started_at < self.reset_timeout:
+                return False
+            state.trial_started_at = now
+            return True
+
+    def record_success(self, host: str) -> None:
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def record_failure(self, host: str) -> None:
+        with self._lock:
+            state = self._hosts.setdefault(host, _HostState())
+            state.failures += 1
+            state.trial_started_at = None
+            if state.failures >= self.failure_threshold:
+                if state.opened_at is None:
+                    logger.warning(f"Circuit opened for host {host} after {state.failures} consecutive failures.")
+                state.opened_at = time.monotonic()
+
+class UrlHealth:
+    """
+    Shared failure memory consulted before every remote probe or download:
+    a negative cache of URLs that failed within the last `negative_ttl` seconds
+    plus a per-host circuit breaker.
+    """
+
+    def __init__(self, negative_ttl: float, failure_threshold: int, reset_timeout: float):
+        self.negative_ttl = negative_ttl
+        self._failed = ThreadSafeCache[str](capacity=10000, absolute_ttl=negative_ttl)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    def check(self, url: str) -> None:
+        """Raise UrlUnavailableError if the URL should not be tried right now"""
+        if not is_remote(url):
+            return
+        reason = self._failed.get(url) if self.negative_ttl else None
+        if reason is not None:
+            raise UrlUnavailableError(f"{url} failed recently: {reason}")
+        host = urlparse(url).netloc
+        if not self.breaker.allow(host):
+            raise UrlUnavailableError(f"Host {host} is failing, skipping {url}")
+
+    def record_success(self, url: str) -> None:
+        if is_remote(url):
+            self._failed.delete(url)
+            self.breaker.record_success(urlparse(url).netloc)
+
+    def record_failure(self, url: str, reason: str) -> None:
+        """Remember that url failed for good (after its retries)"""
+        if is_remote(url) and self.negative_ttl:
+            self._failed.put(url, reason)
+
+    def record_connection_error(self, url: str) -> None:
+        """Count a single timeout/connection failure against the url's host"""
+        if is_remote(url):
+            self.breaker.record_failure(urlparse(url).netloc)
+
+# Initialize Singleton
+url_health = UrlHealth(
+    negative_ttl=settings.NEGATIVE_CACHE_TTL,
+    failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+)
@@ -1,4 +1,3 @@
-import shutil
 import subprocess
 import json
 import re
@@ -7,6 +6,7 @@ import hashlib
 import functools
 import time
 from config import settings
+from .zip_stream import folder_entries, write_zip
 
 def hex_to_rgb(hex_color: str) -> tuple:
     """Convert hexadecimal color code to RGB tuple (range 0.0-1.0)"""
@@ -28,13 +28,13 @@ def is_windows_path(path):
     return re.match(r'^[a-zA-Z]:\\|\\\\', path) is not None
 
 
-def zip_draft(draft_id):
+def zip_draft(draft_id, draft_path=None):
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    # Compress folder
+    # Compress folder (media stored as-is, JSON deflated)
     zip_dir = os.path.join(current_dir, "tmp/zip")
     os.makedirs(zip_dir, exist_ok=True)
     zip_path = os.path.join(zip_dir, f"{draft_id}.zip")
-    shutil.make_archive(os.path.join(zip_dir, draft_id), 'zip', os.path.join(current_dir, draft_id))
+    write_zip(folder_entries(draft_path or os.path.join(current_dir, draft_id)), zip_path)
     return zip_path
 
 def url_to_hash(url, length=16):
@@ -0,0 +1,107 @@
+from typing import Iterable, Iterator, Optional, Tuple
+import os
+import time
+import uuid
+import zipfile
+
+# Entries worth deflating; everything else in a draft (video, audio, images) is already compressed
+TEXT_EXTENSIONS = {".json", ".txt", ".srt", ".ass", ".lrc", ".xml", ".ini", ".plist", ".csv", ".log", ".md", ".bak"}
+
+_READ_SIZE = 1024 * 1024
+
+# (local file or directory path, name in the archive)
+ZipEntry = Tuple[str, str]
+
+def compress_type_for(name: str) -> int:
+    """ZIP_DEFLATED for JSON/text (and extension-less config files such as draft_settings), ZIP_STORED otherwise"""
+    extension = os.path.splitext(name)[1].lower()
+    return zipfile.ZIP_DEFLATED if not extension or extension in TEXT_EXTENSIONS else zipfile.ZIP_STORED
+
+def folder_entries(root_dir: str, base_dir: Optional[str] = None) -> Iterator[ZipEntry]:
+    """
+    Entries of a folder in the layout of shutil.make_archive(root_dir=..., base_dir=...):
+    names are relative to root_dir, or start with base_dir when it is given.
+    """
+    top = os.path.join(root_dir, base_dir) if base_dir else root_dir
+    for current, dirs, files in os.walk(top):
+        dirs.sort()
+        relative = os.path.relpath(current, root_dir)
+        prefix = "" if relative == "." else relative.replace(os.sep, "/") + "/"
+        if prefix:
+            yield current, prefix
+        for name in sorted(files):
+            yield os.path.join(current, name), prefix + name
+
+class _StreamBuffer:
+    """Write-only, non-seekable sink collecting the archive bytes until they are drained"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _write_entries(archive: zipfile.ZipFile, entries: Iterable[ZipEntry]) -> Iterator[None]:
+    """Write the entries into the archive, yielding after every block read so a caller can drain its sink"""
+    for path, name in entries:
+        if name.endswith("/"):
+            info = zipfile.ZipInfo(name, time.localtime(os.path.getmtime(path))[:6])
+            info.external_attr = 0o40775 << 16 | 0x10
+            archive.writestr(info, b"")
+        else:
+            info = zipfile.ZipInfo.from_file(path, name)
+            info.compress_type = compress_type_for(name)
+            with open(path, "rb") as source, archive.open(info, "w", force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as target:
+                for block in iter(lambda: source.read(_READ_SIZE), b""):
+                    target.write(block)
+                    yield
+        yield
+
+def iter_zip(entries: Iterable[ZipEntry]) -> Iterator[bytes]:
+    """
+    Generate a zip archive of the entries chunk by chunk, while reading them. Nothing is
+    buffered beyond one read block, so the archive can go straight into an HTTP response
+    or an upload. Media are stored as they are, JSON/text entries are deflated.
+    """
+    buffer = _StreamBuffer()
+    # An unseekable target makes zipfile write data descriptors instead of seeking back
+    with zipfile.ZipFile(buffer, "w", allowZip64=True) as archive:
+        for _ in _write_entries(archive, entries):
+            data = buffer.drain()
+            if data:
+                yield data
+    data = buffer.drain()
+    if data:
+        yield data
+
+def write_zip(entries: Iterable[ZipEntry], zip_path: str) -> str:
+    """
+    Write the archive of the entries to zip_path (atomically replaced), returns zip_path.
+    Same layout as iter_zip, but the file is seekable: zipfile patches each local header
+    after its entry instead of appending data descriptors.
+    """
+    tmp_path = f"{zip_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with zipfile.ZipFile(tmp_path, "w", allowZip64=True) as archive:
+            for _ in _write_entries(archive, entries):
+                pass
+        os.replace(tmp_path, zip_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return zip_path
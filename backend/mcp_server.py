@@ -346,8 +346,12 @@ def execute_tool(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
                 
             elif tool_name == "save_draft":
                 save_result = save_draft_impl(**arguments)
-                if isinstance(save_result, dict) and "draft_url" in save_result:
-                    result = {"draft_url": save_result["draft_url"]}
+                if isinstance(save_result, dict) and save_result.get("task_id"):
+                    # Saving runs in the background; the task id is polled with query_draft_status
+                    result = {
+                        "task_id": save_result["task_id"],
+                        "draft_url": f"https://www.install-ai-guider.top/draft/downloader?draft_id={arguments['draft_id']}"
+                    }
                 else:
                     result = {"draft_url": f"https://www.install-ai-guider.top/draft/downloader?draft_id=unknown"}
                 
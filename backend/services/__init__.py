@@ -6,5 +6,5 @@ from .add_image_impl import add_image_impl
 from .add_video_keyframe_impl import add_video_keyframe_impl
 from .add_effect_impl import add_effect_impl
 from .add_sticker_impl import add_sticker_impl
-from .save_draft_impl import save_draft_impl, query_task_status, query_script_impl
+from .save_draft_impl import save_draft_impl, cancel_save_draft, query_task_status, query_script_impl
 from .create_draft import create_draft
@@ -7,8 +7,10 @@ import re
 from typing import Optional, Dict, Tuple, List
 from domain.pyJianYingDraft import exceptions, Audio_scene_effect_type, Tone_effect_type, Speech_to_song_type, CapCut_Voice_filters_effect_type,CapCut_Voice_characters_effect_type,CapCut_Speech_to_song_effect_type, trange
 from .create_draft import get_or_create_draft
+from infra.draft_lock import with_draft_lock
 from config import settings
 
+@with_draft_lock()
 def add_audio_track(
     audio_url: str,
     draft_folder: Optional[str] = None,
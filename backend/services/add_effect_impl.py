@@ -2,9 +2,11 @@ from domain.pyJianYingDraft import trange, Video_scene_effect_type, Video_charac
 import domain.pyJianYingDraft as draft
 from typing import Optional, Dict, List, Union, Literal
 from .create_draft import get_or_create_draft
+from infra.draft_lock import with_draft_lock
 from infra.util import generate_draft_url
 from config import settings
 
+@with_draft_lock()
 def add_effect_impl(
     effect_type: str,  # Changed to string type
     effect_category: Literal["scene", "character", "filter"],
@@ -9,7 +9,9 @@ import re
 from typing import Optional, Dict
 from domain.pyJianYingDraft import exceptions
 from .create_draft import get_or_create_draft
+from infra.draft_lock import with_draft_lock
 
+@with_draft_lock()
 def add_image_impl(
     image_url: str,
     draft_folder: Optional[str] = None,
@@ -3,8 +3,10 @@ from domain.pyJianYingDraft import trange
 from typing import Optional, Dict
 from domain.pyJianYingDraft import exceptions
 from .create_draft import get_or_create_draft
+from infra.draft_lock import with_draft_lock
 from infra.util import generate_draft_url
 
+@with_draft_lock()
 def add_sticker_impl(
     resource_id: str,
     start: float,
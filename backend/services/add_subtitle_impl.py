@@ -1,11 +1,13 @@
 import domain.pyJianYingDraft as draft
 from infra.util import generate_draft_url, hex_to_rgb
 from .create_draft import get_or_create_draft
+from infra.draft_lock import with_draft_lock
 from domain.pyJianYingDraft.text_segment import TextBubble, TextEffect
 from typing import Optional
 import requests
 import os
 
+@with_draft_lock()
 def add_subtitle_impl(
     srt_path: str,
     draft_id: str = None,
@@ -5,8 +5,10 @@ from domain.pyJianYingDraft import trange, Font_type
 from typing import Optional, List  # add List type hint
 from domain.pyJianYingDraft import exceptions
 from .create_draft import get_or_create_draft
+from infra.draft_lock import with_draft_lock
 from domain.pyJianYingDraft.text_segment import TextBubble, TextEffect, TextStyleRange
 
+@with_draft_lock()
 def add_text_impl(
     text: str,
     start: float,
@@ -1,10 +1,12 @@
 import domain.pyJianYingDraft as draft
 from domain.pyJianYingDraft import exceptions
 from .create_draft import get_or_create_draft
+from infra.draft_lock import with_draft_lock
 from typing import Optional, Dict, List
 
 from infra.util import generate_draft_url
 
+@with_draft_lock()
 def add_video_keyframe_impl(
     draft_id: Optional[str] = None,
     track_name: str = "main",
@@ -8,7 +8,9 @@ import re
 from typing import Optional, Dict
 from domain.pyJianYingDraft import exceptions
 from .create_draft import get_or_create_draft
+from infra.draft_lock import with_draft_lock
 
+@with_draft_lock()
 def add_video_track(
     video_url: str,
     draft_folder: Optional[str] = None,
@@ -2,6 +2,7 @@ import uuid
 import domain.pyJianYingDraft as draft
 import time
 from infra.cache_service import draft_cache
+from infra.draft_lock import track_edit
 
 def create_draft(width=1080, height=1920):
     """
@@ -36,7 +37,8 @@ def get_or_create_draft(draft_id=None, width=1080, height=1920):
         if cached_script:
             # Get existing draft information from cache
             print(f"Getting draft from cache: {draft_id}")
-            # draft_cache.get() already updates LRU
+            # draft_cache.get() already updates LRU and rehydrates drafts spilled to disk
+            track_edit(draft_id, cached_script)
             return draft_id, cached_script
 
     # Create new draft logic
@@ -45,5 +47,6 @@ def get_or_create_draft(draft_id=None, width=1080, height=1920):
         width=width,
         height=height,
     )
+    track_edit(generate_draft_id, script)
     return generate_draft_id, script
     
\ No newline at end of file
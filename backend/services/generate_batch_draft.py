@@ -12,6 +12,7 @@ from .add_text_impl import add_text_impl
 from .add_effect_impl import add_effect_impl
 from services.template_service import template_service
 from infra.cache_service import draft_cache
+from infra.template_cache import template_cache
 from infra.util import hex_to_rgb
 from config import settings
 from infra.logger import logger
@@ -443,7 +444,7 @@ def generate_draft_from_local_materials(
     if os.path.exists(target_draft_path):
         shutil.rmtree(target_draft_path)
         
-    shutil.copytree(template_path, target_draft_path)
+    template_cache.materialize(template_path, target_draft_path)
     
     # Update draft_content.json
     script.dump(os.path.join(target_draft_path, "draft_content.json"))
@@ -463,4 +464,6 @@ def generate_draft_from_local_materials(
             json.dump(meta, f, ensure_ascii=False, indent=4)
             
     logger.info(f"Draft generation completed successfully. ID: {draft_id}")
+    # Persist the edits made directly on the script for shared draft stores
+    draft_cache.commit(draft_id, script)
     return draft_id, script
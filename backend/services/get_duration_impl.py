@@ -1,13 +1,28 @@
 import subprocess
 import json
 import time
+from infra.media_probe import probe_media
+from infra.single_flight import single_flight
+from infra.url_health import UrlUnavailableError, url_health
 
 def get_video_duration(video_url):
     """
     Get video duration with timeout retry support.
+    Timeouts and unexpected errors are retried; an ffprobe error is final (run_ffprobe has
+    already recorded the URL as failed), and so is a probe result without any duration.
+    Concurrent calls for the same URL share a single probe; URLs that failed recently
+    and hosts whose circuit breaker is open fail immediately.
     :param video_url: Video URL
     :return: Video duration (seconds)
     """
+    try:
+        url_health.check(video_url)
+    except UrlUnavailableError as e:
+        print(f"Skipping duration probe: {e}")
+        return {"success": False, "output": 0, "error": str(e)}
+    return single_flight.do(("duration", video_url), _get_video_duration, video_url)
+
+def _get_video_duration(video_url):
     
     # Define retry count and wait time for each retry
     max_retries = 3
@@ -19,23 +34,8 @@ def get_video_duration(video_url):
         result = {"success": False, "output": 0, "error": None} # Reset result before each retry
         
         try:
-            command = [
-                'ffprobe',
-                '-v', 'error',
-                '-show_entries', 'stream=duration',
-                '-show_entries', 'format=duration',
-                '-print_format', 'json',
-                video_url
-            ]
-            
-            # Use subprocess.run for more flexible handling of timeout and output
-            process = subprocess.run(command, 
-                                     capture_output=True, 
-                                     text=True, # Auto decode to text
-                                     timeout=timeout_seconds, # Use variable to set timeout
-                                     check=True) # Raise CalledProcessError if non-zero exit code
-
-            info = json.loads(process.stdout)
+            # Read through the persistent probe cache, ffprobe only runs on a miss
+            info = probe_media(video_url, timeout=timeout_seconds)
             
             # Prioritize getting duration from streams because it's more accurate
             media_streams = [s for s in info.get('streams', []) if 'duration' in s]
@@ -52,20 +52,26 @@ def get_video_duration(video_url):
             else:
                 result["error"] = "Audio/video duration information not found."
             
-            # If duration is successfully obtained, return result directly without retrying
+            # The probe result is final either way (and cached), so there is nothing to retry
             if result["success"]:
                 print(f"Successfully obtained duration: {result['output']:.2f} seconds")
-                return result
+            return result
 
         except subprocess.TimeoutExpired:
             result["error"] = f"Getting video duration timed out (exceeded {timeout_seconds} seconds)."
             print(f"Attempt {attempt + 1} timed out.")
         except subprocess.CalledProcessError as e:
-            result["error"] = f"Error executing ffprobe command (exit code {e.returncode}): {e.stderr.strip()}"
-            print(f"Attempt {attempt + 1} failed. Error: {e.stderr.strip()}")
+            output = (e.output or b"").decode('utf-8', errors='replace').strip()
+            result["error"] = f"Error executing ffprobe command (exit code {e.returncode}): {output}"
+            print(f"Attempt {attempt + 1} failed. Error: {output}")
+            return result # run_ffprobe has negative-cached the URL, a retry would be refused
+        except UrlUnavailableError as e:
+            result["error"] = str(e)
+            return result
         except json.JSONDecodeError as e:
             result["error"] = f"Error parsing JSON data: {e}"
             print(f"Attempt {attempt + 1} failed. JSON parsing error: {e}")
+            return result
         except FileNotFoundError:
             result["error"] = "ffprobe command not found. Please ensure FFmpeg is installed and in system PATH."
             print("Error: ffprobe command not found, please check installation.")
@@ -94,6 +100,12 @@ def get_video_duration(video_url):
         if not result["success"] and attempt < max_retries - 1:
             print(f"Waiting {retry_delay_seconds} seconds before retrying...")
             time.sleep(retry_delay_seconds)
+            try:
+                # The host may have been marked as failing meanwhile
+                url_health.check(video_url)
+            except UrlUnavailableError as e:
+                result["error"] = str(e)
+                return result
         elif not result["success"] and attempt == max_retries - 1:
             print(f"Maximum retry count {max_retries} reached, both local and remote services unable to get duration.")
             
@@ -3,20 +3,27 @@ import re
 import domain.pyJianYingDraft as draft
 import shutil
 from infra.util import zip_draft, is_windows_path
-from infra.oss import upload_to_oss
-from typing import Dict, Literal
-from infra.cache_service import draft_cache, get_task_status, update_tasks_cache, update_task_field, increment_task_field, update_task_fields, create_task
-from infra.downloader import download_audio, download_file, download_image, download_video
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import imageio.v2 as imageio
-import subprocess
+from infra.template_cache import template_cache
+from infra.oss import oss_uploader, upload_to_oss
+from typing import Any, Dict, Literal, Optional
+from infra.cache_service import draft_cache, get_task_status, create_task
+from infra.task_progress import task_progress
+from infra.draft_lock import draft_locks
+from infra.job_queue import JobCancelledError, JobPriority, raise_if_cancelled, save_job_queue
+from infra.save_manifest import content_hash, file_state, save_manifests
+from infra.downloader import iter_remote
+from infra.asset_store import fetch_asset
+from infra.transfer_engine import transfer_engine
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 import json
+from infra.media_probe import MediaInfo, StreamProbe, first_stream, image_size, probe_media
 from .get_duration_impl import get_video_duration
 import uuid
 import threading
 from collections import OrderedDict
 import time
 import requests # Import requests for making HTTP calls
+import oss2
 import logging
 # Import configuration
 from config import settings
@@ -27,7 +34,10 @@ from infra.logger import logger
 # logger = logging.getLogger('flask_video_generator')  
 
 # Define task status enumeration type
-TaskStatus = Literal["initialized", "processing", "completed", "failed", "not_found"]
+TaskStatus = Literal["initialized", "queued", "processing", "completed", "failed", "cancelled", "not_found"]
+
+# Shared by all drafts: bounds the number of concurrent media probes (ffprobe processes, image reads)
+_probe_executor = ThreadPoolExecutor(max_workers=settings.PROBE_WORKERS, thread_name_prefix="media-probe")
 
 def build_asset_path(draft_folder: str, draft_id: str, asset_type: str, material_name: str) -> str:
     """
@@ -51,238 +61,485 @@ def build_asset_path(draft_folder: str, draft_id: str, asset_type: str, material
     return draft_real_path
 
 def save_draft_background(draft_id, draft_folder, task_id):
-    """Background save draft to OSS"""
+    """
+    Background save draft to OSS.
+
+    The draft lock is only held briefly: the materials are collected under the read lock,
+    downloads/probes/uploads run without any lock, and the probe results are applied to the
+    draft under the write lock (see _apply_save_results).
+    """
+    future_to_asset = {}
     try:
-        # Get draft information from global cache
-        if draft_id not in DRAFT_CACHE:
-            task_status = {
-                "status": "failed",
-                "message": f"Draft {draft_id} does not exist in cache",
-                "progress": 0,
-                "completed_files": 0,
-                "total_files": 0,
-                "draft_url": ""
-            }
-            update_tasks_cache(task_id, task_status)  # Use new cache management function
-            logger.error(f"Draft {draft_id} does not exist in cache, task {task_id} failed.")
+        raise_if_cancelled()
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        draft_path = os.path.join(current_dir, draft_id)
+
+        # Collect the assets to transfer from a consistent view of the draft
+        with draft_locks.read(draft_id):
+            script = draft_cache.get(draft_id)
+            assets = _collect_assets(script, draft_path) if script is not None else None
+        if assets is None:
+            _fail_missing_draft(draft_id, task_id)
             return
-            
-        script = draft_cache.get(draft_id)
         logger.info(f"Successfully retrieved draft {draft_id} from cache.")
         
         # Update task status to processing
-        task_status = {
-            "status": "processing",
-            "message": "Preparing draft files",
-            "progress": 0,
-            "completed_files": 0,
-            "total_files": 0,
-            "draft_url": ""
-        }
-        update_tasks_cache(task_id, task_status)  # Use new cache management function
+        task_progress.update(task_id, force=True,
+                             status="processing",
+                             message="Preparing draft files",
+                             progress=0,
+                             completed_files=0,
+                             total_files=0,
+                             draft_url="")
         logger.info(f"Task {task_id} status updated to 'processing': Preparing draft files.")
         
-        # Delete possibly existing draft_id folder
-        if os.path.exists(draft_id):
-            logger.warning(f"Deleting existing draft folder (current working directory): {draft_id}")
-            shutil.rmtree(draft_id)
-
+        raise_if_cancelled()
         logger.info(f"Starting to save draft: {draft_id}")
-        # Save draft
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        draft_folder_for_duplicate = draft.Draft_folder(current_dir)
         # Choose different template directory based on configuration
         template_dir = "template" if settings.IS_CAPCUT_ENV else "template_jianying"
-        draft_folder_for_duplicate.duplicate_as_template(template_dir, draft_id)
-        
-        # Update task status
-        update_task_field(task_id, "message", "Updating media file metadata")
-        update_task_field(task_id, "progress", 5)
-        logger.info(f"Task {task_id} progress 5%: Updating media file metadata.")
-        
-        update_media_metadata(script, task_id)
-        
-        download_tasks = []
-        
-        audios = script.materials.audios
-        if audios:
-            for audio in audios:
-                remote_url = audio.remote_url
-                material_name = audio.material_name
-                # Use helper function to build path
-                if draft_folder:
-                    audio.replace_path = build_asset_path(draft_folder, draft_id, "audio", material_name)
-                if not remote_url:
-                    logger.warning(f"Audio file {material_name} has no remote_url, skipping download.")
-                    continue
-                
-                # Add audio download task
-                download_tasks.append({
-                    'type': 'audio',
-                    'func': download_file,
-                    'args': (remote_url, os.path.join(current_dir, f"{draft_id}/assets/audio/{material_name}")),
-                    'material': audio
-                })
-        
-        # Collect video and image download tasks
-        videos = script.materials.videos
-        if videos:
-            for video in videos:
-                remote_url = video.remote_url
-                material_name = video.material_name
-                
-                if video.material_type == 'photo':
-                    # Use helper function to build path
-                    if draft_folder:
-                        video.replace_path = build_asset_path(draft_folder, draft_id, "image", material_name)
-                    if not remote_url:
-                        logger.warning(f"Image file {material_name} has no remote_url, skipping download.")
-                        continue
-                    
-                    # Add image download task
-                    download_tasks.append({
-                        'type': 'image',
-                        'func': download_file,
-                        'args': (remote_url, os.path.join(current_dir, f"{draft_id}/assets/image/{material_name}")),
-                        'material': video
-                    })
-                
-                elif video.material_type == 'video':
-                    # Use helper function to build path
-                    if draft_folder:
-                        video.replace_path = build_asset_path(draft_folder, draft_id, "video", material_name)
-                    if not remote_url:
-                        logger.warning(f"Video file {material_name} has no remote_url, skipping download.")
-                        continue
-                    
-                    # Add video download task
-                    download_tasks.append({
-                        'type': 'video',
-                        'func': download_file,
-                        'args': (remote_url, os.path.join(current_dir, f"{draft_id}/assets/video/{material_name}")),
-                        'material': video
-                    })
-
-        update_task_field(task_id, "message", f"Collected {len(download_tasks)} download tasks in total")
-        update_task_field(task_id, "progress", 10)
-        logger.info(f"Task {task_id} progress 10%: Collected {len(download_tasks)} download tasks in total.")
-
-        # Execute all download tasks concurrently
-        downloaded_paths = []
+        template_path = os.path.join(os.path.dirname(current_dir), template_dir)
+
+        # Streaming uploads send the assets straight to OSS without a local draft folder
+        streaming = settings.IS_UPLOAD_DRAFT and settings.DRAFT_UPLOAD_MODE == "stream"
+        if streaming:
+            streamed = _stream_draft_to_oss(draft_id, draft_folder, task_id, template_path, assets, future_to_asset)
+            if streamed is None:
+                return
+            draft_url, failed_assets = streamed
+            if failed_assets:
+                # The draft is usable but incomplete; manifest.json lists the assets that made it
+                task_progress.update(task_id,
+                                     status="failed",
+                                     progress=100,
+                                     message=f"Draft uploaded, but {failed_assets}/{len(assets)} assets failed to upload")
+                logger.error(f"Task {task_id} partially failed: {failed_assets}/{len(assets)} assets not uploaded, draft URL: {draft_url}")
+                return draft_url
+            task_progress.update(task_id, status="completed", progress=100, message="Draft creation completed")
+            logger.info(f"Task {task_id} completed, draft URL: {draft_url}")
+            return draft_url
+
+        # An incremental save reuses the folder of the previous save and only handles what changed
+        manifest = save_manifests.load(draft_id) if settings.SAVE_INCREMENTAL else {}
+        if manifest.get("template") != template_dir:
+            manifest = {}
+        if not manifest or not os.path.isdir(draft_path):
+            # Delete possibly existing draft_id folder
+            if os.path.exists(draft_path):
+                logger.warning(f"Deleting existing draft folder: {draft_path}")
+                shutil.rmtree(draft_path)
+            # Written from the cached template; draft_info.json is written below from the script
+            template_cache.materialize(template_path, draft_path, exclude=["draft_info.json"])
+            if manifest:
+                logger.info(f"Draft folder {draft_path} was removed after the previous upload, relinking its materials.")
+        else:
+            logger.info(f"Draft folder {draft_path} exists from a previous save, saving incrementally.")
+        previous_materials = manifest.get("materials", {})
+        materials_manifest = {}  # relative path -> entry, for the materials of this save
+        # (kind, material_id, probe result or None, probe exception or None), applied to the draft at the end
+        results = []
+
+        # Materials unchanged since the previous save keep their file and recorded probe result;
+        # those whose file is gone keep the probe result if the asset store links back the same file
+        changed_assets = []
+        for kind, material_id, material_name, remote_url, local_path in assets:
+            relative_path = os.path.relpath(local_path, draft_path)
+            entry = previous_materials.get(relative_path)
+            if _is_unchanged(entry, remote_url, local_path):
+                results.append((kind, material_id, entry["probe"], None))
+                materials_manifest[relative_path] = entry
+            else:
+                known = entry if entry and entry.get("url") == remote_url and entry.get("probe") else None
+                changed_assets.append((kind, material_id, material_name, remote_url, local_path, known))
+        # Files of materials that were removed from the draft
+        current_paths = {os.path.relpath(asset[4], draft_path) for asset in assets}
+        removed_files = [os.path.join(draft_path, relative_path) for relative_path in previous_materials
+                         if relative_path not in current_paths]
+        for path in removed_files:
+            if os.path.exists(path):
+                os.remove(path)
+        unchanged_files = len(assets) - len(changed_assets)
+        assets = changed_assets
+
+        task_progress.update(task_id, message=f"Collected {len(assets)} download tasks in total", progress=10)
+        logger.info(f"Task {task_id} progress 10%: Collected {len(assets)} download tasks in total"
+                    f" ({unchanged_files} unchanged, {len(removed_files)} removed).")
+
+        downloaded_files = 0
+        relinked_files = 0
         completed_files = 0
-        if download_tasks:
-            logger.info(f"Starting concurrent download of {len(download_tasks)} files...")
-            
-            # Use thread pool for concurrent downloads, maximum concurrency of 16
-            with ThreadPoolExecutor(max_workers=16) as executor:
-                # Submit all download tasks
-                future_to_task = {
-                    executor.submit(task['func'], *task['args']): task 
-                    for task in download_tasks
-                }
-                
-                # Wait for all tasks to complete
-                for future in as_completed(future_to_task):
-                    task = future_to_task[future]
-                    try:
-                        local_path = future.result()
-                        downloaded_paths.append(local_path)
-                        
-                        # Update task status - only update completed files count
-                        completed_files += 1
-                        update_task_field(task_id, "completed_files", completed_files)
-                        task_status = get_task_status(task_id)
-                        completed = task_status["completed_files"]
-                        total = len(download_tasks)
-                        update_task_field(task_id, "total_files", total)
-                        # Download part accounts for 60% of the total progress
-                        download_progress = 10 + int((completed / total) * 60)
-                        update_task_field(task_id, "progress", download_progress)
-                        update_task_field(task_id, "message", f"Downloaded {completed}/{total} files")
-                        
-                        logger.info(f"Task {task_id}: Successfully downloaded {task['type']} file, progress {download_progress}.")
-                    except Exception as e:
-                        logger.error(f"Task {task_id}: Download {task['type']} file failed: {str(e)}", exc_info=True)
-                        # Continue processing other files, don't interrupt the entire process
-            
-            logger.info(f"Task {task_id}: Concurrent download completed, downloaded {len(downloaded_paths)} files in total.")
-        
+        if assets:
+            logger.info(f"Starting concurrent download and probing of {len(assets)} files...")
+
+            # Downloads share the process-wide transfer engine (global and per-host connection limits,
+            # round-robin between save tasks)
+            for asset in assets:
+                kind, _, _, remote_url, local_path, known = asset
+                future = transfer_engine.submit(_fetch_and_probe, remote_url, kind, local_path, known,
+                                                group=task_id, priority="batch")
+                future_to_asset[future] = asset
+
+            # Results are collected as they arrive and applied to the draft once all are in
+            for future in as_completed(future_to_asset):
+                raise_if_cancelled()
+                kind, material_id, material_name, remote_url, local_path, _ = future_to_asset[future]
+                try:
+                    downloaded, probe, probe_error, relinked = future.result()
+                except Exception as e:
+                    logger.error(f"Task {task_id}: Download {kind} file failed: {str(e)}", exc_info=True)
+                    downloaded, probe, probe_error, relinked = False, None, e, False
+                results.append((kind, material_id, probe, probe_error))
+                downloaded_files += bool(downloaded)
+                relinked_files += relinked
+                if downloaded and probe is not None and not probe.get("error"):
+                    materials_manifest[os.path.relpath(local_path, draft_path)] = {
+                        "url": remote_url,
+                        "file": file_state(local_path),
+                        "verified_at": time.time(),
+                        "probe": probe
+                    }
+
+                # Update task status - coalesced by the progress tracker
+                completed_files += 1
+                total = len(assets)
+                # Download and probe part accounts for 60% of the total progress
+                download_progress = 10 + int((completed_files / total) * 60)
+                task_progress.update(task_id,
+                                     completed_files=completed_files,
+                                     total_files=total,
+                                     progress=download_progress,
+                                     message=f"Downloaded {completed_files}/{total} files")
+                logger.info(f"Task {task_id}: Processed {kind} file {material_name}, progress {download_progress}.")
+
+            logger.info(f"Task {task_id}: Concurrent download completed, downloaded {downloaded_files} files in total.")
+
+        # Apply the probe results, fit segments, resolve conflicts, update duration and keyframes
+        raise_if_cancelled()
+        draft_info = _apply_save_results(draft_id, draft_folder, results)
+        if draft_info is None:
+            _fail_missing_draft(draft_id, task_id)
+            return
+
         # Update task status - Start saving draft information
-        update_task_field(task_id, "progress", 70)
-        update_task_field(task_id, "message", "Saving draft information")
+        task_progress.update(task_id, progress=70, message="Saving draft information")
         logger.info(f"Task {task_id} progress 70%: Saving draft information.")
         
-        script.dump(os.path.join(current_dir, f"{draft_id}/draft_info.json"))
-        logger.info(f"Draft information has been saved to {os.path.join(current_dir, draft_id)}/draft_info.json.")
+        draft_info_hash = content_hash(draft_info)
+        draft_info_path = os.path.join(draft_path, "draft_info.json")
+        # Materials linked back unchanged from the asset store do not count as changes
+        draft_changed = bool(len(assets) - relinked_files or removed_files) or draft_info_hash != manifest.get("draft_info_hash")
+        if draft_info_hash != manifest.get("draft_info_hash") or not os.path.exists(draft_info_path):
+            with open(draft_info_path, "w", encoding="utf-8") as f:
+                f.write(draft_info)
+            logger.info(f"Draft information has been saved to {draft_info_path}.")
+        else:
+            logger.info(f"Draft information in {draft_info_path} is unchanged.")
 
         draft_url = ""
         # Only upload draft information when IS_UPLOAD_DRAFT is True
-        if IS_UPLOAD_DRAFT:
+        if settings.IS_UPLOAD_DRAFT and not draft_changed and manifest.get("draft_url"):
+            # Nothing changed since the last upload
+            draft_url = manifest["draft_url"]
+            task_progress.update(task_id, draft_url=draft_url)
+            logger.info(f"Draft {draft_id} is unchanged since its last upload, reusing {draft_url}")
+        elif settings.IS_UPLOAD_DRAFT:
             # Update task status - Start compressing draft
-            update_task_field(task_id, "progress", 80)
-            update_task_field(task_id, "message", "Compressing draft files")
+            raise_if_cancelled()
+            task_progress.update(task_id, progress=80, message="Compressing draft files")
             logger.info(f"Task {task_id} progress 80%: Compressing draft files.")
             
             # Compress the entire draft directory
-            zip_path = zip_draft(draft_id)
+            zip_path = zip_draft(draft_id, draft_path)
             logger.info(f"Draft directory {os.path.join(current_dir, draft_id)} has been compressed to {zip_path}.")
             
             # Update task status - Start uploading to OSS
-            update_task_field(task_id, "progress", 90)
-            update_task_field(task_id, "message", "Uploading to cloud storage")
+            raise_if_cancelled()
+            task_progress.update(task_id, progress=90, message="Uploading to cloud storage")
             logger.info(f"Task {task_id} progress 90%: Uploading to cloud storage.")
             
             # Upload to OSS
-            draft_url = upload_to_oss(zip_path)
+            draft_url = upload_to_oss(zip_path, progress_callback=_upload_progress(task_id))
             logger.info(f"Draft archive has been uploaded to OSS, URL: {draft_url}")
-            update_task_field(task_id, "draft_url", draft_url)
-
-            # Clean up temporary files
-            if os.path.exists(os.path.join(current_dir, draft_id)):
-                shutil.rmtree(os.path.join(current_dir, draft_id))
-                logger.info(f"Cleaned up temporary draft folder: {os.path.join(current_dir, draft_id)}")
-
+            task_progress.update(task_id, draft_url=draft_url)
+
+        # The uploaded archive is the result: no staged media are kept. An incremental save keeps only
+        # its manifest and links the materials back from the asset store next time.
+        if settings.IS_UPLOAD_DRAFT and os.path.exists(draft_path):
+            shutil.rmtree(draft_path)
+            logger.info(f"Cleaned up temporary draft folder: {draft_path}")
+
+        if settings.SAVE_INCREMENTAL:
+            save_manifests.save(draft_id, {
+                "template": template_dir,
+                "materials": materials_manifest,
+                "draft_info_hash": draft_info_hash,
+                "draft_url": draft_url
+            })
     
         # Update task status - Completed
-        update_task_field(task_id, "status", "completed")
-        update_task_field(task_id, "progress", 100)
-        update_task_field(task_id, "message", "Draft creation completed")
+        task_progress.update(task_id, status="completed", progress=100, message="Draft creation completed")
         logger.info(f"Task {task_id} completed, draft URL: {draft_url}")
         return draft_url
 
+    except JobCancelledError:
+        # Transfers not started yet are dropped; running ones finish into the (abandoned) draft folder
+        for future in future_to_asset:
+            future.cancel()
+        # Dropped by task_progress when a newer save superseded this one
+        task_progress.update(task_id, status="cancelled", message="Draft save cancelled")
+        logger.info(f"Saving draft {draft_id} task {task_id} cancelled.")
+        return ""
+
     except Exception as e:
         # Update task status - Failed
-        update_task_fields(task_id, 
-                          status="failed",
-                          message=f"Failed to save draft: {str(e)}")
+        task_progress.update(task_id,
+                             status="failed",
+                             message=f"Failed to save draft: {str(e)}")
         logger.error(f"Saving draft {draft_id} task {task_id} failed: {str(e)}", exc_info=True)
         return ""
 
+def _fail_missing_draft(draft_id: str, task_id: str) -> None:
+    task_progress.update(task_id,
+                         status="failed",
+                         message=f"Draft {draft_id} does not exist in cache",
+                         progress=0,
+                         completed_files=0,
+                         total_files=0,
+                         draft_url="")
+    logger.error(f"Draft {draft_id} does not exist in cache, task {task_id} failed.")
+
+def _collect_assets(script, draft_path: str):
+    """
+    Assets of the draft to transfer: (kind, material_id, material_name, remote_url, local_path).
+    Only reads the draft, so it runs under the read lock.
+    """
+    # Every asset runs through its own pipeline: fetch -> probe the local copy.
+    # Probing overlaps with the downloads of other assets and each file crosses the network once.
+    assets = []
+    for audio in script.materials.audios:
+        if not audio.remote_url:
+            logger.warning(f"Audio file {audio.material_name} has no remote_url, skipping download.")
+            continue
+        assets.append(("audio", audio.material_id, audio.material_name, audio.remote_url,
+                       os.path.join(draft_path, "assets", "audio", audio.material_name)))
+    # Collect video and image assets
+    for video in script.materials.videos:
+        kind = _VIDEO_KINDS.get(video.material_type)
+        if kind is None:
+            continue
+        if not video.remote_url:
+            logger.warning(f"{kind.capitalize()} file {video.material_name} has no remote_url, skipping download.")
+            continue
+        assets.append((kind, video.material_id, video.material_name, video.remote_url,
+                       os.path.join(draft_path, "assets", kind, video.material_name)))
+    return assets
+
+# Video_material.material_type -> asset kind (and folder under assets/)
+_VIDEO_KINDS = {"photo": "image", "video": "video"}
+
+def _apply_save_results(draft_id: str, draft_folder, results):
+    """
+    Apply stage of a save, under the draft's write lock: set the probed metadata (and the
+    replace_path under draft_folder) on the draft's current materials, fit segments, resolve
+    conflicts, commit the draft and return its draft_info JSON.
+    Materials removed from the draft while it was being saved are skipped; returns None
+    when the draft itself no longer exists.
+    """
+    with draft_locks.write(draft_id):
+        script = draft_cache.get(draft_id)
+        if script is None:
+            return None
+        materials = {material.material_id: material for material in script.materials.audios + script.materials.videos}
+        if draft_folder:
+            # Use helper function to build path
+            for audio in script.materials.audios:
+                audio.replace_path = build_asset_path(draft_folder, draft_id, "audio", audio.material_name)
+            for video in script.materials.videos:
+                kind = _VIDEO_KINDS.get(video.material_type)
+                if kind is not None:
+                    video.replace_path = build_asset_path(draft_folder, draft_id, kind, video.material_name)
+        durations: Dict[str, int] = {}
+        for kind, material_id, probe, probe_error in results:
+            material = materials.get(material_id)
+            if material is None:
+                logger.info(f"Material {material_id} was removed from draft {draft_id} during the save, skipping its metadata.")
+            elif probe is not None:
+                _apply_probe(kind, material, probe, durations)
+            else:
+                _apply_probe_error(kind, material, probe_error)
+        _finalize_metadata(script, durations)
+        draft_info = script.dumps()
+        draft_cache.commit(draft_id, script)
+    return draft_info
+
+def _stream_draft_to_oss(draft_id: str, draft_folder, task_id: str, template_path: str, assets, future_to_asset):
+    """
+    Upload the draft to OSS under "<draft_id>/" without staging it on disk: every asset is streamed
+    from its URL into its object (and probed from the bytes on the way), then draft_info.json, the
+    template files and a manifest.json listing all objects are written next to them.
+    Returns (signed URL of the manifest, number of assets that failed to upload), None if the
+    draft no longer exists.
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    draft_path = os.path.join(current_dir, draft_id)
+    results = []
+    uploaded = {}  # relative path -> {"url": source URL, "size": bytes}
+
+    task_progress.update(task_id, message=f"Collected {len(assets)} upload tasks in total", progress=10)
+    for asset in assets:
+        kind, _, _, remote_url, local_path = asset
+        object_name = f"{draft_id}/{os.path.relpath(local_path, draft_path)}"
+        future = transfer_engine.submit(_stream_and_probe, remote_url, kind, object_name, group=task_id, priority="batch")
+        future_to_asset[future] = asset
+    completed_files = 0
+    for future in as_completed(future_to_asset):
+        raise_if_cancelled()
+        kind, material_id, material_name, remote_url, local_path = future_to_asset[future]
+        relative_path = os.path.relpath(local_path, draft_path).replace(os.sep, "/")
+        try:
+            size, probe, probe_error = future.result()
+            uploaded[relative_path] = {"url": remote_url, "size": size}
+        except Exception as e:
+            logger.error(f"Task {task_id}: Streaming {kind} file {remote_url} to OSS failed: {str(e)}", exc_info=True)
+            probe, probe_error = None, e
+        results.append((kind, material_id, probe, probe_error))
+        completed_files += 1
+        task_progress.update(task_id,
+                             completed_files=completed_files,
+                             total_files=len(assets),
+                             progress=10 + int((completed_files / len(assets)) * 60),
+                             message=f"Uploaded {completed_files}/{len(assets)} files")
+
+    raise_if_cancelled()
+    draft_info = _apply_save_results(draft_id, draft_folder, results)
+    if draft_info is None:
+        _fail_missing_draft(draft_id, task_id)
+        return None
+
+    task_progress.update(task_id, progress=80, message="Uploading draft information")
+    oss_uploader.put_bytes(draft_info.encode("utf-8"), f"{draft_id}/draft_info.json")
+    files = ["draft_info.json"]
+    for relative_path, data in template_cache.files(template_path).items():
+        name = relative_path.replace(os.sep, "/")
+        if name != "draft_info.json":
+            oss_uploader.put_bytes(data, f"{draft_id}/{name}")
+            files.append(name)
+    manifest = {
+        "draft_id": draft_id,
+        "files": files + sorted(uploaded),
+        "assets": uploaded,
+        "failed_assets": len(assets) - len(uploaded)
+    }
+    oss_uploader.put_bytes(json.dumps(manifest, ensure_ascii=False).encode("utf-8"), f"{draft_id}/manifest.json")
+    draft_url = oss_uploader.sign_url(f"{draft_id}/manifest.json")
+    task_progress.update(task_id, draft_url=draft_url)
+    logger.info(f"Draft {draft_id} streamed to OSS: {len(uploaded)}/{len(assets)} assets, manifest {draft_url}")
+    return draft_url, manifest["failed_assets"]
+
+def _stream_and_probe(remote_url: str, kind: str, object_name: str, max_retries: int = 3):
+    """
+    Pipeline of one asset in streaming mode: copy it from its URL into OSS, probing the bytes as
+    they pass. Media the bytes do not answer for (e.g. non-MP4 containers) are probed through the
+    uploaded object rather than the source URL.
+    Returns (uploaded bytes, probe result or None, probe exception or None); raises when the upload fails.
+    """
+    for attempt in range(max_retries):
+        stream_probe = StreamProbe(image=kind == "image")
+        try:
+            size = oss_uploader.upload_stream(stream_probe.wrap(iter_remote(remote_url)), object_name)
+            break
+        except (requests.RequestException, oss2.exceptions.RequestError) as e:
+            # A broken stream cannot be resumed; the next attempt starts a new upload
+            if attempt == max_retries - 1 or isinstance(e, requests.HTTPError):
+                raise
+            logger.warning(f"Streaming {remote_url} to OSS failed ({e}), retrying")
+            time.sleep(1)
+    try:
+        if stream_probe.image_size is not None:
+            width, height = stream_probe.image_size
+            return size, {"width": width, "height": height}, None
+        if stream_probe.info is not None:
+            return size, _PROBES[kind](remote_url, info=stream_probe.info), None
+        return size, _PROBES[kind](oss_uploader.sign_url(object_name)), None
+    except Exception as e:
+        return size, None, e
+
+def _upload_progress(task_id: str):
+    """OSS progress callback reporting the upload as progress 90-99 of the task"""
+    def callback(uploaded: int, total) -> None:
+        if total:
+            task_progress.update(task_id,
+                                 progress=90 + int(uploaded * 9 / total),
+                                 uploaded_bytes=uploaded,
+                                 total_bytes=total,
+                                 message=f"Uploading to cloud storage ({uploaded / 1024 / 1024:.1f}/{total / 1024 / 1024:.1f}MB)")
+    return callback
+
+def _is_unchanged(entry, remote_url: str, local_path: str) -> bool:
+    """Whether a material recorded in the save manifest can be reused without fetching or probing it again"""
+    if not entry or entry.get("url") != remote_url or not entry.get("probe"):
+        return False
+    if entry.get("file") != file_state(local_path):
+        return False
+    # Remote content is checked again (cheaply, through the asset store) once the verification is stale
+    return time.time() - entry.get("verified_at", 0) < settings.ASSET_STORE_REVALIDATE_AFTER
+
+def _fetch_and_probe(remote_url: str, kind: str, local_path: str, known=None):
+    """
+    Pipeline of one asset: download it, then probe the downloaded file.
+    `known` is the asset's entry in the previous save manifest, if its file is gone: when the
+    asset store links back the very same file, the recorded probe result is reused.
+    Returns (downloaded, probe result or None, probe exception or None, relinked). A failed download is
+    not probed: it has just marked the URL as unavailable, so a probe of the URL would fail too.
+    """
+    if not fetch_asset(remote_url, local_path):
+        return False, None, RuntimeError(f"Failed to download {remote_url}"), False
+    if known is not None and known.get("file") == file_state(local_path):
+        return True, known["probe"], None, True
+    try:
+        return True, _PROBES[kind](local_path), None, False
+    except Exception as e:
+        return True, None, e, False
+
 def query_task_status(task_id: str):
-    return get_task_status(task_id)
+    """Task status, plus the number of saves ahead of it while it is still queued"""
+    task_status = get_task_status(task_id)
+    position = save_job_queue.position(task_id)
+    if task_status is not None and position is not None:
+        return {**task_status, "queue_position": position}
+    return task_status
+
+# Serializes the check-then-submit of save_draft_impl for the same draft
+_submit_lock = threading.Lock()
 
-def save_draft_impl(draft_id: str, draft_folder: str = None) -> Dict[str, str]:
-    """Start a background task to save the draft"""
-    logger.info(f"Received save draft request: draft_id={draft_id}, draft_folder={draft_folder}")
+def save_draft_impl(draft_id: str, draft_folder: str = None, priority: JobPriority = "normal") -> Dict[str, str]:
+    """
+    Queue a background task to save the draft and return its task id right away.
+    The task id is the draft id. Saving a draft whose save is still queued with the same
+    arguments keeps the queued one; otherwise a newer save supersedes the older one:
+    the queued or running older save is cancelled and the new one is queued.
+    """
+    logger.info(f"Received save draft request: draft_id={draft_id}, draft_folder={draft_folder}, priority={priority}")
     try:
-        # Generate a unique task ID
         task_id = draft_id
-        create_task(task_id)
-        logger.info(f"Task {task_id} has been created.")
-        
-        # Changed to synchronous execution
+        with _submit_lock:
+            queued = save_job_queue.get_queued(task_id)
+            if queued is None or queued.args != (draft_id, draft_folder, task_id) or queued.priority != priority:
+                # The superseded save can no longer report; drop what it has buffered
+                save_job_queue.cancel(task_id, superseded=True)
+                task_progress.discard(task_id)
+                create_task(task_id)
+                task_progress.update(task_id, force=True, status="queued", message="Waiting for a save worker")
+                save_job_queue.submit(task_id, save_draft_background, draft_id, draft_folder, task_id,
+                                      priority=priority, group=draft_id)
+                logger.info(f"Task {task_id} has been queued.")
+            position = save_job_queue.position(task_id)
         return {
             "success": True,
-            "draft_url": save_draft_background(draft_id, draft_folder, task_id)
-            }
+            "task_id": task_id,
+            "status": "queued" if position is not None else "processing",
+            "queue_position": position
+        }
 
-        # # Start a background thread to execute the task
-        # thread = threading.Thread(
-        #     target=save_draft_background,
-        #     args=(draft_id, draft_folder, task_id)
-        # )
-        # thread.start()
-        
     except Exception as e:
         logger.error(f"Failed to start save draft task {draft_id}: {str(e)}", exc_info=True)
         return {
@@ -290,231 +547,232 @@ def save_draft_impl(draft_id: str, draft_folder: str = None) -> Dict[str, str]:
             "error": str(e)
         }
 
+def cancel_save_draft(task_id: str) -> Dict[str, Any]:
+    """Cancel a queued or running save task"""
+    with _submit_lock:
+        queued = save_job_queue.get_queued(task_id)
+        if not save_job_queue.cancel(task_id):
+            return {"success": False, "error": f"Task {task_id} is not queued or running"}
+    if queued is not None and save_job_queue.get_running(task_id) is None:
+        # Never started, so no worker reports the cancellation
+        task_progress.update(task_id, status="cancelled", message="Draft save cancelled")
+    else:
+        task_progress.update(task_id, message="Cancelling draft save")
+    logger.info(f"Task {task_id} cancellation requested.")
+    return {"success": True, "task_id": task_id}
+
+def _probe_audio(media: str, info: Optional[MediaInfo] = None) -> Dict:
+    """
+    Probe an audio file (local path or URL): whether it contains video tracks, and its duration.
+    `info` is probe_media() output already read from the file's bytes, if any.
+    """
+    probe = {"has_video": False, "duration": None, "error": None}
+    try:
+        if first_stream(info or probe_media(media, timeout=settings.PROBE_TIMEOUT), "video"):
+            probe["has_video"] = True
+            return probe
+    except Exception as e:
+        logger.error(f"Error occurred while checking if audio {media} contains video streams: {str(e)}", exc_info=True)
+
+    if info is not None:
+        probe["duration"] = _info_duration(info)
+        if probe["duration"] is None:
+            probe["error"] = "Audio/video duration information not found."
+        return probe
+    # Served from the probe cache when the probe above succeeded
+    duration_result = get_video_duration(media)
+    if duration_result["success"]:
+        probe["duration"] = duration_result["output"]
+    else:
+        probe["error"] = duration_result["error"]
+    return probe
+
+def _probe_image(media: str) -> Dict:
+    """Probe an image file (local path or URL): width and height"""
+    width, height = image_size(media, timeout=settings.PROBE_TIMEOUT)
+    return {"width": width, "height": height}
+
+def _probe_video(media: str, info: Optional[MediaInfo] = None) -> Dict:
+    """
+    Probe a video file (local path or URL): width, height and duration (None where unknown).
+    `info` is probe_media() output already read from the file's bytes, if any.
+    """
+    probe = {"width": None, "height": None, "duration": None, "error": None}
+    try:
+        if info is None:
+            info = probe_media(media, timeout=settings.PROBE_TIMEOUT)
+        stream = first_stream(info, "video")
+        if stream:
+            probe["width"] = int(stream.get('width', 0))
+            probe["height"] = int(stream.get('height', 0))
+            # Prefer stream duration, if not available use format duration
+            probe["duration"] = float(stream.get('duration') or info['format'].get('duration', '0'))
+        else:
+            probe["error"] = "Unable to get video stream information."
+    except Exception as e:
+        probe["error"] = str(e)
+        logger.error(f"Error occurred while getting video {media} information: {str(e)}, using default values 1920x1080.", exc_info=True)
+        # Try to get duration separately
+        duration_result = get_video_duration(media)
+        if duration_result["success"]:
+            probe["duration"] = duration_result["output"]
+    return probe
+
+def _info_duration(info: MediaInfo) -> Optional[float]:
+    """Duration in probe_media() output, preferring stream durations like get_video_duration"""
+    for stream in info.get("streams", []):
+        if "duration" in stream:
+            return float(stream["duration"])
+    duration = info.get("format", {}).get("duration")
+    return float(duration) if duration is not None else None
+
+_PROBES = {"audio": _probe_audio, "image": _probe_image, "video": _probe_video}
+
+def _fit_segments_to_duration(script, durations: Dict[str, int]) -> None:
+    """
+    Shorten audio/video segments whose source range runs past the (new) duration of their material.
+    durations maps material_id to the material duration in microseconds.
+    """
+    for track_name, track in script.tracks.items():
+        if track.track_type == draft.Track_type.audio:
+            segment_type, kind = draft.Audio_segment, "audio"
+        elif track.track_type == draft.Track_type.video:
+            segment_type, kind = draft.Video_segment, "video"
+        else:
+            continue
+        for segment in track.segments:
+            if not isinstance(segment, segment_type) or segment.material_id not in durations:
+                continue
+            duration = durations[segment.material_id]
+            # Get current settings
+            current_target = segment.target_timerange
+            current_source = segment.source_timerange
+            speed = segment.speed.speed
+
+            # If the end time of source_timerange exceeds the new duration, adjust it
+            if current_source.end > duration or current_source.end <= 0:
+                # Adjust source_timerange to fit the new duration
+                new_source_duration = duration - current_source.start
+                if new_source_duration <= 0:
+                    logger.warning(f"Warning: {kind.capitalize()} segment {segment.segment_id} start time {current_source.start} exceeds {kind} duration {duration}, will skip this segment.")
+                    continue
+
+                # Update source_timerange
+                segment.source_timerange = draft.Timerange(current_source.start, new_source_duration)
+
+                # Update target_timerange based on new source_timerange and speed
+                new_target_duration = int(new_source_duration / speed)
+                segment.target_timerange = draft.Timerange(current_target.start, new_target_duration)
+
+                logger.info(f"Adjusted {kind} segment {segment.segment_id} timerange to fit the new {kind} duration.")
+
 def update_media_metadata(script, task_id=None):
     """
     Update metadata for all media files in the script (duration, width/height, etc.)
-    
+
+    Materials are probed in parallel on a bounded worker pool (probe stage), then the
+    results are applied to materials and segments in a single pass (apply stage).
+    Each ffprobe run is limited to PROBE_TIMEOUT seconds and the whole probe stage to
+    PROBE_STAGE_BUDGET seconds; materials without a result keep their current values.
+
     :param script: Draft script object
     :param task_id: Optional task ID for updating task status
     :return: None
     """
-    # Process audio file metadata
-    audios = script.materials.audios
-    if not audios:
+    # Probe stage
+    probes = []  # (kind, material, future)
+    for audio in script.materials.audios:
+        if not audio.remote_url:
+            logger.warning(f"Warning: Audio file {audio.material_name} has no remote_url, skipped.")
+            continue
+        probes.append(("audio", audio, _probe_executor.submit(_PROBES["audio"], audio.remote_url)))
+    for video in script.materials.videos:
+        if not video.remote_url:
+            logger.warning(f"Warning: Media file {video.material_name} has no remote_url, skipped.")
+            continue
+        if video.material_type == 'photo':
+            probes.append(("image", video, _probe_executor.submit(_PROBES["image"], video.remote_url)))
+        elif video.material_type == 'video':
+            probes.append(("video", video, _probe_executor.submit(_PROBES["video"], video.remote_url)))
+    if not script.materials.audios:
         logger.info("No audio files found in the draft.")
-    else:
-        for audio in audios:
-            remote_url = audio.remote_url
-            material_name = audio.material_name
-            if not remote_url:
-                logger.warning(f"Warning: Audio file {material_name} has no remote_url, skipped.")
-                continue
-            
-            try:
-                video_command = [
-                    'ffprobe',
-                    '-v', 'error',
-                    '-select_streams', 'v:0',
-                    '-show_entries', 'stream=codec_type',
-                    '-of', 'json',
-                    remote_url
-                ]
-                video_result = subprocess.check_output(video_command, stderr=subprocess.STDOUT)
-                video_result_str = video_result.decode('utf-8')
-                # Find JSON start position (first '{')
-                video_json_start = video_result_str.find('{')
-                if video_json_start != -1:
-                    video_json_str = video_result_str[video_json_start:]
-                    video_info = json.loads(video_json_str)
-                    if 'streams' in video_info and len(video_info['streams']) > 0:
-                        logger.warning(f"Warning: Audio file {material_name} contains video tracks, skipped its metadata update.")
-                        continue
-            except Exception as e:
-                logger.error(f"Error occurred while checking if audio {material_name} contains video streams: {str(e)}", exc_info=True)
-
-            # Get audio duration and set it
-            try:
-                duration_result = get_video_duration(remote_url)
-                if duration_result["success"]:
-                    if task_id:
-                        update_task_field(task_id, "message", f"Processing audio metadata: {material_name}")
-                    # Convert seconds to microseconds
-                    audio.duration = int(duration_result["output"] * 1000000)
-                    logger.info(f"Successfully obtained audio {material_name} duration: {duration_result['output']:.2f} seconds ({audio.duration} microseconds).")
-                    
-                    # Update timerange for all segments using this audio material
-                    for track_name, track in script.tracks.items():
-                        if track.track_type == draft.Track_type.audio:
-                            for segment in track.segments:
-                                if isinstance(segment, draft.Audio_segment) and segment.material_id == audio.material_id:
-                                    # Get current settings
-                                    current_target = segment.target_timerange
-                                    current_source = segment.source_timerange
-                                    speed = segment.speed.speed
-                                    
-                                    # If the end time of source_timerange exceeds the new audio duration, adjust it
-                                    if current_source.end > audio.duration or current_source.end <= 0:
-                                        # Adjust source_timerange to fit the new audio duration
-                                        new_source_duration = audio.duration - current_source.start
-                                        if new_source_duration <= 0:
-                                            logger.warning(f"Warning: Audio segment {segment.segment_id} start time {current_source.start} exceeds audio duration {audio.duration}, will skip this segment.")
-                                            continue
-                                            
-                                        # Update source_timerange
-                                        segment.source_timerange = draft.Timerange(current_source.start, new_source_duration)
-                                        
-                                        # Update target_timerange based on new source_timerange and speed
-                                        new_target_duration = int(new_source_duration / speed)
-                                        segment.target_timerange = draft.Timerange(current_target.start, new_target_duration)
-                                        
-                                        logger.info(f"Adjusted audio segment {segment.segment_id} timerange to fit the new audio duration.")
-                else:
-                    logger.warning(f"Warning: Unable to get audio {material_name} duration: {duration_result['error']}.")
-            except Exception as e:
-                logger.error(f"Error occurred while getting audio {material_name} duration: {str(e)}", exc_info=True)
-    
-    # Process video and image file metadata
-    videos = script.materials.videos
-    if not videos:
+    if not script.materials.videos:
         logger.info("No video or image files found in the draft.")
+
+    if probes:
+        if task_id:
+            task_progress.update(task_id, message=f"Processing metadata of {len(probes)} media files")
+        _, not_done = wait([future for _, _, future in probes], timeout=settings.PROBE_STAGE_BUDGET or None)
+        if not_done:
+            logger.warning(f"Media probe stage budget of {settings.PROBE_STAGE_BUDGET}s exhausted, {len(not_done)} materials keep their current metadata.")
+            for future in not_done:
+                future.cancel()
+
+    # Apply stage
+    durations: Dict[str, int] = {}
+    for kind, material, future in probes:
+        if future.cancelled() or not future.done():
+            logger.warning(f"Probing {kind} {material.material_name} did not finish within the stage budget, keeping its current metadata.")
+            continue
+        try:
+            _apply_probe(kind, material, future.result(), durations)
+        except Exception as e:
+            _apply_probe_error(kind, material, e)
+
+    _finalize_metadata(script, durations)
+
+def _apply_probe(kind: str, material, probe: Dict, durations: Dict[str, int]) -> None:
+    """Apply a probe result to its material; records material_id -> duration for segment fitting"""
+    material_name = material.material_name
+    if kind == "audio":
+        if probe["has_video"]:
+            logger.warning(f"Warning: Audio file {material_name} contains video tracks, skipped its metadata update.")
+        elif probe["duration"] is not None:
+            # Convert seconds to microseconds
+            material.duration = int(probe["duration"] * 1000000)
+            durations[material.material_id] = material.duration
+            logger.info(f"Successfully obtained audio {material_name} duration: {probe['duration']:.2f} seconds ({material.duration} microseconds).")
+        else:
+            logger.warning(f"Warning: Unable to get audio {material_name} duration: {probe['error']}.")
+    elif kind == "image":
+        material.width, material.height = probe["width"], probe["height"]
+        logger.info(f"Successfully set image {material_name} dimensions: {material.width}x{material.height}.")
     else:
-        for video in videos:
-            remote_url = video.remote_url
-            material_name = video.material_name
-            if not remote_url:
-                logger.warning(f"Warning: Media file {material_name} has no remote_url, skipped.")
-                continue
-                
-            if video.material_type == 'photo':
-                # Use imageio to get image width/height and set it
-                try:
-                    if task_id:
-                        update_task_field(task_id, "message", f"Processing image metadata: {material_name}")
-                    img = imageio.imread(remote_url)
-                    video.height, video.width = img.shape[:2]
-                    logger.info(f"Successfully set image {material_name} dimensions: {video.width}x{video.height}.")
-                except Exception as e:
-                    logger.error(f"Failed to set image {material_name} dimensions: {str(e)}, using default values 1920x1080.", exc_info=True)
-                    video.width = 1920
-                    video.height = 1080
-            
-            elif video.material_type == 'video':
-                # Get video duration and width/height information
-                try:
-                    if task_id:
-                        update_task_field(task_id, "message", f"Processing video metadata: {material_name}")
-                    # Use ffprobe to get video information
-                    command = [
-                        'ffprobe',
-                        '-v', 'error',
-                        '-select_streams', 'v:0',  # Select the first video stream
-                        '-show_entries', 'stream=width,height,duration',
-                        '-show_entries', 'format=duration',
-                        '-of', 'json',
-                        remote_url
-                    ]
-                    result = subprocess.check_output(command, stderr=subprocess.STDOUT)
-                    result_str = result.decode('utf-8')
-                    # Find JSON start position (first '{')
-                    json_start = result_str.find('{')
-                    if json_start != -1:
-                        json_str = result_str[json_start:]
-                        info = json.loads(json_str)
-                        
-                        if 'streams' in info and len(info['streams']) > 0:
-                            stream = info['streams'][0]
-                            # Set width and height
-                            video.width = int(stream.get('width', 0))
-                            video.height = int(stream.get('height', 0))
-                            logger.info(f"Successfully set video {material_name} dimensions: {video.width}x{video.height}.")
-                            
-                            # Set duration
-                            # Prefer stream duration, if not available use format duration
-                            duration = stream.get('duration') or info['format'].get('duration', '0')
-                            video.duration = int(float(duration) * 1000000)  # Convert to microseconds
-                            logger.info(f"Successfully obtained video {material_name} duration: {float(duration):.2f} seconds ({video.duration} microseconds).")
-                            
-                            # Update timerange for all segments using this video material
-                            for track_name, track in script.tracks.items():
-                                if track.track_type == draft.Track_type.video:
-                                    for segment in track.segments:
-                                        if isinstance(segment, draft.Video_segment) and segment.material_id == video.material_id:
-                                            # Get current settings
-                                            current_target = segment.target_timerange
-                                            current_source = segment.source_timerange
-                                            speed = segment.speed.speed
-
-                                            # If the end time of source_timerange exceeds the new video duration, adjust it
-                                            if current_source.end > video.duration or current_source.end <= 0:
-                                                # Adjust source_timerange to fit the new video duration
-                                                new_source_duration = video.duration - current_source.start
-                                                if new_source_duration <= 0:
-                                                    logger.warning(f"Warning: Video segment {segment.segment_id} start time {current_source.start} exceeds video duration {video.duration}, will skip this segment.")
-                                                    continue
-                                                    
-                                                # Update source_timerange
-                                                segment.source_timerange = draft.Timerange(current_source.start, new_source_duration)
-                                                
-                                                # Update target_timerange based on new source_timerange and speed
-                                                new_target_duration = int(new_source_duration / speed)
-                                                segment.target_timerange = draft.Timerange(current_target.start, new_target_duration)
-                                                
-                                                logger.info(f"Adjusted video segment {segment.segment_id} timerange to fit the new video duration.")
-                        else:
-                            logger.warning(f"Warning: Unable to get video {material_name} stream information.")
-                            # Set default values
-                            video.width = 1920
-                            video.height = 1080
-                    else:
-                        logger.warning(f"Warning: Could not find JSON data in ffprobe output.")
-                        # Set default values
-                        video.width = 1920
-                        video.height = 1080
-                except Exception as e:
-                    logger.error(f"Error occurred while getting video {material_name} information: {str(e)}, using default values 1920x1080.", exc_info=True)
-                    # Set default values
-                    video.width = 1920
-                    video.height = 1080
-                    
-                    # Try to get duration separately
-                    try:
-                        duration_result = get_video_duration(remote_url)
-                        if duration_result["success"]:
-                            # Convert seconds to microseconds
-                            video.duration = int(duration_result["output"] * 1000000)
-                            logger.info(f"Successfully obtained video {material_name} duration: {duration_result['output']:.2f} seconds ({video.duration} microseconds).")
-                        else:
-                            logger.warning(f"Warning: Unable to get video {material_name} duration: {duration_result['error']}.")
-                    except Exception as e2:
-                        logger.error(f"Error occurred while getting video {material_name} duration: {str(e2)}.", exc_info=True)
+        if probe["width"] is not None:
+            material.width, material.height = probe["width"], probe["height"]
+            logger.info(f"Successfully set video {material_name} dimensions: {material.width}x{material.height}.")
+        else:
+            logger.warning(f"Warning: Unable to get video {material_name} stream information: {probe['error']}")
+            # Set default values
+            material.width = 1920
+            material.height = 1080
+        if probe["duration"] is not None:
+            # Convert seconds to microseconds
+            material.duration = int(probe["duration"] * 1000000)
+            logger.info(f"Successfully obtained video {material_name} duration: {probe['duration']:.2f} seconds ({material.duration} microseconds).")
+            if probe["width"] is not None:
+                # Segment timeranges are only fitted when the full stream information is known
+                durations[material.material_id] = material.duration
+
+def _apply_probe_error(kind: str, material, error: Exception) -> None:
+    if kind in ("image", "video"):
+        logger.error(f"Failed to set {kind} {material.material_name} dimensions: {str(error)}, using default values 1920x1080.", exc_info=error)
+        material.width = 1920
+        material.height = 1080
+    else:
+        logger.error(f"Error occurred while probing {kind} {material.material_name}: {str(error)}", exc_info=error)
+
+def _finalize_metadata(script, durations: Dict[str, int]) -> None:
+    """After materials got their metadata: fit segments, resolve conflicts, update the script duration and keyframes"""
+    # Update timerange for all segments using the probed materials
+    _fit_segments_to_duration(script, durations)
 
     # After updating all segments' timerange, check if there are time range conflicts in each track, and delete the later segment in case of conflict
     logger.info("Checking track segment time range conflicts...")
     for track_name, track in script.tracks.items():
-        # Use a set to record segment indices that need to be deleted
-        to_remove = set()
-        
-        # Check for conflicts between all segments
-        for i in range(len(track.segments)):
-            # Skip if current segment is already marked for deletion
-            if i in to_remove:
-                continue
-                
-            for j in range(len(track.segments)):
-                # Skip self-comparison and segments already marked for deletion
-                if i == j or j in to_remove:
-                    continue
-                    
-                # Check if there is a conflict
-                if track.segments[i].overlaps(track.segments[j]):
-                    # Always keep the segment with the smaller index (added first)
-                    later_index = max(i, j)
-                    logger.warning(f"Time range conflict between segments {track.segments[min(i, j)].segment_id} and {track.segments[later_index].segment_id} in track {track_name}, deleting the later segment")
-                    to_remove.add(later_index)
-        
-        # Delete marked segments from back to front to avoid index change issues
-        for index in sorted(to_remove, reverse=True):
-            track.segments.pop(index)
+        # Always keep the segment added first; a sort-based sweep instead of comparing every pair
+        for kept, removed in track.resolve_overlaps():
+            logger.warning(f"Time range conflict between segments {kept.segment_id} and {removed.segment_id} in track {track_name}, deleted the later segment")
 
     # After updating all segments' timerange, recalculate the total duration of the script
     max_duration = 0
@@ -541,17 +799,19 @@ def query_script_impl(draft_id: str, force_update: bool = True):
     :return: Script object
     """
     # Get draft information from global cache
-    if draft_id not in DRAFT_CACHE:
-        logger.warning(f"Draft {draft_id} does not exist in cache.")
-        return None
+    # Refreshing metadata mutates the draft, a plain query only reads it
+    with draft_locks.acquire(draft_id, "write" if force_update else "read"):
+        script = draft_cache.get(draft_id)
+        if script is None:
+            logger.warning(f"Draft {draft_id} does not exist in cache.")
+            return None
+        logger.info(f"Retrieved draft {draft_id} from cache.")
         
-    script = DRAFT_CACHE[draft_id]
-    logger.info(f"Retrieved draft {draft_id} from cache.")
-    
-    # If force_update is True, force refresh media metadata
-    if force_update:
-        logger.info(f"Force refreshing media metadata for draft {draft_id}.")
-        update_media_metadata(script)
+        # If force_update is True, force refresh media metadata
+        if force_update:
+            logger.info(f"Force refreshing media metadata for draft {draft_id}.")
+            update_media_metadata(script)
+            draft_cache.commit(draft_id, script)
     
     # Return script object
     return script
@@ -586,7 +846,7 @@ def download_script(draft_id: str, draft_folder: str = None, script_data: Dict =
         shutil.rmtree(new_draft_path)
 
     # Copy draft folder
-    shutil.copytree(template_path, new_draft_path)
+    template_cache.materialize(template_path, new_draft_path)
     
     try:
         # 1. Fetch the script from the remote endpoint
@@ -624,7 +884,7 @@ def download_script(draft_id: str, draft_folder: str = None, script_data: Dict =
                 # Add audio download task
                 download_tasks.append({
                     'type': 'audio',
-                    'func': download_file,
+                    'func': fetch_asset,
                     'args': (remote_url, audio['path']),
                     'material': audio
                 })
@@ -647,7 +907,7 @@ def download_script(draft_id: str, draft_folder: str = None, script_data: Dict =
                     # Add image download task
                     download_tasks.append({
                         'type': 'image',
-                        'func': download_file,
+                        'func': fetch_asset,
                         'args': (remote_url, video['path']),
                         'material': video
                     })
@@ -663,7 +923,7 @@ def download_script(draft_id: str, draft_folder: str = None, script_data: Dict =
                     # Add video download task
                     download_tasks.append({
                         'type': 'video',
-                        'func': download_file,
+                        'func': fetch_asset,
                         'args': (remote_url, video['path']),
                         'material': video
                     })
@@ -674,28 +934,27 @@ def download_script(draft_id: str, draft_folder: str = None, script_data: Dict =
         if download_tasks:
             logger.info(f"Starting concurrent download of {len(download_tasks)} files...")
             
-            # Use thread pool for concurrent downloads, maximum concurrency of 16
-            with ThreadPoolExecutor(max_workers=16) as executor:
-                # Submit all download tasks
-                future_to_task = {
-                    executor.submit(task['func'], *task['args']): task 
-                    for task in download_tasks
-                }
-                
-                # Wait for all tasks to complete
-                for future in as_completed(future_to_task):
-                    task = future_to_task[future]
-                    try:
-                        local_path = future.result()
-                        downloaded_paths.append(local_path)
-                        
-                        # Update task status - only update completed files count
-                        completed_files += 1
-                        logger.info(f"Downloaded {completed_files}/{len(download_tasks)} files.")
-                    except Exception as e:
-                        logger.error(f"Failed to download {task['type']} file {task['args'][0]}: {str(e)}", exc_info=True)
-                        logger.error("Download failed.")
-                        # Continue processing other files, don't interrupt the entire process
+            # Downloads share the process-wide transfer engine (global and per-host connection limits);
+            # someone is waiting on this download, so it goes ahead of background saves
+            future_to_task = {
+                transfer_engine.submit(task['func'], *task['args'], group=draft_id, priority="interactive"): task
+                for task in download_tasks
+            }
+
+            # Wait for all tasks to complete
+            for future in as_completed(future_to_task):
+                task = future_to_task[future]
+                try:
+                    local_path = future.result()
+                    downloaded_paths.append(local_path)
+
+                    # Update task status - only update completed files count
+                    completed_files += 1
+                    logger.info(f"Downloaded {completed_files}/{len(download_tasks)} files.")
+                except Exception as e:
+                    logger.error(f"Failed to download {task['type']} file {task['args'][0]}: {str(e)}", exc_info=True)
+                    logger.error("Download failed.")
+                    # Continue processing other files, don't interrupt the entire process
             
             logger.info(f"Concurrent download completed, downloaded {len(downloaded_paths)} files in total.")
         
@@ -0,0 +1,85 @@
+import http.server
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import pytest
+
+class _QuietServer(http.server.ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients drop connections on purpose (e.g. a probing GET replaced by range requests)
+        pass
+
+class FileServer:
+    """Local HTTP server of in-memory files with Range support, recording the requests it gets"""
+
+    def __init__(self):
+        self.files: Dict[str, bytes] = {}
+        # Paths answered with the whole file (200) even for Range requests
+        self.ignore_range: Set[str] = set()
+        # Whether responses advertise range support (Accept-Ranges: bytes)
+        self.accept_ranges = True
+        # Range start -> number of requests starting there that still get a 500
+        self.fail_ranges: Dict[int, int] = {}
+        # (path, Range header or None) of every request
+        self.requests: List[Tuple[str, Optional[str]]] = []
+        self._lock = threading.Lock()
+        self._server = _QuietServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}{path}"
+
+    def ranges(self, path: str) -> List[Optional[str]]:
+        return [header for request_path, header in self.requests if request_path == path]
+
+    def _handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                header = self.headers.get("Range")
+                with server._lock:
+                    server.requests.append((self.path, header))
+                data = server.files.get(self.path)
+                if data is None:
+                    return self._send(404, b"")
+                if header is None or self.path in server.ignore_range:
+                    return self._send(200, data)
+                first, _, last = header.split("=", 1)[1].partition("-")
+                start = int(first)
+                end = min(int(last) if last else len(data) - 1, len(data) - 1)
+                with server._lock:
+                    failures = server.fail_ranges.get(start, 0)
+                    if failures:
+                        server.fail_ranges[start] = failures - 1
+                if failures:
+                    return self._send(500, b"")
+                if start >= len(data):
+                    return self._send(416, b"", {"Content-Range": f"bytes */{len(data)}"})
+                self._send(206, data[start:end + 1], {"Content-Range": f"bytes {start}-{end}/{len(data)}"})
+
+            def _send(self, status, body, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", '"v1"')
+                if server.accept_ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+@pytest.fixture
+def file_server():
+    server = FileServer()
+    server._thread.start()
+    yield server
+    server._server.shutdown()
+    server._server.server_close()
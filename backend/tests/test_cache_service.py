@@ -0,0 +1,102 @@
+import os
+import time
+
+from infra.cache_service import SpillableCache, ThreadSafeCache
+from infra.draft_store import MemoryDraftStore
+
+def _cache(tmp_path, max_bytes=10, **ttls):
+    return SpillableCache(max_bytes=max_bytes, spill_dir=str(tmp_path / "spill"), sizeof=len, **ttls)
+
+def _spilled_files(cache):
+    return [name for name in os.listdir(cache.spill_dir) if name.endswith(".pkl.z")]
+
+def test_least_recently_used_entry_spills_over_budget(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("a", "aaaaaa")
+    cache.put("b", "bbbbbb")
+
+    assert "a" not in cache._cache
+    assert "b" in cache._cache
+    assert len(_spilled_files(cache)) == 1
+    assert cache.contains("a")
+
+def test_spilled_entry_is_rehydrated_on_get(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("a", "aaaaaa")
+    cache.put("b", "bbbbbb")
+
+    assert cache.get("a") == "aaaaaa"
+    # Rehydrating a pushes b out in turn; a's spill file is consumed
+    assert "a" in cache._cache
+    assert "b" not in cache._cache
+    assert cache.get("b") == "bbbbbb"
+    assert len(_spilled_files(cache)) == 1
+
+def test_most_recent_entry_stays_in_memory_alone_over_budget(tmp_path):
+    cache = _cache(tmp_path, max_bytes=2)
+    cache.put("big", "x" * 100)
+
+    assert "big" in cache._cache
+    assert _spilled_files(cache) == []
+
+def test_put_supersedes_spilled_copy(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("a", "old---")
+    cache.put("b", "bbbbbb")
+    cache.put("a", "new---")
+
+    assert cache.get("a") == "new---"
+    cache.delete("b")
+    cache.delete("a")
+    assert _spilled_files(cache) == []
+    assert cache.get("a") is None
+
+def test_idle_expiry_of_memory_and_spilled_entries(tmp_path):
+    cache = _cache(tmp_path, idle_ttl=60)
+    cache.put("a", "aaaaaa")
+    cache.put("b", "bbbbbb")
+    # a was spilled (its file mtime records the last use), b is in memory
+    spill_path = cache._spill_path("a")
+    old = time.time() - 120
+    os.utime(spill_path, (old, old))
+    cache._accessed["b"] = old
+
+    assert sorted(cache.purge_expired()) == ["a", "b"]
+    assert _spilled_files(cache) == []
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+
+def test_expired_spilled_entry_is_not_rehydrated(tmp_path):
+    cache = _cache(tmp_path, absolute_ttl=60)
+    cache.put("a", "aaaaaa")
+    cache._created["a"] = time.time() - 120
+    cache.put("b", "bbbbbb")
+
+    # The creation time travels with the spilled entry
+    assert cache.get("a") is None
+    assert not cache.contains("a")
+
+def test_absolute_ttl_survives_rehydration(tmp_path):
+    cache = _cache(tmp_path, absolute_ttl=60)
+    cache.put("a", "aaaaaa")
+    created = time.time() - 30
+    cache._created["a"] = created
+    cache.put("b", "bbbbbb")
+
+    assert cache.get("a") == "aaaaaa"
+    assert cache._created["a"] == created
+
+def test_edit_after_spill_is_kept_by_commit(tmp_path):
+    store = MemoryDraftStore(drafts=_cache(tmp_path), tasks=ThreadSafeCache())
+    store.put("x", [1, 2, 3, 4, 5])
+    script = store.get("x")
+    # Another draft pushes x to disk while its request is still editing it
+    store.put("y", [0] * 6)
+    script.append(99)
+
+    store.commit("x", script)
+
+    assert store.get("x") is script
+    assert store.get("x")[-1] == 99
+    store.put("z", [0] * 6)
+    assert store.get("x") == [1, 2, 3, 4, 5, 99]
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from infra import downloader
+from infra.downloader import download_file
+from infra.url_health import UrlHealth, UrlUnavailableError
+
+SEGMENTS = 4
+# Not a multiple of the segment count, so the last segment is shorter
+DATA = os.urandom(1024 * 1024 + 3)
+
+@pytest.fixture
+def segmented(monkeypatch):
+    """Segment every download of more than 1KB, without retry backoff, with an isolated url_health"""
+    monkeypatch.setattr(downloader.settings, "DOWNLOAD_SEGMENT_THRESHOLD", 1024)
+    monkeypatch.setattr(downloader.settings, "DOWNLOAD_SEGMENTS", SEGMENTS)
+    monkeypatch.setattr(downloader.time, "sleep", lambda seconds: None)
+    health = UrlHealth(negative_ttl=60, failure_threshold=100, reset_timeout=30)
+    monkeypatch.setattr(downloader, "url_health", health)
+    return health
+
+def _segment_ranges(size):
+    segment_size = -(-size // SEGMENTS)
+    return [f"bytes={start}-{min(start + segment_size, size) - 1}" for start in range(0, size, segment_size)]
+
+def test_segments_cover_the_file_and_are_reassembled(file_server, segmented, tmp_path):
+    file_server.files["/clip.mp4"] = DATA
+    target = tmp_path / "clip.mp4"
+
+    assert download_file(file_server.url("/clip.mp4"), str(target))
+
+    assert target.read_bytes() == DATA
+    ranges = file_server.ranges("/clip.mp4")
+    # The probing GET, then one range per segment
+    assert ranges[0] is None
+    assert sorted(ranges[1:]) == sorted(_segment_ranges(len(DATA)))
+    assert os.listdir(tmp_path) == ["clip.mp4"]
+
+def test_small_file_is_not_segmented(file_server, segmented, tmp_path):
+    file_server.files["/clip.mp4"] = DATA[:1000]
+    target = tmp_path / "clip.mp4"
+
+    assert download_file(file_server.url("/clip.mp4"), str(target))
+
+    assert target.read_bytes() == DATA[:1000]
+    assert file_server.ranges("/clip.mp4") == [None]
+
+def test_server_without_range_support_streams_the_file(file_server, segmented, tmp_path):
+    file_server.files["/clip.mp4"] = DATA
+    file_server.ignore_range.add("/clip.mp4")
+    file_server.accept_ranges = False
+    target = tmp_path / "clip.mp4"
+
+    assert download_file(file_server.url("/clip.mp4"), str(target))
+
+    assert target.read_bytes() == DATA
+    assert file_server.ranges("/clip.mp4") == [None]
+
+def test_server_ignoring_advertised_ranges_falls_back_to_one_stream(file_server, segmented, tmp_path):
+    file_server.files["/clip.mp4"] = DATA
+    file_server.ignore_range.add("/clip.mp4")
+    target = tmp_path / "clip.mp4"
+
+    assert download_file(file_server.url("/clip.mp4"), str(target))
+
+    assert target.read_bytes() == DATA
+    # The retry does not segment again
+    assert file_server.ranges("/clip.mp4")[-1] is None
+    assert os.listdir(tmp_path) == ["clip.mp4"]
+
+def test_failed_segment_is_retried(file_server, segmented, tmp_path):
+    file_server.files["/clip.mp4"] = DATA
+    second = _segment_ranges(len(DATA))[1]
+    file_server.fail_ranges[int(second.split("=")[1].split("-")[0])] = 2
+    target = tmp_path / "clip.mp4"
+
+    assert download_file(file_server.url("/clip.mp4"), str(target))
+
+    assert target.read_bytes() == DATA
+    ranges = file_server.ranges("/clip.mp4")
+    assert ranges.count(second) == 3
+    # The other segments were fetched once
+    assert len(ranges) == 1 + SEGMENTS + 2
+
+def test_segment_failing_for_good_fails_the_download(file_server, segmented, tmp_path):
+    file_server.files["/clip.mp4"] = DATA
+    file_server.fail_ranges[0] = 1000
+    url = file_server.url("/clip.mp4")
+    target = tmp_path / "clip.mp4"
+
+    assert not download_file(url, str(target))
+
+    # No partial file left behind, and the URL is remembered as failing
+    assert os.listdir(tmp_path) == []
+    with pytest.raises(UrlUnavailableError):
+        segmented.check(url)
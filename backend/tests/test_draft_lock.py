@@ -0,0 +1,95 @@
+import importlib
+import sqlite3
+import time
+
+import pytest
+
+from infra.cache_service import ThreadSafeCache
+from infra.draft_lock import track_edit, with_draft_lock
+from infra.draft_store import SqliteDraftStore
+
+@pytest.fixture
+def sqlite_store(tmp_path, monkeypatch):
+    """SQLite draft store used by the lock decorator and by draft creation"""
+    store = SqliteDraftStore(str(tmp_path / "drafts.sqlite3"), local_cache=ThreadSafeCache(capacity=16),
+                             draft_idle_ttl=3600)
+    monkeypatch.setattr("infra.draft_lock.draft_cache", store)
+    # services re-exports functions under the module names, so patch the module object itself
+    monkeypatch.setattr(importlib.import_module("services.create_draft"), "draft_cache", store)
+    return store
+
+def _reload(store, draft_id):
+    # Drop the deserialized objects, as another worker process would not have them
+    store._local.clear()
+    return store.get(draft_id)
+
+def _text_segments(script):
+    return [segment for track in script.tracks.values() for segment in track.segments]
+
+def test_edit_of_unknown_draft_is_committed_under_new_id(sqlite_store):
+    from services.add_text_impl import add_text_impl
+
+    result = add_text_impl(text="hello", start=0, end=1, draft_id="unknown")
+
+    assert result["draft_id"] != "unknown"
+    assert len(_text_segments(_reload(sqlite_store, result["draft_id"]))) == 1
+
+def test_edit_of_expired_draft_is_committed_under_new_id(sqlite_store):
+    from services.add_text_impl import add_text_impl
+
+    expired_id = add_text_impl(text="old", start=0, end=1)["draft_id"]
+    with sqlite3.connect(sqlite_store.path) as conn:
+        conn.execute("UPDATE drafts SET updated_at = ? WHERE id = ?", (time.time() - 7200, expired_id))
+
+    result = add_text_impl(text="new", start=0, end=1, draft_id=expired_id)
+
+    assert result["draft_id"] != expired_id
+    assert len(_text_segments(_reload(sqlite_store, result["draft_id"]))) == 1
+
+def test_edit_of_existing_draft_is_committed(sqlite_store):
+    from services.add_text_impl import add_text_impl
+
+    draft_id = add_text_impl(text="first", start=0, end=1)["draft_id"]
+    result = add_text_impl(text="second", start=1, end=2, draft_id=draft_id)
+
+    assert result["draft_id"] == draft_id
+    assert len(_text_segments(_reload(sqlite_store, draft_id))) == 2
+
+def test_edit_of_draft_dropped_from_local_cache_is_committed(sqlite_store):
+    from services.create_draft import get_or_create_draft
+
+    draft_id = get_or_create_draft()[0]
+
+    @with_draft_lock()
+    def edit(draft_id):
+        script = get_or_create_draft(draft_id)[1]
+        # Evicted from the process-local LRU while the request still edits it
+        sqlite_store._local.clear()
+        script.duration = 42
+        return {"draft_id": draft_id}
+
+    edit(draft_id)
+    assert _reload(sqlite_store, draft_id).duration == 42
+
+def test_write_mode_commits_the_drafts_handed_out(monkeypatch):
+    commits = []
+    monkeypatch.setattr("infra.draft_lock.draft_cache.commit", lambda draft_id, script: commits.append((draft_id, script)))
+
+    @with_draft_lock("read")
+    def read(draft_id):
+        track_edit(draft_id, "read script")
+        return {"draft_id": draft_id}
+
+    @with_draft_lock()
+    def write(draft_id=None):
+        track_edit(draft_id or "created", "edited script")
+        return {"draft_id": "ignored"}
+
+    read("a")
+    assert commits == []
+    write()
+    write(draft_id="b")
+    assert commits == [("created", "edited script"), ("b", "edited script")]
+    # Outside of a write-locked call there is nothing to commit
+    track_edit("c", "script")
+    assert len(commits) == 2
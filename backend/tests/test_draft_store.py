@@ -0,0 +1,101 @@
+import sqlite3
+import time
+
+import pytest
+
+from infra.cache_service import ThreadSafeCache
+from infra.draft_store import SqliteDraftStore
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "drafts.sqlite3")
+
+def _store(path, **ttls):
+    # Each store stands for one worker process with its own deserialized objects
+    return SqliteDraftStore(path, local_cache=ThreadSafeCache(capacity=16), **ttls)
+
+def _version(path, draft_id):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT version FROM drafts WHERE id = ?", (draft_id,)).fetchone()[0]
+
+def test_every_write_bumps_the_version(db_path):
+    store = _store(db_path)
+    script = {"segments": []}
+    store.put("d", script)
+    assert _version(db_path, "d") == 1
+
+    script["segments"].append("s1")
+    store.commit("d", script)
+    assert _version(db_path, "d") == 2
+
+def test_unchanged_version_reuses_the_local_object(db_path):
+    store = _store(db_path)
+    script = {"segments": []}
+    store.put("d", script)
+
+    assert store.get("d") is script
+
+def test_other_process_sees_committed_edits(db_path):
+    first, second = _store(db_path), _store(db_path)
+    first.put("d", {"segments": []})
+    stale = second.get("d")
+
+    script = first.get("d")
+    script["segments"].append("s1")
+    first.commit("d", script)
+
+    fresh = second.get("d")
+    assert fresh is not stale
+    assert fresh == {"segments": ["s1"]}
+    # Loaded once per version
+    assert second.get("d") is fresh
+
+def test_commit_persists_draft_dropped_from_local_cache(db_path):
+    store = _store(db_path)
+    store.put("d", {"segments": []})
+    script = store.get("d")
+    store._local.clear()
+
+    script["segments"].append("s1")
+    store.commit("d", script)
+
+    assert _store(db_path).get("d") == {"segments": ["s1"]}
+
+def test_uncommitted_edits_stay_local(db_path):
+    first, second = _store(db_path), _store(db_path)
+    first.put("d", {"segments": []})
+    first.get("d")["segments"].append("s1")
+
+    assert second.get("d") == {"segments": []}
+
+def test_expired_draft_is_not_returned(db_path):
+    store = _store(db_path, draft_idle_ttl=3600)
+    store.put("d", {"segments": []})
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE drafts SET updated_at = ? WHERE id = ?", (time.time() - 7200, "d"))
+
+    assert store.get("d") is None
+    assert not store.contains("d")
+    assert store.purge_expired_drafts() == ["d"]
+
+def test_draft_expiring_between_version_check_and_load_is_not_returned(db_path, monkeypatch):
+    store = _store(db_path, draft_idle_ttl=3600)
+    store.put("d", {"segments": []})
+    store._local.clear()
+
+    def expire_meanwhile(draft_id):
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE drafts SET updated_at = ? WHERE id = ?", (time.time() - 7200, draft_id))
+        return None
+    monkeypatch.setattr(store._local, "get", expire_meanwhile)
+
+    assert store.get("d") is None
+
+def test_delete_removes_draft_for_all_processes(db_path):
+    first, second = _store(db_path), _store(db_path)
+    first.put("d", {"segments": []})
+    second.get("d")
+
+    first.delete("d")
+
+    assert second.get("d") is None
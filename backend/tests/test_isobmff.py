@@ -0,0 +1,222 @@
+import struct
+
+import pytest
+import requests
+
+from infra import isobmff
+from infra.isobmff import FORMAT_NAME, MoovReader, read_mp4_info
+from infra.url_health import UrlHealth, UrlUnavailableError
+
+def box(box_type, *payload):
+    data = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(data), box_type) + data
+
+def large_box(box_type, *payload):
+    """Box with a 64-bit size, as large mdat boxes are written"""
+    data = b"".join(payload)
+    return struct.pack(">I4sQ", 1, box_type, 16 + len(data)) + data
+
+def full_box(box_type, version, *payload):
+    return box(box_type, bytes([version, 0, 0, 0]), *payload)
+
+def header_box(box_type, timescale, duration, version=0):
+    """mvhd/mdhd with the given timescale and duration"""
+    if version == 1:
+        times = struct.pack(">QQIQ", 0, 0, timescale, duration)
+    else:
+        times = struct.pack(">IIII", 0, 0, timescale, duration)
+    return full_box(box_type, version, times, bytes(80 if box_type == b"mvhd" else 4))
+
+def edit_list(*edits, version=0):
+    """elst of (segment_duration, media_time) entries; media_time -1 is an empty edit"""
+    fmt = ">Qqi" if version == 1 else ">Iii"
+    entries = b"".join(struct.pack(fmt, duration, media_time, 1 << 16) for duration, media_time in edits)
+    return box(b"edts", full_box(b"elst", version, struct.pack(">I", len(edits)), entries))
+
+def trak(handler, timescale, duration, size=None, chunk_offsets=b"stco", edits=None, version=0):
+    if size is not None:
+        # Visual sample entry: 24 bytes of reserved/pre-defined fields, then width and height
+        entry = box(b"avc1", bytes(24), struct.pack(">HH", *size), bytes(50))
+    else:
+        entry = box(b"mp4a", bytes(28))
+    offset_format = ">IQ" if chunk_offsets == b"co64" else ">II"
+    stbl = box(b"stbl",
+               full_box(b"stsd", 0, struct.pack(">I", 1), entry),
+               full_box(chunk_offsets, 0, struct.pack(offset_format, 1, 48)))
+    mdia = box(b"mdia",
+               header_box(b"mdhd", timescale, duration, version),
+               full_box(b"hdlr", 0, bytes(4), handler, bytes(12), b"\0"),
+               box(b"minf", stbl))
+    return box(b"trak", *((edits,) if edits else ()), mdia)
+
+def moov(*traks, timescale=1000, duration=5000, version=0, extra=b""):
+    return box(b"moov", header_box(b"mvhd", timescale, duration, version), *traks, extra)
+
+def video_moov(**trak_options):
+    return moov(trak(b"vide", 12800, 64000, size=(640, 360), **trak_options),
+                trak(b"soun", 44100, 220500))
+
+FTYP = box(b"ftyp", b"isom", struct.pack(">I", 512), b"isommp41")
+MDAT = large_box(b"mdat", bytes(200 * 1024))
+
+EXPECTED = {
+    "streams": [
+        {"codec_type": "video", "duration": "5.000000", "width": 640, "height": 360},
+        {"codec_type": "audio", "duration": "5.000000"},
+    ],
+    "format": {"format_name": FORMAT_NAME, "duration": "5.000000"},
+}
+
+@pytest.fixture
+def write(tmp_path):
+    def write(data, name="clip.mp4"):
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return write
+
+def _chunked(data, size):
+    reader = MoovReader()
+    for i in range(0, len(data), size):
+        reader.feed(data[i:i + size])
+    return reader.info()
+
+@pytest.mark.parametrize("layout", ["moov-first", "moov-last"])
+def test_moov_at_start_or_end(write, layout):
+    data = FTYP + video_moov() + MDAT if layout == "moov-first" else FTYP + MDAT + video_moov()
+
+    assert read_mp4_info(write(data)) == EXPECTED
+
+@pytest.mark.parametrize("chunk_offsets", [b"stco", b"co64"])
+def test_chunk_offset_box_kinds(write, chunk_offsets):
+    data = FTYP + MDAT + video_moov(chunk_offsets=chunk_offsets)
+
+    assert read_mp4_info(write(data)) == EXPECTED
+
+def test_version_1_header_boxes(write):
+    data = FTYP + moov(trak(b"vide", 12800, 64000, size=(640, 360), version=1),
+                       trak(b"soun", 44100, 220500, version=1), version=1) + MDAT
+
+    assert read_mp4_info(write(data)) == EXPECTED
+
+@pytest.mark.parametrize("version", [0, 1])
+def test_edit_list_shortens_stream_duration(write, version):
+    # An empty edit (delayed start) and 4s of the 5s of media
+    edits = edit_list((500, -1), (4000, 1024), version=version)
+    info = read_mp4_info(write(FTYP + video_moov(edits=edits) + MDAT))
+
+    assert info["streams"][0]["duration"] == "4.000000"
+    assert info["streams"][1]["duration"] == "5.000000"
+
+def test_edit_list_longer_than_media_keeps_media_duration(write):
+    info = read_mp4_info(write(FTYP + video_moov(edits=edit_list((9000, 0))) + MDAT))
+
+    assert info["streams"][0]["duration"] == "5.000000"
+
+def test_truncated_edit_list_is_not_parsed(write):
+    edits = box(b"edts", full_box(b"elst", 0, struct.pack(">I", 3), struct.pack(">Iii", 4000, 0, 1 << 16)))
+
+    assert read_mp4_info(write(FTYP + video_moov(edits=edits) + MDAT)) is None
+
+def test_truncated_file_is_not_parsed(write):
+    data = FTYP + MDAT + video_moov()
+
+    assert read_mp4_info(write(data[:-10])) is None
+    assert _chunked(data[:-10], 4096) is None
+
+def test_box_larger_than_its_parent_is_not_parsed(write):
+    data = bytearray(FTYP + video_moov() + MDAT)
+    # Grow the mvhd box past the end of moov
+    mvhd = data.index(b"mvhd") - 4
+    struct.pack_into(">I", data, mvhd, 1 << 20)
+
+    assert read_mp4_info(write(bytes(data))) is None
+
+def test_oversized_moov_is_left_to_ffprobe(write, monkeypatch):
+    data = FTYP + video_moov() + MDAT
+    monkeypatch.setattr(isobmff, "_MAX_MOOV_SIZE", 64)
+
+    assert read_mp4_info(write(data)) is None
+    assert _chunked(data, 4096) is None
+
+def test_fragmented_file_is_left_to_ffprobe(write):
+    data = FTYP + moov(trak(b"vide", 12800, 64000, size=(640, 360)), extra=box(b"mvex")) + MDAT
+
+    assert read_mp4_info(write(data)) is None
+    assert _chunked(data, 4096) is None
+
+@pytest.mark.parametrize("data", [b"", b"\x89PNG\r\n\x1a\n" + bytes(64), FTYP + MDAT])
+def test_other_files_are_not_parsed(write, data):
+    assert read_mp4_info(write(data)) is None
+    assert _chunked(data, 4096) is None
+
+@pytest.mark.parametrize("size", [1, 7, 16, 4096, 1 << 30])
+@pytest.mark.parametrize("layout", ["moov-first", "moov-last"])
+def test_chunked_reader_matches_file_reader(write, layout, size):
+    data = FTYP + video_moov() + MDAT if layout == "moov-first" else FTYP + MDAT + video_moov()
+
+    assert _chunked(data, size) == read_mp4_info(write(data)) == EXPECTED
+
+@pytest.fixture
+def health(monkeypatch):
+    health = UrlHealth(negative_ttl=60, failure_threshold=1, reset_timeout=30)
+    monkeypatch.setattr(isobmff, "url_health", health)
+    return health
+
+def test_remote_moov_at_end_is_read_with_two_range_requests(file_server, health):
+    file_server.files["/clip.mp4"] = FTYP + MDAT + video_moov()
+
+    assert read_mp4_info(file_server.url("/clip.mp4")) == EXPECTED
+    ranges = file_server.ranges("/clip.mp4")
+    assert len(ranges) == 2 and all(ranges)
+
+def test_remote_server_without_ranges(file_server, health):
+    file_server.files["/first.mp4"] = FTYP + video_moov() + MDAT
+    file_server.files["/last.mp4"] = FTYP + MDAT + video_moov()
+    file_server.ignore_range.update(file_server.files)
+
+    assert read_mp4_info(file_server.url("/first.mp4")) == EXPECTED
+    assert read_mp4_info(file_server.url("/last.mp4")) is None
+    # Not a failure of the URL
+    health.check(file_server.url("/last.mp4"))
+
+def test_remote_http_error_is_recorded(file_server, health):
+    url = file_server.url("/missing.mp4")
+
+    with pytest.raises(requests.HTTPError):
+        read_mp4_info(url)
+    with pytest.raises(UrlUnavailableError, match="404"):
+        read_mp4_info(url)
+    assert len(file_server.requests) == 1
+
+def test_remote_connection_error_opens_the_host_circuit(file_server, health):
+    url = file_server.url("/clip.mp4")
+    file_server._server.shutdown()
+    file_server._server.server_close()
+
+    with pytest.raises(requests.ConnectionError):
+        read_mp4_info(url, timeout=2)
+    with pytest.raises(UrlUnavailableError):
+        read_mp4_info(url, timeout=2)
+
+class _LoggedSlot:
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        self.log.append(("enter",))
+
+    def __exit__(self, *exc):
+        self.log.append(("exit",))
+
+def test_remote_reads_hold_a_transfer_slot(file_server, health, monkeypatch):
+    file_server.files["/clip.mp4"] = FTYP + MDAT + video_moov()
+    log = []
+    scheduler = isobmff.transfer_scheduler
+    monkeypatch.setattr(scheduler, "slot", lambda: _LoggedSlot(log))
+    monkeypatch.setattr(scheduler, "record", lambda nbytes=0, ok=True: log.append(("record", nbytes, ok)))
+
+    read_mp4_info(file_server.url("/clip.mp4"))
+
+    assert [entry[0] for entry in log] == ["enter", "record", "exit"] * 2
+    assert all(entry[2] for entry in log if entry[0] == "record")
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from infra.job_queue import JobQueue, QueueFullError, raise_if_cancelled
+
+TIMEOUT = 5
+
+@pytest.fixture
+def make_queue():
+    queues = []
+
+    def make(workers=1, max_size=10, per_group_limit=1):
+        queue = JobQueue(workers=workers, max_size=max_size, per_group_limit=per_group_limit, name="test")
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.stop(timeout=TIMEOUT)
+
+def _blocking_job(started: threading.Event, release: threading.Event, log: list, name: str):
+    """Job that waits for `release`, checking for cancellation like the save job does"""
+    def run():
+        log.append(f"{name} started")
+        started.set()
+        while not release.wait(0.01):
+            raise_if_cancelled()
+        log.append(f"{name} finished")
+    return run
+
+def _wait_finished(*jobs):
+    deadline = time.monotonic() + TIMEOUT
+    while any(job.status in ("queued", "running") for job in jobs):
+        assert time.monotonic() < deadline, "jobs did not finish"
+        time.sleep(0.01)
+
+def test_jobs_run_by_priority_then_fifo(make_queue):
+    queue = make_queue()
+    started, release, log = threading.Event(), threading.Event(), []
+    queue.submit("blocker", _blocking_job(started, release, log, "blocker"))
+    assert started.wait(TIMEOUT)
+
+    order = []
+    jobs = [queue.submit(job_id, order.append, job_id, priority=priority)
+            for job_id, priority in [("low", "low"), ("normal-1", "normal"), ("high", "high"), ("normal-2", "normal")]]
+    assert queue.position("high") == 0
+    assert queue.position("low") == 3
+
+    release.set()
+    _wait_finished(*jobs)
+    assert order == ["high", "normal-1", "normal-2", "low"]
+
+def test_cancelled_queued_job_never_runs(make_queue):
+    queue = make_queue()
+    started, release, log = threading.Event(), threading.Event(), []
+    blocker = queue.submit("blocker", _blocking_job(started, release, log, "blocker"))
+    assert started.wait(TIMEOUT)
+    ran = []
+    job = queue.submit("queued", ran.append, "queued")
+
+    assert queue.cancel("queued")
+    assert job.status == "cancelled"
+    assert queue.position("queued") is None
+
+    release.set()
+    _wait_finished(blocker)
+    assert ran == []
+    assert not queue.cancel("queued")
+
+def test_running_job_stops_at_its_next_cancellation_point(make_queue):
+    queue = make_queue()
+    started, release, log = threading.Event(), threading.Event(), []
+    job = queue.submit("running", _blocking_job(started, release, log, "running"))
+    assert started.wait(TIMEOUT)
+
+    assert queue.cancel("running")
+
+    _wait_finished(job)
+    assert job.status == "cancelled"
+    assert log == ["running started"]
+    assert queue.get_running("running") is None
+
+def test_superseding_save_waits_for_the_cancelled_one(make_queue):
+    # A new save of the same draft cancels the running one and is queued under the same id
+    queue = make_queue(workers=2)
+    first_started, first_release, log = threading.Event(), threading.Event(), []
+    first = queue.submit("task", _blocking_job(first_started, first_release, log, "first"), group="draft")
+    assert first_started.wait(TIMEOUT)
+
+    queue.cancel("task")
+    second_started, second_release = threading.Event(), threading.Event()
+    second = queue.submit("task", _blocking_job(second_started, second_release, log, "second"), group="draft")
+
+    assert second_started.wait(TIMEOUT)
+    # The group limit kept the second save queued until the first one had stopped
+    assert log == ["first started", "second started"]
+    assert first.status == "cancelled"
+    assert queue.get_running("task") is second
+
+    second_release.set()
+    _wait_finished(second)
+    assert second.status == "done"
+    assert log[-1] == "second finished"
+
+def test_full_queue_rejects_jobs(make_queue):
+    queue = make_queue(max_size=1)
+    started, release, log = threading.Event(), threading.Event(), []
+    blocker = queue.submit("blocker", _blocking_job(started, release, log, "blocker"))
+    assert started.wait(TIMEOUT)
+    waiting = queue.submit("waiting", log.append, "waiting")
+
+    with pytest.raises(QueueFullError):
+        queue.submit("rejected", log.append, "rejected")
+    with pytest.raises(ValueError):
+        queue.submit("waiting", log.append, "again")
+
+    release.set()
+    _wait_finished(blocker, waiting)
+    assert log[-1] == "waiting"
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from infra.media_tools import MediaToolRunner
+
+def _python(code):
+    return [sys.executable, "-c", code]
+
+def test_probes_do_not_wait_for_transfers():
+    runner = MediaToolRunner(max_concurrency=1, transfer_concurrency=1)
+    download = runner.submit(_python("import time; time.sleep(3)"), pool="transfer")
+    try:
+        started = time.monotonic()
+        result = runner.run(_python("print('probe')"), timeout=2).check()
+        assert result.stdout.strip() == b"probe"
+        assert time.monotonic() - started < 2
+        assert not download.done()
+    finally:
+        download.cancel()
+
+def test_pool_limits_its_own_processes():
+    runner = MediaToolRunner(max_concurrency=1, transfer_concurrency=1)
+    first = runner.submit(_python("import time; time.sleep(1)"))
+    second = runner.submit(_python("print('second')"))
+
+    assert second.result(timeout=5).stdout.strip() == b"second"
+    # The second probe only started once the first one had released the slot
+    assert first.done()
+
+def test_timeout_kills_the_process():
+    runner = MediaToolRunner(max_concurrency=1, transfer_concurrency=1)
+    result = runner.run(_python("import time; time.sleep(5)"), timeout=0.2)
+
+    assert result.timed_out
+    with pytest.raises(subprocess.TimeoutExpired):
+        result.check()
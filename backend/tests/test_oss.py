@@ -0,0 +1,141 @@
+import oss2
+import pytest
+
+from config.settings import OSSConfig
+from infra import oss as oss_module
+from infra.oss import OSSUploader
+
+class FakeBucket:
+    """Records the object and multipart calls; `failures` maps part numbers to how often their upload fails"""
+
+    def __init__(self):
+        self.failures = {}
+        self.objects = {}
+        self.parts = {}
+        self.calls = []
+
+    def put_object(self, object_name, data):
+        self.calls.append(("put", object_name))
+        self.objects[object_name] = bytes(data)
+
+    def init_multipart_upload(self, object_name):
+        self.calls.append(("init", object_name))
+        return _FakeResult(upload_id="u1")
+
+    def upload_part(self, object_name, upload_id, part_number, data):
+        self.calls.append(("part", part_number, len(data)))
+        if self.failures.get(part_number):
+            self.failures[part_number] -= 1
+            raise oss2.exceptions.RequestError(ConnectionError("connection reset"))
+        self.parts[part_number] = bytes(data)
+        return _FakeResult(etag=f"etag-{part_number}")
+
+    def complete_multipart_upload(self, object_name, upload_id, parts):
+        self.calls.append(("complete", [part.part_number for part in parts]))
+        self.objects[object_name] = b"".join(self.parts[part.part_number] for part in parts)
+
+    def abort_multipart_upload(self, object_name, upload_id):
+        self.calls.append(("abort", upload_id))
+
+class _FakeResult:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+@pytest.fixture
+def uploader(tmp_path, monkeypatch):
+    monkeypatch.setattr(oss_module.time, "sleep", lambda seconds: None)
+    return OSSUploader(checkpoint_dir=str(tmp_path / "checkpoints"), multipart_threshold=1024, part_size=1024,
+                       num_threads=1, retries=2, stream_part_size=10)
+
+@pytest.fixture
+def bucket(uploader, monkeypatch):
+    bucket = FakeBucket()
+    monkeypatch.setattr(uploader, "get_bucket", lambda config_type="general": bucket)
+    return bucket
+
+def test_bucket_client_is_cached_per_configuration(uploader, monkeypatch):
+    config = OSSConfig(bucket_name="drafts", access_key_id="id", access_key_secret="secret",
+                       endpoint="https://oss-cn-hangzhou.aliyuncs.com")
+    monkeypatch.setattr(oss_module, "validate_oss_config", lambda config_type="general": config)
+
+    bucket = uploader.get_bucket()
+    assert uploader.get_bucket() is bucket
+
+    # Changed credentials build a new client
+    config.access_key_secret = "rotated"
+    rebuilt = uploader.get_bucket()
+    assert rebuilt is not bucket
+    assert uploader.get_bucket() is rebuilt
+
+def test_upload_resumes_after_network_errors(uploader, bucket, tmp_path, monkeypatch):
+    path = tmp_path / "draft.zip"
+    path.write_bytes(b"zip")
+    attempts = []
+
+    def resumable_upload(bucket, object_name, filename, store=None, **options):
+        attempts.append(store)
+        if len(attempts) < 3:
+            raise oss2.exceptions.RequestError(ConnectionError("connection reset"))
+    monkeypatch.setattr(oss_module.oss2, "resumable_upload", resumable_upload)
+
+    assert uploader.upload(str(path)) == "draft.zip"
+    assert len(attempts) == 3
+    # Every attempt resumes from the same checkpoint directory
+    assert len({store.dir for store in attempts}) == 1
+
+def test_upload_gives_up_after_its_retries(uploader, bucket, tmp_path, monkeypatch):
+    path = tmp_path / "draft.zip"
+    path.write_bytes(b"zip")
+    attempts = []
+
+    def resumable_upload(*args, **options):
+        attempts.append(args)
+        raise oss2.exceptions.RequestError(ConnectionError("connection reset"))
+    monkeypatch.setattr(oss_module.oss2, "resumable_upload", resumable_upload)
+
+    with pytest.raises(oss2.exceptions.RequestError):
+        uploader.upload(str(path))
+    assert len(attempts) == uploader.retries + 1
+
+def test_short_stream_is_a_single_put(uploader, bucket):
+    assert uploader.upload_stream([b"abc", b"def"], "clip.mp4") == 6
+
+    assert bucket.objects["clip.mp4"] == b"abcdef"
+    assert bucket.calls == [("put", "clip.mp4")]
+
+def test_long_stream_is_uploaded_in_parts(uploader, bucket):
+    chunks = [bytes([i]) * 7 for i in range(4)]
+
+    assert uploader.upload_stream(chunks, "clip.mp4") == 28
+
+    assert bucket.objects["clip.mp4"] == b"".join(chunks)
+    assert [call for call in bucket.calls if call[0] == "part"] == [("part", 1, 10), ("part", 2, 10), ("part", 3, 8)]
+    assert bucket.calls[-1] == ("complete", [1, 2, 3])
+
+def test_interrupted_part_is_sent_again(uploader, bucket):
+    chunks = [bytes([i]) * 7 for i in range(4)]
+    bucket.failures[2] = uploader.retries
+
+    assert uploader.upload_stream(chunks, "clip.mp4") == 28
+
+    assert bucket.objects["clip.mp4"] == b"".join(chunks)
+    assert [call[1] for call in bucket.calls if call[0] == "part"] == [1, 2, 2, 2, 3]
+
+def test_failed_part_aborts_the_multipart_upload(uploader, bucket):
+    bucket.failures[2] = uploader.retries + 1
+
+    with pytest.raises(oss2.exceptions.RequestError):
+        uploader.upload_stream([bytes(7)] * 4, "clip.mp4")
+
+    assert bucket.calls[-1] == ("abort", "u1")
+    assert "clip.mp4" not in bucket.objects
+
+def test_failing_source_aborts_the_multipart_upload(uploader, bucket):
+    def chunks():
+        yield bytes(25)
+        raise ConnectionError("source went away")
+
+    with pytest.raises(ConnectionError):
+        uploader.upload_stream(chunks(), "clip.mp4")
+
+    assert bucket.calls[-1] == ("abort", "u1")
@@ -0,0 +1,88 @@
+import importlib
+import os
+import time
+
+import pytest
+
+from infra.save_manifest import SaveManifestStore, content_hash, file_state
+
+# services re-exports functions under the module names, so import the module object itself
+save_draft_impl = importlib.import_module("services.save_draft_impl")
+
+URL = "http://example.com/clip.mp4"
+PROBE = {"width": 640, "height": 360, "duration": 5.0, "error": None}
+
+@pytest.fixture
+def manifests(tmp_path):
+    return SaveManifestStore(str(tmp_path / "manifests"))
+
+@pytest.fixture
+def asset(tmp_path):
+    path = tmp_path / "draft" / "assets" / "video" / "clip.mp4"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"video")
+    return str(path)
+
+def _entry(path, **overrides):
+    return {"url": URL, "file": file_state(path), "verified_at": time.time(), "probe": PROBE, **overrides}
+
+def test_manifest_round_trip(manifests, asset):
+    manifest = {
+        "template": "template",
+        "materials": {"assets/video/clip.mp4": _entry(asset)},
+        "draft_info_hash": content_hash("{}"),
+        "draft_url": "https://oss.example.com/draft.zip",
+    }
+    manifests.save("d", manifest)
+
+    assert manifests.load("d") == manifest
+    assert os.listdir(manifests.directory) == ["d.json"]
+    manifests.delete("d")
+    assert manifests.load("d") == {}
+    manifests.delete("d")
+
+def test_unreadable_manifest_loads_empty(manifests):
+    os.makedirs(manifests.directory)
+    with open(os.path.join(manifests.directory, "d.json"), "w", encoding="utf-8") as f:
+        f.write("{not json")
+
+    assert manifests.load("d") == {}
+
+def test_file_state_of_missing_file(tmp_path):
+    assert file_state(str(tmp_path / "missing")) is None
+
+def test_unchanged_material_is_reused(asset):
+    assert save_draft_impl._is_unchanged(_entry(asset), URL, asset)
+
+@pytest.mark.parametrize("overrides", [
+    {"url": "http://example.com/other.mp4"},
+    {"probe": None},
+    {"file": {"size": 1, "mtime_ns": 0}},
+])
+def test_changed_material_is_not_reused(asset, overrides):
+    assert not save_draft_impl._is_unchanged(_entry(asset, **overrides), URL, asset)
+
+def test_missing_entry_or_file_is_not_reused(asset):
+    entry = _entry(asset)
+    assert not save_draft_impl._is_unchanged(None, URL, asset)
+    os.remove(asset)
+    assert not save_draft_impl._is_unchanged(entry, URL, asset)
+
+def test_stale_verification_is_not_reused(asset, monkeypatch):
+    monkeypatch.setattr(save_draft_impl.settings, "ASSET_STORE_REVALIDATE_AFTER", 60)
+    assert not save_draft_impl._is_unchanged(_entry(asset, verified_at=time.time() - 120), URL, asset)
+
+def test_relinked_file_keeps_recorded_probe(asset, monkeypatch):
+    known = _entry(asset)
+    probes = []
+    monkeypatch.setattr(save_draft_impl, "fetch_asset", lambda url, path: True)
+    monkeypatch.setitem(save_draft_impl._PROBES, "video", lambda path: probes.append(path) or PROBE)
+
+    # The asset store linked back the file recorded in the manifest
+    assert save_draft_impl._fetch_and_probe(URL, "video", asset, known) == (True, PROBE, None, True)
+    assert probes == []
+    # The content behind the URL changed: the new file is probed
+    with open(asset, "ab") as f:
+        f.write(b"changed")
+    assert save_draft_impl._fetch_and_probe(URL, "video", asset, known) == (True, PROBE, None, False)
+    assert probes == [asset]
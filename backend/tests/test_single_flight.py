@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from infra.single_flight import SingleFlight
+
+TIMEOUT = 5
+FOLLOWERS = 3
+
+def _run_concurrently(flight, func, key="k"):
+    """
+    Call flight.do_shared(key, func) from a leader and FOLLOWERS threads that join while it runs.
+    func must block until `release` is set. Returns (release, outcomes), outcomes filled in as
+    (result, shared) or the exception raised, once the threads finish.
+    """
+    release = threading.Event()
+    outcomes = []
+    lock = threading.Lock()
+
+    def call():
+        try:
+            outcome = flight.do_shared(key, func, release)
+        except Exception as e:
+            outcome = e
+        with lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=call) for _ in range(1 + FOLLOWERS)]
+    threads[0].start()
+    _wait_until(lambda: key in flight._calls)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_until(lambda: flight._calls[key].waiters == FOLLOWERS)
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    return outcomes
+
+def _wait_until(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    def work(release):
+        calls.append(1)
+        release.wait(TIMEOUT)
+        return "result"
+
+    outcomes = _run_concurrently(flight, work)
+
+    assert len(calls) == 1
+    assert sorted(outcomes) == [("result", False)] + [("result", True)] * FOLLOWERS
+
+def test_exception_reaches_every_waiter():
+    flight = SingleFlight()
+
+    def work(release):
+        release.wait(TIMEOUT)
+        raise ValueError("probe failed")
+
+    outcomes = _run_concurrently(flight, work)
+
+    assert len(outcomes) == 1 + FOLLOWERS
+    assert all(isinstance(outcome, ValueError) and str(outcome) == "probe failed" for outcome in outcomes)
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_key_is_released_after_the_call(fails):
+    flight = SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        if fails:
+            raise ValueError("probe failed")
+        return len(calls)
+
+    for expected in (1, 2):
+        if fails:
+            with pytest.raises(ValueError):
+                flight.do("k", work)
+        else:
+            assert flight.do("k", work) == expected
+        assert flight._calls == {}
+    assert len(calls) == 2
+
+def test_shared_results_are_independent_copies():
+    flight = SingleFlight()
+
+    def work(release):
+        release.wait(TIMEOUT)
+        return {"streams": [{"codec_type": "video"}]}
+
+    outcomes = _run_concurrently(flight, work)
+    results = [result for result, _ in outcomes]
+    for i, result in enumerate(results):
+        result["streams"][0]["width"] = i
+
+    assert [result["streams"][0]["width"] for result in results] == list(range(1 + FOLLOWERS))
+
+def test_unshared_result_is_returned_as_is():
+    flight = SingleFlight()
+    result = {"streams": []}
+
+    assert flight.do_shared("k", lambda: result) == (result, False)
+    assert flight.do("k", lambda: result) is result
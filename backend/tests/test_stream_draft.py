@@ -0,0 +1,117 @@
+import importlib
+import json
+import os
+
+import pytest
+import requests
+
+from infra.cache_service import draft_cache
+from services import add_video_track, create_draft
+
+# services re-exports functions under the module names, so import the module object itself
+save_draft_impl = importlib.import_module("services.save_draft_impl")
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "template_jianying")
+PROBE = {"width": 640, "height": 360, "duration": 5.0, "error": None}
+
+class FakeOssUploader:
+    def __init__(self):
+        self.objects = {}
+
+    def upload_stream(self, chunks, object_name, config_type="general"):
+        data = b"".join(chunks)
+        self.objects[object_name] = data
+        return len(data)
+
+    def put_bytes(self, data, object_name, config_type="general"):
+        self.objects[object_name] = data
+
+    def sign_url(self, object_name, config_type="general", expires=24 * 60 * 60):
+        return f"https://oss.example.com/{object_name}?signed"
+
+@pytest.fixture
+def oss(monkeypatch):
+    uploader = FakeOssUploader()
+    monkeypatch.setattr(save_draft_impl, "oss_uploader", uploader)
+    return uploader
+
+@pytest.fixture
+def sources(monkeypatch):
+    """URL -> bytes served by the fake iter_remote; other URLs answer 404"""
+    served = {}
+
+    def iter_remote(url, timeout=180):
+        if url not in served:
+            raise requests.HTTPError(f"404 Client Error for url: {url}")
+        data = served[url]
+        for i in range(0, len(data), 1000):
+            yield data[i:i + 1000]
+    monkeypatch.setattr(save_draft_impl, "iter_remote", iter_remote)
+    return served
+
+@pytest.fixture
+def probes(monkeypatch):
+    calls = []
+    monkeypatch.setitem(save_draft_impl._PROBES, "video", lambda media, info=None: calls.append(media) or PROBE)
+    return calls
+
+@pytest.fixture
+def draft_id():
+    _, draft_id = create_draft(640, 360)
+    yield draft_id
+    draft_cache.delete(draft_id)
+
+def _collect(draft_id):
+    # Same local paths save_draft_background collects; nothing is written there in streaming mode
+    draft_path = os.path.join(os.path.dirname(os.path.abspath(save_draft_impl.__file__)), draft_id)
+    with save_draft_impl.draft_locks.read(draft_id):
+        return save_draft_impl._collect_assets(draft_cache.get(draft_id), draft_path)
+
+def _stream(draft_id):
+    assets = _collect(draft_id)
+    return save_draft_impl._stream_draft_to_oss(draft_id, None, draft_id, TEMPLATE, assets, {}), assets
+
+def test_assets_draft_info_and_manifest_are_uploaded(draft_id, oss, sources, probes):
+    sources["http://media.example.com/a.mp4"] = b"a" * 2500
+    add_video_track("http://media.example.com/a.mp4", draft_id=draft_id)
+
+    (draft_url, failed), assets = _stream(draft_id)
+
+    assert failed == 0
+    assert draft_url == f"https://oss.example.com/{draft_id}/manifest.json?signed"
+    asset_name = f"assets/video/{assets[0][2]}"
+    assert oss.objects[f"{draft_id}/{asset_name}"] == b"a" * 2500
+    manifest = json.loads(oss.objects[f"{draft_id}/manifest.json"])
+    assert manifest["assets"] == {asset_name: {"url": "http://media.example.com/a.mp4", "size": 2500}}
+    assert manifest["failed_assets"] == 0
+    # Every listed file was uploaded, manifest.json aside
+    assert {f"{draft_id}/{name}" for name in manifest["files"]} == set(oss.objects) - {f"{draft_id}/manifest.json"}
+    assert "draft_info.json" in manifest["files"] and "draft_settings" in manifest["files"]
+    # Bytes no probe can read are probed through the uploaded object, not the source URL
+    assert probes == [f"https://oss.example.com/{draft_id}/{asset_name}?signed"]
+    material = draft_cache.get(draft_id).materials.videos[0]
+    assert (material.width, material.height, material.duration) == (640, 360, 5000000)
+    draft_info = json.loads(oss.objects[f"{draft_id}/draft_info.json"])
+    assert draft_info["materials"]["videos"][0]["width"] == 640
+
+def test_failed_asset_is_left_out_of_the_manifest(draft_id, oss, sources, probes):
+    sources["http://media.example.com/a.mp4"] = b"a" * 2500
+    add_video_track("http://media.example.com/a.mp4", draft_id=draft_id)
+    add_video_track("http://media.example.com/missing.mp4", draft_id=draft_id, target_start=5)
+
+    (draft_url, failed), assets = _stream(draft_id)
+
+    assert failed == 1
+    manifest = json.loads(oss.objects[f"{draft_id}/manifest.json"])
+    assert [asset["url"] for asset in manifest["assets"].values()] == ["http://media.example.com/a.mp4"]
+    assert not any(assets[1][2] in name for name in oss.objects)
+
+def test_deleted_draft_uploads_no_draft_info(draft_id, oss, sources, probes):
+    sources["http://media.example.com/a.mp4"] = b"a" * 2500
+    add_video_track("http://media.example.com/a.mp4", draft_id=draft_id)
+    assets = _collect(draft_id)
+    draft_cache.delete(draft_id)
+
+    assert save_draft_impl._stream_draft_to_oss(draft_id, None, draft_id, TEMPLATE, assets, {}) is None
+    assert f"{draft_id}/draft_info.json" not in oss.objects
+    assert f"{draft_id}/manifest.json" not in oss.objects
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from infra import task_progress as task_progress_module
+from infra.job_queue import JobQueue
+from infra.task_progress import TaskProgressTracker
+
+TIMEOUT = 5
+
+@pytest.fixture
+def published(monkeypatch):
+    """Fields written to the task store, per task id; the merged task is readable through get_task_status"""
+    writes = {}
+
+    def update_task_fields(task_id, fields):
+        writes.setdefault(task_id, []).append(dict(fields))
+
+    def get_task_status(task_id):
+        if task_id not in writes:
+            return None
+        task = {}
+        for fields in writes[task_id]:
+            task.update(fields)
+        return task
+
+    monkeypatch.setattr(task_progress_module, "update_task_fields", update_task_fields)
+    monkeypatch.setattr(task_progress_module, "get_task_status", get_task_status)
+    return writes
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(workers=1, max_size=10, per_group_limit=1, name="test")
+    yield queue
+    queue.stop(timeout=TIMEOUT)
+
+def _reporting_job(tracker, started, release, done):
+    """Job that reports once it is released, whether or not it was cancelled meanwhile"""
+    def run():
+        started.set()
+        release.wait(TIMEOUT)
+        tracker.update("t", force=True, status="failed", message="late report")
+        done.set()
+    return run
+
+def test_superseded_job_cannot_report(queue, published):
+    tracker = TaskProgressTracker(max_updates_per_second=0)
+    started, release, done = threading.Event(), threading.Event(), threading.Event()
+    queue.submit("t", _reporting_job(tracker, started, release, done))
+    assert started.wait(TIMEOUT)
+
+    queue.cancel("t", superseded=True)
+    tracker.update("t", force=True, status="queued")
+    release.set()
+    assert done.wait(TIMEOUT)
+
+    assert published["t"] == [{"status": "queued"}]
+
+def test_cancelled_job_still_reports(queue, published):
+    tracker = TaskProgressTracker(max_updates_per_second=0)
+    started, release, done = threading.Event(), threading.Event(), threading.Event()
+    queue.submit("t", _reporting_job(tracker, started, release, done))
+    assert started.wait(TIMEOUT)
+
+    queue.cancel("t")
+    release.set()
+    assert done.wait(TIMEOUT)
+
+    assert published["t"] == [{"status": "failed", "message": "late report"}]
+
+def test_discard_drops_buffered_fields(published):
+    tracker = TaskProgressTracker(max_updates_per_second=1)
+    tracker.update("t", force=True, progress=10)
+    tracker.update("t", progress=60, completed_files=3)
+
+    tracker.discard("t")
+    tracker.flush("t")
+
+    assert published["t"] == [{"progress": 10}]
+
+def test_updates_are_coalesced_and_keep_the_last_value(published):
+    tracker = TaskProgressTracker(max_updates_per_second=1)
+    tracker.update("t", status="processing", progress=0)
+    for progress in range(1, 50):
+        tracker.update("t", progress=progress, message=f"file {progress}")
+
+    assert published["t"] == [{"status": "processing", "progress": 0}]
+    tracker.flush("t")
+    assert published["t"][1:] == [{"progress": 49, "message": "file 49"}]
+
+def test_trailing_update_is_published_by_the_timer(published):
+    tracker = TaskProgressTracker(max_updates_per_second=20)
+    tracker.update("t", progress=1)
+    tracker.update("t", progress=2)
+
+    deadline = time.monotonic() + TIMEOUT
+    while len(published["t"]) < 2:
+        assert time.monotonic() < deadline, "trailing update was not published"
+        time.sleep(0.01)
+    assert published["t"] == [{"progress": 1}, {"progress": 2}]
+
+def test_force_and_terminal_status_publish_right_away(published):
+    tracker = TaskProgressTracker(max_updates_per_second=1)
+    tracker.update("t", progress=1)
+    tracker.update("t", progress=2)
+    tracker.update("t", force=True, message="uploading")
+    tracker.update("t", progress=3)
+    tracker.update("t", status="completed", progress=100)
+
+    assert published["t"] == [{"progress": 1}, {"progress": 2, "message": "uploading"},
+                              {"progress": 100, "status": "completed"}]
+
+async def _collect(tracker, task_id, **options):
+    return [status async for status in tracker.subscribe(task_id, **options)]
+
+def test_subscriber_follows_updates_until_terminal_status(published):
+    tracker = TaskProgressTracker(max_updates_per_second=0)
+    tracker.update("t", status="processing", progress=0)
+
+    def report():
+        for progress in (50, 100):
+            # Publish once the subscriber waits for the next change
+            while "t" not in tracker._waiters:
+                time.sleep(0.01)
+            tracker.update("t", progress=progress, status="completed" if progress == 100 else "processing")
+    reporter = threading.Thread(target=report)
+    reporter.start()
+    statuses = asyncio.run(_collect(tracker, "t", heartbeat=TIMEOUT, poll_interval=TIMEOUT))
+    reporter.join()
+
+    assert statuses == [{"status": "processing", "progress": 0}, {"status": "processing", "progress": 50},
+                        {"status": "completed", "progress": 100}]
+
+def test_subscriber_gets_heartbeats_while_nothing_changes(published):
+    tracker = TaskProgressTracker(max_updates_per_second=0)
+    tracker.update("t", status="processing")
+
+    async def first_three():
+        stream = tracker.subscribe("t", heartbeat=0.05, poll_interval=0.01)
+        statuses = [await stream.__anext__() for _ in range(3)]
+        await stream.aclose()
+        return statuses
+
+    assert asyncio.run(first_three()) == [{"status": "processing"}, None, None]
+
+def test_subscriber_of_unknown_task_ends_immediately(published):
+    assert asyncio.run(_collect(TaskProgressTracker(), "missing")) == []
@@ -0,0 +1,63 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+import domain.pyJianYingDraft as draft
+from domain.pyJianYingDraft.track import Track
+
+def _segment(start, duration):
+    timerange = draft.Timerange(start, duration)
+    return SimpleNamespace(target_timerange=timerange,
+                           overlaps=lambda other: timerange.overlaps(other.target_timerange))
+
+def _track(segments):
+    track = Track(draft.Track_type.text, "text", 0, False)
+    track.segments.extend(segments)
+    return track
+
+def _removed_by_pairwise_check(segments):
+    """Indices the former O(n^2) conflict check in save_draft_impl deleted"""
+    to_remove = set()
+    for i in range(len(segments)):
+        if i in to_remove:
+            continue
+        for j in range(len(segments)):
+            if i == j or j in to_remove:
+                continue
+            if segments[i].overlaps(segments[j]):
+                to_remove.add(max(i, j))
+    return to_remove
+
+@pytest.mark.parametrize("span", [10, 50, 1000])
+def test_resolve_overlaps_matches_pairwise_check(span):
+    rng = random.Random(span)
+    for _ in range(500):
+        segments = [_segment(rng.randint(0, span), rng.choice([0, rng.randint(0, span // 5 + 1)]))
+                    for _ in range(rng.randint(0, 30))]
+        expected_removed = _removed_by_pairwise_check(segments)
+        track = _track(segments)
+
+        conflicts = track.find_overlaps()
+        assert {index for _, index in conflicts} == expected_removed
+        for kept, index in conflicts:
+            assert kept < index and segments[kept].overlaps(segments[index])
+
+        removed = track.resolve_overlaps()
+        assert [segment for _, segment in removed] == [segments[index] for index in sorted(expected_removed)]
+        assert track.segments == [segment for index, segment in enumerate(segments) if index not in expected_removed]
+        assert track.find_overlaps() == []
+
+def test_earlier_segment_wins():
+    first, second, third = _segment(5, 10), _segment(0, 10), _segment(15, 5)
+    track = _track([first, second, third])
+
+    assert track.resolve_overlaps() == [(first, second)]
+    assert track.segments == [first, third]
+
+def test_touching_segments_do_not_overlap():
+    segments = [_segment(0, 10), _segment(10, 10), _segment(20, 0)]
+    track = _track(segments)
+
+    assert track.resolve_overlaps() == []
+    assert track.segments == segments
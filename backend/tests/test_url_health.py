@@ -0,0 +1,153 @@
+import importlib
+import subprocess
+import time
+
+import pytest
+
+from infra import url_health as url_health_module
+from infra.url_health import CircuitBreaker, UrlHealth, UrlUnavailableError
+
+URL = "http://media.example.com/clip.mp4"
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(url_health_module.time, "monotonic", clock)
+    return clock
+
+def test_breaker_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure("host")
+    assert breaker.allow("host")
+
+    breaker.record_failure("host")
+    assert not breaker.allow("host")
+    assert breaker.allow("other-host")
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure("host")
+    breaker.record_success("host")
+    breaker.record_failure("host")
+
+    assert breaker.allow("host")
+
+def test_half_open_lets_a_single_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure("host")
+
+    clock.now += 29
+    assert not breaker.allow("host")
+    clock.now += 2
+    assert breaker.allow("host")
+    # Only one trial while it has not reported back
+    assert not breaker.allow("host")
+    # A trial that never reports is replaced after another reset_timeout
+    clock.now += 31
+    assert breaker.allow("host")
+
+def test_trial_success_closes_and_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure("host")
+    clock.now += 31
+    assert breaker.allow("host")
+    breaker.record_failure("host")
+    assert not breaker.allow("host")
+
+    clock.now += 31
+    assert breaker.allow("host")
+    breaker.record_success("host")
+    assert breaker.allow("host")
+    assert breaker.allow("host")
+
+def test_failed_url_is_refused_until_negative_ttl_passes(monkeypatch):
+    health = UrlHealth(negative_ttl=60, failure_threshold=5, reset_timeout=30)
+    health.record_failure(URL, "404 Not Found")
+
+    with pytest.raises(UrlUnavailableError, match="404"):
+        health.check(URL)
+    health.check("http://media.example.com/other.mp4")
+
+    later = time.time() + 61
+    monkeypatch.setattr("infra.cache_service.time.time", lambda: later)
+    health.check(URL)
+
+def test_success_clears_negative_cache():
+    health = UrlHealth(negative_ttl=60, failure_threshold=5, reset_timeout=30)
+    health.record_failure(URL, "boom")
+    health.record_success(URL)
+
+    health.check(URL)
+
+def test_connection_errors_open_the_host_circuit(clock):
+    health = UrlHealth(negative_ttl=60, failure_threshold=2, reset_timeout=30)
+    health.record_connection_error(URL)
+    health.record_connection_error("http://media.example.com/other.mp4")
+
+    with pytest.raises(UrlUnavailableError, match="media.example.com"):
+        health.check("http://media.example.com/third.mp4")
+
+def test_local_paths_are_never_refused():
+    health = UrlHealth(negative_ttl=60, failure_threshold=1, reset_timeout=30)
+    health.record_failure("/tmp/clip.mp4", "missing")
+    health.record_connection_error("/tmp/clip.mp4")
+
+    health.check("/tmp/clip.mp4")
+
+@pytest.fixture
+def duration_probe(monkeypatch):
+    """get_video_duration with a scripted probe_media and an isolated url_health"""
+    module = importlib.import_module("services.get_duration_impl")
+    health = UrlHealth(negative_ttl=60, failure_threshold=5, reset_timeout=30)
+    monkeypatch.setattr(module, "url_health", health)
+    monkeypatch.setattr(module.time, "sleep", lambda seconds: None)
+    calls = []
+
+    def script(*outcomes):
+        def probe_media(media, timeout=None):
+            outcome = outcomes[len(calls)]
+            calls.append(media)
+            if isinstance(outcome, Exception):
+                if isinstance(outcome, subprocess.CalledProcessError):
+                    # What run_ffprobe records before raising
+                    health.record_failure(media, "ffprobe failed")
+                raise outcome
+            return outcome
+        monkeypatch.setattr(module, "probe_media", probe_media)
+        return module.get_video_duration
+
+    return script, calls, health
+
+def test_duration_timeouts_are_retried(duration_probe):
+    script, calls, _ = duration_probe
+    get_video_duration = script(subprocess.TimeoutExpired("ffprobe", 10), subprocess.TimeoutExpired("ffprobe", 10),
+                                {"streams": [{"duration": "4.5"}], "format": {}})
+
+    assert get_video_duration(URL) == {"success": True, "output": 4.5, "error": None}
+    assert len(calls) == 3
+
+def test_duration_ffprobe_error_fails_fast(duration_probe):
+    script, calls, health = duration_probe
+    get_video_duration = script(subprocess.CalledProcessError(1, "ffprobe", output=b"Invalid data"))
+
+    result = get_video_duration(URL)
+
+    assert not result["success"] and "Invalid data" in result["error"]
+    assert len(calls) == 1
+    # Recorded once by the probe, not again by get_video_duration
+    assert health._failed.get(URL) == "ffprobe failed"
+
+def test_duration_missing_from_probe_is_not_retried(duration_probe):
+    script, calls, _ = duration_probe
+    get_video_duration = script({"streams": [{"codec_type": "video"}], "format": {}})
+
+    assert get_video_duration(URL)["error"] == "Audio/video duration information not found."
+    assert len(calls) == 1
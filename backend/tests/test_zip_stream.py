@@ -0,0 +1,53 @@
+import io
+import zipfile
+
+import pytest
+
+from infra.zip_stream import folder_entries, iter_zip, write_zip
+
+@pytest.fixture
+def draft_folder(tmp_path):
+    root = tmp_path / "draft"
+    (root / "assets" / "video").mkdir(parents=True)
+    (root / "assets" / "empty").mkdir()
+    (root / "draft_info.json").write_text('{"tracks": []}' * 100, encoding="utf-8")
+    (root / "draft_settings").write_text("[General]\n" * 50, encoding="utf-8")
+    (root / "assets" / "video" / "clip.mp4").write_bytes(bytes(range(256)) * 4096)
+    return root
+
+def _check_archive(archive, root):
+    assert archive.testzip() is None
+    names = archive.namelist()
+    assert sorted(names) == ["assets/", "assets/empty/", "assets/video/", "assets/video/clip.mp4",
+                            "draft_info.json", "draft_settings"]
+    assert archive.getinfo("assets/video/clip.mp4").compress_type == zipfile.ZIP_STORED
+    assert archive.getinfo("draft_info.json").compress_type == zipfile.ZIP_DEFLATED
+    assert archive.getinfo("draft_settings").compress_type == zipfile.ZIP_DEFLATED
+    for name in names:
+        if not name.endswith("/"):
+            assert archive.read(name) == (root / name).read_bytes()
+
+def test_iter_zip_produces_valid_archive(draft_folder):
+    data = b"".join(iter_zip(folder_entries(str(draft_folder))))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        _check_archive(archive, draft_folder)
+
+def test_write_zip_produces_valid_archive_without_data_descriptors(draft_folder, tmp_path):
+    zip_path = str(tmp_path / "draft.zip")
+
+    assert write_zip(folder_entries(str(draft_folder)), zip_path) == zip_path
+
+    with zipfile.ZipFile(zip_path) as archive:
+        _check_archive(archive, draft_folder)
+        # Seekable target: local headers are patched instead (flag bit 3 unset)
+        assert not any(info.flag_bits & 0x08 for info in archive.infolist())
+    # No temporary file left behind
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["draft", "draft.zip"]
+
+def test_base_dir_prefixes_names(draft_folder):
+    data = b"".join(iter_zip(folder_entries(str(draft_folder.parent), "draft")))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert "draft/draft_info.json" in archive.namelist()